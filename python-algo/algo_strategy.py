@@ -16,7 +16,7 @@ Advanced strategy tips:
 
   - The GameState.map object can be manually manipulated to create hypothetical 
   board states. Though, we recommended making a copy of the map to preserve 
-  the actual current map state.
+  the actual current map state. GameState.fork() makes a cheap copy.
 """
 
 
@@ -26,6 +26,10 @@ class AlgoStrategy(gamelib.AlgoCore):
         seed = random.randrange(maxsize)
         random.seed(seed)
         gamelib.debug_write('Random seed: {}'.format(seed))
+        # on_action_frame only reads these events, so frames without them are skipped
+        self.frame_events = ["breach", "spawn"]
+        # set to True to print how long each phase of every turn took
+        self.report_turn_time = False
 
     def on_game_start(self, config):
         """
@@ -55,6 +59,8 @@ class AlgoStrategy(gamelib.AlgoCore):
         self.enemy_scout_spawn_locations = {}
         self.enemy_demolisher_spawn_locations = {}
         self.enemy_interceptor_spawn_locations = {}
+        # precompute runs on another thread, so it reads this snapshot of the favourite spawn locations, replaced whole by on_action_frame
+        self.precompute_spawn_locations = {}
         self.kamikaze_ready = False
         self.attack_signal = 0
 
@@ -86,6 +92,8 @@ class AlgoStrategy(gamelib.AlgoCore):
         self.starter_strategy(game_state)
 
         game_state.submit_turn()
+        if self.report_turn_time:
+            gamelib.debug_write('Turn time: {}'.format(game_state.budget.report()))
 
     """
     NOTE: All the methods after this point are part of the sample starter-algo
@@ -132,30 +140,33 @@ class AlgoStrategy(gamelib.AlgoCore):
 
         
 
+        budget = game_state.budget
         if self.attack_flag == 0:
             self.build_defences(game_state)
 
         elif self.attack_flag == 2:
             self.build_defences(game_state)
-            if self.attack_strat == 1:
-                self.long_attack(game_state, self.attack_side)
-            else:
-                self.short_attack(game_state, self.attack_side)
-            self.__remove_attack_walls(game_state)
+            with budget.phase("attack"):
+                if self.attack_strat == 1:
+                    self.long_attack(game_state, self.attack_side)
+                else:
+                    self.short_attack(game_state, self.attack_side)
+                self.__remove_attack_walls(game_state)
             self.attack_flag = 0
             self.attack_signal = 0
         else:
             self.build_defences(game_state)
-            rng = random.random()
+            with budget.phase("attack prep"):
+                rng = random.random()
 
-            ratio = self.long_success / self.short_success + self.long_success
+                ratio = self.long_success / self.short_success + self.long_success
 
-            if rng >= ratio:
-                self.attack_side = self.attack_prep_short(game_state)
-                self.attack_strat = 0
-            else:
-                self.attack_side = self.attack_prep_long(game_state)
-                self.attack_strat = 1
+                if rng >= ratio:
+                    self.attack_side = self.attack_prep_short(game_state)
+                    self.attack_strat = 0
+                else:
+                    self.attack_side = self.attack_prep_long(game_state)
+                    self.attack_strat = 1
             self.attack_flag = 2
 
         if game_state.get_resource(MP, ENEMY) < self.enemy_mobile(game_state) and game_state.get_resource(MP, SELF) >= 13 and self.attack_signal == 0:
@@ -464,6 +475,9 @@ class AlgoStrategy(gamelib.AlgoCore):
         if game_state.get_resource(MP, SELF) >= mpThreshold and self.attack_flag != 2 and game_state.turn_number>=2:        
             scouts = self.most_spawn_location(SCOUT)
             demos = self.most_spawn_location(DEMOLISHER)
+            # Paths from the enemy spawn locations start from the fields precompute built during the action phase
+            for field in self.precomputed or []:
+                game_state.reuse_distance_field(field)
 
             scouts_lr = self.kamikaze_ideal_steps(game_state, scouts)
             demos_lr = self.kamikaze_ideal_steps(game_state, demos)
@@ -712,16 +726,22 @@ class AlgoStrategy(gamelib.AlgoCore):
         Remember to defend corners and avoid placing units in the front where enemy demolishers can attack them.
         """
 
+        budget = game_state.budget
         # Turn 1 - Build Initial Defense
         if game_state.turn_number == 0:
-            self.initial_build(game_state)
+            with budget.phase("initial build"):
+                self.initial_build(game_state)
 
         # All other turns
         else:
-            self.rebuild(game_state)
-            self.spawn_kamikaze(game_state)
-            self.upgrade(game_state)
-            self.extend_defense(game_state)
+            with budget.phase("rebuild"):
+                self.rebuild(game_state)
+            with budget.phase("kamikaze"):
+                self.spawn_kamikaze(game_state)
+            with budget.phase("upgrade"):
+                self.upgrade(game_state)
+            with budget.phase("extend defense"):
+                self.extend_defense(game_state)
 
     # def build_reactive_defense(self, game_state):
     #     """
@@ -787,29 +807,25 @@ class AlgoStrategy(gamelib.AlgoCore):
         This function will help us guess which location is the safest to spawn moving units from.
         It gets the path the unit will take then checks locations on that path to
         estimate the path's damage risk.
+        If the turn runs out of time, the safest location checked so far is used.
         """
-        damages = []
         # Get the damage estimate each path will take
-        for location in location_options:
+        turret_damage = gamelib.GameUnit(TURRET, game_state.config).damage_i
+        def path_damage(location):
             path = game_state.find_path_to_edge(location)
-            damage = 0
-            for path_location in path:
-                # Get number of enemy turrets that can attack each location and multiply by turret damage
-                damage += len(game_state.get_attackers(path_location, 0)) * gamelib.GameUnit(TURRET,
-                                                                                             game_state.config).damage_i
-            damages.append(damage)
+            # Get number of enemy turrets that can attack each location and multiply by turret damage
+            return game_state.path_attackers(path, 0) * turret_damage
 
         # Now just return the location that takes the least damage
-        return location_options[damages.index(min(damages))]
+        return game_state.budget.best_of(location_options, lambda location: -path_damage(location), fallback=location_options[0])
 
     def detect_enemy_unit(self, game_state, unit_type=None, valid_x=None, valid_y=None):
-        total_units = 0
-        for location in game_state.game_map:
-            if game_state.contains_stationary_unit(location):
-                for unit in game_state.game_map[location]:
-                    if unit.player_index == 1 and (unit_type is None or unit.unit_type == unit_type) and (
-                            valid_x is None or location[0] in valid_x) and (valid_y is None or location[1] in valid_y):
-                        total_units += 1
+        game_map = game_state.game_map
+        if unit_type is None:
+            enemy_units = game_map.structure_bits(1)
+        else:
+            enemy_units = game_map.unit_bits(unit_type, 1) & game_map.structure_bits()
+        total_units = gamelib.game_map.count_bits(enemy_units & game_map.region_bits(valid_x, valid_y))
         return total_units
 
     def filter_blocked_locations(self, locations, game_state):
@@ -820,30 +836,23 @@ class AlgoStrategy(gamelib.AlgoCore):
         return filtered
 
     def weaker_side(self, game_state, unit_type=None):
-        left_side_units = 0
         left = [0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13]
-
-        right_side_units = 0
         right = [14, 15, 16, 17, 18, 19, 20, 21, 22, 23, 24, 25, 26, 27]
 
-        for location in game_state.game_map:
-            if game_state.contains_stationary_unit(location):
-                for unit in game_state.game_map[location]:
-                    if unit.player_index == 1 and (left is None or location[0] in left):
-                        if unit.unit_type == WALL:
-                            left_side_units += 1
-                        elif unit.unit_type == TURRET:
-                            left_side_units += 12
-                        elif unit.unit_type == SUPPORT:
-                            left_side_units += 1
-                    elif unit.player_index == 1 and (right is None or location[0] in right):
-                        if unit.unit_type == WALL:
-                            left_side_units += 1
-                        elif unit.unit_type == TURRET:
-                            left_side_units += 12
-                        elif unit.unit_type == SUPPORT:
-                            left_side_units += 1
+        game_map = game_state.game_map
+        count_bits = gamelib.game_map.count_bits
+        walls = game_map.unit_bits(WALL, 1)
+        turrets = game_map.unit_bits(TURRET, 1)
+        supports = game_map.unit_bits(SUPPORT, 1)
 
+        side_units = []
+        for side in (left, right):
+            region = game_map.region_bits(valid_x=side)
+            side_units.append(count_bits(walls & region) + 12 * count_bits(turrets & region) + count_bits(supports & region))
+
+        #Structures on the right have always been counted towards left_side_units, the callers are tuned to that
+        left_side_units = side_units[0] + side_units[1]
+        right_side_units = 0
         return left_side_units, right_side_units
 
     def find_enemy_turrets(self, game_state, unit_type=None, valid_x=None, valid_y=None):
@@ -859,24 +868,13 @@ class AlgoStrategy(gamelib.AlgoCore):
         return total_turrets, turret_locations
 
     def damage_on_path(self, game_state, location):
-        damage = 0
         path = game_state.find_path_to_edge(location)
         # gamelib.debug_write(path)
-        if path:
-            for path_location in path:
-                damage += len(game_state.get_attackers(path_location, 0)) * gamelib.GameUnit(TURRET,
-                                                                                             game_state.config).damage_i
-
-        return damage
+        return game_state.path_attackers(path, 0) * gamelib.GameUnit(TURRET, game_state.config).damage_i
 
     def turrets_on_path(self, game_state, location):
-        turrets = 0
         path = game_state.find_path_to_edge(location)
-        if path:
-            for path_location in path:
-                turrets += len(game_state.get_attackers(path_location, 0))
-
-        return turrets
+        return game_state.path_attackers(path, 0)
 
     def filter_blocked_locations(self, locations, game_state):
         filtered = []
@@ -958,6 +956,25 @@ class AlgoStrategy(gamelib.AlgoCore):
 
         return None
 
+    def precompute(self, turn_string):
+        """
+        Runs on a worker thread during the action phase with the latest frame.
+        Builds the path fields from the enemy's favourite spawn locations on the frame's board,
+        spawn_kamikaze patches them for the real board next turn instead of searching again.
+        """
+        spawn_locations = self.precompute_spawn_locations
+        game_state = gamelib.GameState(self.config, turn_string, lazy=True)
+        fields = []
+        for unit_type in [SCOUT, DEMOLISHER]:
+            if self.precompute_stopped():
+                break
+            location = spawn_locations.get(unit_type)
+            if location:
+                field = game_state.distance_field(location)
+                if field:
+                    fields.append(field)
+        return fields
+
     def on_action_frame(self, turn_string):
         """
         This is the action frame of the game. This function could be called 
@@ -966,9 +983,7 @@ class AlgoStrategy(gamelib.AlgoCore):
         Full doc on format of a game frame at in json-docs.html in the root of the Starterkit.
         """
         # Let's record at what position we get scored on
-        state = json.loads(turn_string)
-        events = state["events"]
-        breaches = events["breach"]
+        breaches = turn_string.event("breach")
         for breach in breaches:
             location = breach[0]
             unit_owner_self = True if breach[4] == 1 else False
@@ -979,7 +994,7 @@ class AlgoStrategy(gamelib.AlgoCore):
                     self.short_success += 1
                 else:
                     self.long_success += 1
-        spawns = events["spawn"]
+        spawns = turn_string.event("spawn")
         for spawn in spawns:
             location = tuple(spawn[0])
             unit_owner_self = True if spawn[3] == 1 else False
@@ -1015,6 +1030,8 @@ class AlgoStrategy(gamelib.AlgoCore):
                     # gamelib.debug_write("Enemy spawned interceptor")
                     # gamelib.debug_write("At: {}".format(location))
                     # gamelib.debug_write("Interceptor: {}".format(self.enemy_interceptor_spawn_locations))
+        if spawns:
+            self.precompute_spawn_locations = {unit_type: self.most_spawn_location(unit_type) for unit_type in [SCOUT, DEMOLISHER]}
 
 
 if __name__ == "__main__":
@@ -16,14 +16,39 @@ Investigating it is useful for advanced players interested in getting data from
 The Navigation class in navigation.py contains functions related to pathfinding, which are used by GameState in pathing related functions. 
 Investigating it is useful for advanced player who want to optimize the slow default pathing algorithm we provide. \n 
 
+The UnitStore class in unit_store.py holds the parsed units of a turn in parallel arrays. 
+Create the GameState with unit_store=True to use it for board wide queries, GameUnits are then only created for the parts of the map you read. \n
+
+The MessageReader class in message_reader.py reads the game engine's messages on a background thread. 
+Set background_reader in your AlgoCore subclass to use it, so slow action frame handling never delays your turn. \n
+
+The TargetingEngine class in targeting.py finds the targets of many attackers at once, the same as GameState.get_target. 
+Get one from GameState.get_targeting_engine when simulating combat. \n
+
+The CombatSimulator class in simulator.py plays out the action phase locally, frame by frame. 
+Get one from GameState.get_combat_simulator to compare candidate attacks by damage dealt, breaches and structures destroyed. \n
+
+The ParallelEvaluator class in parallel.py scores candidate plans on a pool of worker processes. 
+Start it in on_game_start when your strategy scores plans that are slow to score, like simulated attacks. It sends the board to the workers 
+with GameState.serialize_board and returns the scores ready before the given timeout. \n
+
+The TurnBudget class in budget.py tracks the time left in a turn. Get it from GameState.budget to time the phases of your 
+strategy and to stop searches before the turn's time limit. \n
+
 util.py contains a small handful of functions that help with communication, including the debug-printing function, debug_write().
 """
 
 from .algocore import AlgoCore
-from .util import debug_write
+from .util import debug_write, GameMessage
 from .game_state import GameState
 from .unit import GameUnit
 from .game_map import GameMap
-
-__all__ = ["algocore", "game_state", "game_map", "navigation", "unit", "util"]
+from .unit_store import UnitStore
+from .message_reader import MessageReader
+from .budget import TurnBudget
+from .targeting import TargetingEngine
+from .simulator import CombatSimulator, SimulationResult
+from .parallel import ParallelEvaluator
+
+__all__ = ["algocore", "budget", "game_state", "game_map", "message_reader", "navigation", "parallel", "simulator", "targeting", "unit", "unit_store", "util"]
  
\ No newline at end of file
@@ -1,7 +1,9 @@
 import json
+import threading
 
 from .game_state import GameState
-from .util import get_command, debug_write, BANNER_TEXT, send_command
+from .util import get_command, debug_write, BANNER_TEXT, send_command, GameMessage
+from .message_reader import MessageReader
 
 class AlgoCore(object):
     """
@@ -10,10 +12,32 @@ class AlgoCore(object):
 
     Attributes :
         * config (JSON): json object containing information about the game
+        * frame_events (list): The event types on_action_frame uses, like "breach" or "spawn".
+          None, the default, passes every action frame. Otherwise frames without any of these events are skipped
+          and on_action_frame should read the events with the frame's event method, so the rest is never decoded.
+          An empty list skips every action frame
+        * background_reader (bool): If True, start reads the engine's messages on a background thread.
+          Action frames then never delay the response to the next turn, see MessageReader
+        * max_queued_frames (int): The most action frames the background reader queues before coalescing or dropping them
+        * reader (MessageReader): The background reader once started, its counters show how far behind the algo fell
+        * precompute_wait (float): The most seconds a turn waits for a precompute that is still running, 0.05 by default.
+          A precompute still running after that should return once precompute_stopped is True
+        * precomputed: During on_turn, the result of the last precompute that finished during the previous action phase. None otherwise
 
     """
     def __init__(self):
         self.config = None
+        self.frame_events = None
+        self.background_reader = False
+        self.max_queued_frames = 100
+        self.reader = None
+        self.precompute_wait = 0.05
+        self.precomputed = None
+        self.__precompute_lock = threading.Lock()
+        self.__precompute_thread = None
+        self.__next_precompute_frame = None
+        self.__precompute_generation = 0
+        self.__precompute_result = None
 
     def on_game_start(self, config):
         """
@@ -27,6 +51,7 @@ class AlgoCore(object):
         """
         This step function is called at the start of each turn.
         It is passed the current game state, which can be used to initiate a new GameState object. 
+        The game state is a GameMessage, a string that keeps its decoded JSON in its data attribute. 
         By default, it sends empty commands to the game engine. \n
         algo_strategy.py inherits from AlgoCore and overrides this on turn function. 
         Adjusting the on_turn function in algo_strategy is the main way to adjust your algo's logic. 
@@ -40,56 +65,148 @@ class AlgoCore(object):
         The action phase is made up of a sequence of distinct frames. 
         Each of these frames is sent to the algo in order. 
         They can be handled in this function. 
+        Each frame is a GameMessage, use its data attribute or its event method rather than decoding the string again.
         """
         pass
 
+    def on_game_end(self):
+        """
+        This function is called once when the game is over, or when the game engine's output ends.
+        By default, it does nothing. \n
+        You can override it in algo_strategy.py to stop anything started in on_game_start, like the workers of a ParallelEvaluator.
+        """
+        pass
+
+    def precompute(self, action_frame_game_state):
+        """
+        Override this to prepare work for the next turn while the action phase plays out.
+        It is called on a worker thread with the latest action frame, every frame included even the ones on_action_frame skips.
+        Frames that arrive while it runs are not queued, it is called again with the newest one once it returns. \n
+        The value returned by the last call that finished before the next turn message is available as
+        self.precomputed in on_turn. The real turn can differ from the frame, so on_turn should check the result
+        against its GameState, and patch or discard it. \n
+        It runs alongside on_action_frame, so it should only read attributes that on_action_frame replaces as a whole,
+        like a snapshot, not ones it changes in place. Long work should check precompute_stopped and return once it is True,
+        so it does not compete with on_turn. By default it does nothing and no worker is started.
+        """
+        return None
+
+    def precompute_stopped(self):
+        """Checks, from inside precompute, if its result is no longer wanted because the next turn has started
+
+        Returns:
+            True once the turn has started, or when called outside a running precompute
+
+        """
+        return threading.current_thread() is not self.__precompute_thread
+
+    def __schedule_precompute(self, frame):
+        """
+        Hands a frame to the precompute worker, starting the worker if it is idle.
+        """
+        if type(self).precompute is AlgoCore.precompute:
+            return
+        with self.__precompute_lock:
+            self.__next_precompute_frame = frame
+            if self.__precompute_thread is None:
+                self.__precompute_thread = threading.Thread(target=self.__run_precompute, args=(self.__precompute_generation,), name="Precompute", daemon=True)
+                self.__precompute_thread.start()
+
+    def __run_precompute(self, generation):
+        while True:
+            with self.__precompute_lock:
+                frame = self.__next_precompute_frame
+                self.__next_precompute_frame = None
+                if frame is None or generation != self.__precompute_generation:
+                    if self.__precompute_thread is threading.current_thread():
+                        self.__precompute_thread = None
+                    return
+            try:
+                result = self.precompute(frame)
+            except Exception as error:
+                debug_write("precompute failed: {}".format(error))
+                result = None
+            with self.__precompute_lock:
+                if generation == self.__precompute_generation:
+                    self.__precompute_result = result
+
+    def __take_precomputed(self):
+        """
+        Collects the last finished precompute result for the turn starting now, waiting up to precompute_wait for one still running.
+        Work still running after that sees precompute_stopped become True, and its result is discarded.
+        """
+        thread = self.__precompute_thread
+        if thread is not None and self.precompute_wait > 0:
+            thread.join(self.precompute_wait)
+        with self.__precompute_lock:
+            result = self.__precompute_result
+            self.__precompute_result = None
+            self.__next_precompute_frame = None
+            self.__precompute_generation += 1
+            self.__precompute_thread = None
+        return result
 
     def start(self):
         """ 
         Start the parsing loop.
         After starting the algo, it will wait until it recieves information from the game 
         engine, proccess this information, and respond if needed to take it's turn. 
-        The algo continues this loop until it recieves the "End" turn message from the game.
+        The algo continues this loop until it recieves the "End" turn message from the game, then calls on_game_end.
         """
         debug_write(BANNER_TEXT)
 
-        while True:
-            # Note: Python blocks and hangs on stdin. Can cause issues if connections aren't setup properly and may need to
-            # manually kill this Python program.
-            game_state_string = get_command()
-            if "replaySave" in game_state_string:
-                """
-                This means this must be the config file. So, load in the config file as a json and add it to your AlgoStrategy class.
-                """
-                parsed_config = json.loads(game_state_string)
-                self.on_game_start(parsed_config)
-            elif "turnInfo" in game_state_string:
-                state = json.loads(game_state_string)
-                stateType = int(state.get("turnInfo")[0])
-                if stateType == 0:
-                    """
-                    This is the game turn game state message. Algo must now print to stdout 2 lines, one for build phase one for
-                    deploy phase. Printing is handled by the provided functions.
-                    """
-                    self.on_turn(game_state_string)
-                elif stateType == 1:
-                    """
-                    If stateType == 1, this game_state_string string represents a single frame of an action phase
-                    """
-                    self.on_action_frame(game_state_string)
-                elif stateType == 2:
+        if self.background_reader:
+            self.reader = MessageReader(self.max_queued_frames, self.frame_events, on_frame=self.__schedule_precompute)
+            self.reader.start()
+
+        try:
+            while True:
+                # Note: Python blocks and hangs on stdin. Can cause issues if connections aren't setup properly and may need to
+                # manually kill this Python program.
+                if self.reader:
+                    self.reader.frame_events = self.frame_events
+                    game_state_string = self.reader.get()
+                else:
+                    game_state_string = GameMessage(get_command())
+                if "replaySave" in game_state_string:
                     """
-                    This is the end game message. This means the game is over so break and finish the program.
+                    This means this must be the config file. So, load in the config file as a json and add it to your AlgoStrategy class.
                     """
-                    debug_write("Got end state, game over. Stopping algo.")
-                    break
+                    parsed_config = game_state_string.data
+                    self.on_game_start(parsed_config)
+                elif "turnInfo" in game_state_string:
+                    stateType = int(game_state_string.field("turnInfo")[0])
+                    if stateType == 0:
+                        """
+                        This is the game turn game state message. Algo must now print to stdout 2 lines, one for build phase one for
+                        deploy phase. Printing is handled by the provided functions.
+                        """
+                        self.precomputed = self.__take_precomputed()
+                        self.on_turn(game_state_string)
+                        self.precomputed = None
+                    elif stateType == 1:
+                        """
+                        If stateType == 1, this game_state_string string represents a single frame of an action phase
+                        """
+                        if not self.reader:
+                            self.__schedule_precompute(game_state_string)
+                        if self.frame_events is None or game_state_string.has_events(self.frame_events):
+                            self.on_action_frame(game_state_string)
+                    elif stateType == 2:
+                        """
+                        This is the end game message. This means the game is over so break and finish the program.
+                        """
+                        debug_write("Got end state, game over. Stopping algo.")
+                        break
+                    else:
+                        """
+                        Something is wrong? Received an incorrect or improperly formatted string.
+                        """
+                        debug_write("Got unexpected string with turnInfo: {}".format(game_state_string))
                 else:
                     """
                     Something is wrong? Received an incorrect or improperly formatted string.
                     """
-                    debug_write("Got unexpected string with turnInfo: {}".format(game_state_string))
-            else:
-                """
-                Something is wrong? Received an incorrect or improperly formatted string.
-                """
-                debug_write("Got unexpected string : {}".format(game_state_string))
+                    debug_write("Got unexpected string : {}".format(game_state_string))
+        finally:
+            self.on_game_end()
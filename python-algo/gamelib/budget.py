@@ -0,0 +1,123 @@
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+DEFAULT_TURN_LIMIT = 5.0
+DEFAULT_MARGIN = 0.5
+
+
+class TurnBudget:
+    """Tracks how much of the turn's time limit is left, for searches that can stop early with a good enough answer.
+    Get the budget of a turn from GameState.budget.
+
+    Anytime searches poll expired, or hand their candidates to best_of, which stops evaluating once the
+    budget runs out and falls back to the best plan found so far. A search spread over a whole turn can
+    offer its plans as it goes and submit best when the budget expires. Time spent in each phase of a turn
+    is recorded with phase, report gives a summary to pass to debug_write.
+
+    Attributes :
+        * limit (float): Seconds the turn may take before the engine penalizes it
+        * margin (float): Seconds kept in reserve for submitting the turn, the budget expires this long before the limit
+        * started (float): The clock time the turn started at
+        * previous_turn_time (float): Seconds the engine measured for your previous turn, from GameState.my_time
+        * phases (OrderedDict): Seconds spent in each phase, by phase name, in the order the phases first ran
+        * best: The best plan offered so far, None if there is none
+        * best_score: The score of best
+
+    """
+    def __init__(self, limit=DEFAULT_TURN_LIMIT, margin=DEFAULT_MARGIN, started=None, previous_turn_time=0, clock=time.perf_counter):
+        """Starts a budget
+
+        Args:
+            limit: Seconds the turn may take
+            margin: Seconds kept in reserve before the limit
+            started: The clock time the turn started at, now if None
+            previous_turn_time: Seconds the engine measured for the previous turn
+            clock: The function giving the current time in seconds, time.perf_counter by default
+
+        """
+        self.limit = limit
+        self.margin = margin
+        self.started = clock() if started is None else started
+        self.previous_turn_time = previous_turn_time
+        self.phases = OrderedDict()
+        self.best = None
+        self.best_score = None
+        self.__clock = clock
+
+    def elapsed(self):
+        """Returns the seconds since the turn started
+        """
+        return self.__clock() - self.started
+
+    def remaining(self):
+        """Returns the seconds left before the budget expires, negative once it has
+        """
+        return self.limit - self.margin - self.elapsed()
+
+    def expired(self):
+        """Returns True once the turn should stop searching and submit
+        """
+        return self.remaining() <= 0
+
+    @contextmanager
+    def phase(self, name):
+        """Records the time spent in a block of code, e.g. with game_state.budget.phase("defence"):
+        Time is added up if the same phase runs more than once.
+
+        Args:
+            name: The name of the phase
+
+        """
+        start = self.__clock()
+        try:
+            yield self
+        finally:
+            self.phases[name] = self.phases.get(name, 0) + self.__clock() - start
+
+    def offer(self, plan, score):
+        """Keeps a plan if it scores better than the best one so far
+
+        Args:
+            plan: Any plan, e.g. a list of placements
+            score: The plan's score, higher is better
+
+        Returns:
+            True if the plan is the new best
+
+        """
+        if self.best_score is None or score > self.best_score:
+            self.best = plan
+            self.best_score = score
+            return True
+        return False
+
+    def best_of(self, candidates, evaluate, fallback=None):
+        """Evaluates candidates until they run out or the budget expires
+
+        Args:
+            candidates: An iterable of plans, best guesses first so the early ones are the ones evaluated
+            evaluate: A function giving the score of a plan, higher is better
+            fallback: The plan to return if not even one candidate was evaluated
+
+        Returns:
+            The best plan found, the first of them on a tie
+
+        """
+        best = fallback
+        best_score = None
+        for plan in candidates:
+            if self.expired():
+                break
+            score = evaluate(plan)
+            if best_score is None or score > best_score:
+                best = plan
+                best_score = score
+        return best
+
+    def report(self):
+        """Returns a line listing the time spent in every phase and in total, in milliseconds
+        """
+        parts = ["{}: {:.1f}ms".format(name, seconds * 1000) for name, seconds in self.phases.items()]
+        parts.append("total: {:.1f}ms of {:.0f}ms".format(self.elapsed() * 1000, self.limit * 1000))
+        return ", ".join(parts)
@@ -1,7 +1,95 @@
+import copy
+import hashlib
 import math
+from array import array
 from .unit import GameUnit
 from .util import debug_write
 
+ARENA_SIZE = 28
+HALF_ARENA = ARENA_SIZE // 2
+
+def _in_diamond(x, y):
+    """The diamond shaped board test, for any coordinates
+    """
+    row_size = y + 1
+    startx = HALF_ARENA - row_size
+    endx = startx + (2 * row_size) - 1
+    top_half_check = (y < HALF_ARENA and x >= startx and x <= endx)
+
+    row_size = (ARENA_SIZE - 1 - y) + 1
+    startx = HALF_ARENA - row_size
+    endx = startx + (2 * row_size) - 1
+    bottom_half_check = (y >= HALF_ARENA and x >= startx and x <= endx)
+
+    return bottom_half_check or top_half_check
+
+def _build_geometry():
+    """Builds the geometry tables shared by every GameMap.
+
+    Returns:
+        The in arena flags indexed x * ARENA_SIZE + y, the (x, y) tuples of the arena in the order GameMap iterates them,
+        and the four edges as tuples of (x, y) tuples, in the order of get_edges.
+    """
+    in_arena = tuple(_in_diamond(x, y) for x in range(ARENA_SIZE) for y in range(ARENA_SIZE))
+    locations = tuple((x, y) for y in range(ARENA_SIZE) for x in range(ARENA_SIZE) if in_arena[x * ARENA_SIZE + y])
+    top_right = tuple((HALF_ARENA + num, ARENA_SIZE - 1 - num) for num in range(HALF_ARENA))
+    top_left = tuple((HALF_ARENA - 1 - num, ARENA_SIZE - 1 - num) for num in range(HALF_ARENA))
+    bottom_left = tuple((HALF_ARENA - 1 - num, num) for num in range(HALF_ARENA))
+    bottom_right = tuple((HALF_ARENA + num, num) for num in range(HALF_ARENA))
+    return in_arena, locations, (top_right, top_left, bottom_left, bottom_right)
+
+IN_ARENA, ARENA_LOCATIONS, EDGES = _build_geometry()
+EDGE_SETS = tuple(frozenset(edge) for edge in EDGES)
+ARENA_MASK = sum(1 << (x * ARENA_SIZE + y) for x, y in ARENA_LOCATIONS)
+_DISK_OFFSETS = {}
+_LOCATIONS_IN_RANGE = {}
+_ZOBRIST_KEYS = {}
+_REGION_MASKS = {}
+_THREATENED_CELLS = {}
+
+def zobrist_key(index, player_index, unit_type, upgraded):
+    """The Zobrist key of a structure, the same in every process so hashes can be shared and stored
+
+    Args:
+        index: The location of the structure, x * ARENA_SIZE + y
+        player_index: The player that controls the structure
+        unit_type: The type of the structure
+        upgraded: If the structure is upgraded
+
+    Returns:
+        A 64 bit int
+    """
+    key = (index, player_index, unit_type, upgraded)
+    value = _ZOBRIST_KEYS.get(key)
+    if value is None:
+        value = int.from_bytes(hashlib.blake2b(repr(key).encode(), digest_size=8).digest(), "big")
+        _ZOBRIST_KEYS[key] = value
+    return value
+
+def count_bits(bits):
+    """Number of locations set in a bitboard
+    """
+    return bin(bits).count("1")
+
+def _threatened_cells(index, attack_range, limit):
+    """The arena locations an attacker at index can hit, as GameState.get_attackers finds them:
+    within attack_range of the attacker and closer than limit, the radius get_attackers searches.
+    """
+    key = (index, attack_range, limit)
+    cells = _THREATENED_CELLS.get(key)
+    if cells is None:
+        x, y = divmod(index, ARENA_SIZE)
+        reach = int(math.ceil(attack_range))
+        cells = []
+        for target_x in range(max(x - reach, 0), min(x + reach, ARENA_SIZE - 1) + 1):
+            for target_y in range(max(y - reach, 0), min(y + reach, ARENA_SIZE - 1) + 1):
+                distance = math.sqrt((target_x - x)**2 + (target_y - y)**2)
+                if IN_ARENA[target_x * ARENA_SIZE + target_y] and distance <= attack_range and distance < limit:
+                    cells.append(target_x * ARENA_SIZE + target_y)
+        cells = tuple(cells)
+        _THREATENED_CELLS[key] = cells
+    return cells
+
 class GameMap:
     """Holds data about the current game map and provides functions
     useful for getting information related to the map.
@@ -19,6 +107,15 @@ class GameMap:
         * BOTTOM_LEFT (int): Hidden challenge! Can you guess what this constant represents???
         * BOTTOM_RIGHT (int): A constant that represents the bottom right edge
 
+    Structures are also tracked in a flat blocked layout, see blocked_layout(), units in bitboards,
+    see structure_bits() and unit_bits(), and structures in a Zobrist hash, see zobrist_hash(). Once it is first asked for,
+    the threat of every attacking unit is kept in a threat map, see attacker_counts() and threat_damage().
+    Edit the map through add_unit, remove_unit, place_unit or game_map[x, y] = units so they stay in sync.
+
+    fork() makes a copy of the map that shares its columns with the original until either map edits them.
+    Units are shared between forks, upgrade_unit copies a shared unit before upgrading it. Change units through
+    the GameMap methods rather than directly, which also lets GameState transactions roll them back.
+
     """
     def __init__(self, config):
         """Initializes constants and game map
@@ -36,45 +133,367 @@ class GameMap:
         self.BOTTOM_LEFT = 2
         self.BOTTOM_RIGHT = 3
         self.__map = self.__empty_grid()
-        self.__start = [13,0]
+        self.__owned = [True] * self.ARENA_SIZE
+        self.__shared_units = [False] * self.ARENA_SIZE
+        self.__journal = None
+        self.__store = None
+        self.__store_columns = None
+        self.__blocked = bytearray(self.ARENA_SIZE * self.ARENA_SIZE)
+        self.__layout = None
+        self.__structure_bits = [0, 0]
+        self.__unit_bits = [{}, {}]
+        self.__cell_kinds = [frozenset()] * (self.ARENA_SIZE * self.ARENA_SIZE)
+        self.__cell_keys = [0] * (self.ARENA_SIZE * self.ARENA_SIZE)
+        self.__zobrist = 0
+        self.__cell_attackers = [()] * (self.ARENA_SIZE * self.ARENA_SIZE)
+        self.__threat = None
+        self.__start = 0
     
+    def fork(self):
+        """Makes a copy of the map for building hypothetical boards.
+        Columns are shared with this map and only copied once one of the two maps edits them.
+
+        Returns:
+            A new GameMap with the same units
+
+        """
+        fork = copy.copy(self)
+        fork.__map = list(self.__map)
+        fork.__owned = [False] * self.ARENA_SIZE
+        self.__owned = [False] * self.ARENA_SIZE
+        self.__shared_units = [True] * self.ARENA_SIZE
+        fork.__shared_units = [True] * self.ARENA_SIZE
+        fork.__blocked = bytearray(self.__blocked)
+        fork.__structure_bits = list(self.__structure_bits)
+        fork.__unit_bits = [dict(player_bits) for player_bits in self.__unit_bits]
+        fork.__cell_kinds = list(self.__cell_kinds)
+        fork.__cell_keys = list(self.__cell_keys)
+        fork.__cell_attackers = list(self.__cell_attackers)
+        if self.__threat is not None:
+            counts, damage = self.__threat
+            fork.__threat = ([array('i', player_counts) for player_counts in counts], [array('d', player_damage) for player_damage in damage])
+        fork.__journal = None
+        fork.__start = 0
+        return fork
+
+    def __column(self, x):
+        """Gets a column of the map for editing, copying it first if it is shared with a fork
+        """
+        if self.__map[x] is None:
+            return self.__build_column(x)
+        if not self.__owned[x]:
+            self.__map[x] = [list(units) for units in self.__map[x]]
+            self.__owned[x] = True
+        return self.__map[x]
+
+    def __build_column(self, x):
+        """Creates the GameUnits of a column that was loaded from a UnitStore
+        """
+        column = self.__empty_column()
+        for index in self.__store_columns[x]:
+            column[self.__store.y[index]].append(self.__store.make_unit(index))
+        self.__map[x] = column
+        self.__owned[x] = True
+        return column
+
+    def load_store(self, store):
+        """Fills the map with the units of a UnitStore. GameUnits are only created for a column
+        once one of its locations is read or edited, the blocked layout, bitboards and hash are set right away.
+
+        Args:
+            store: The UnitStore to load, the map should be empty
+
+        """
+        self.__store = store
+        self.__store_columns = [[] for _ in range(self.ARENA_SIZE)]
+        cells = {}
+        for index in range(len(store)):
+            x, y = store.x[index], store.y[index]
+            if not (0 <= x < ARENA_SIZE and 0 <= y < ARENA_SIZE and IN_ARENA[x * ARENA_SIZE + y]):
+                self._invalid_coordinates([x, y])
+                continue
+            self.__store_columns[x].append(index)
+            cells.setdefault((x, y), []).append(index)
+        for x in range(self.ARENA_SIZE):
+            if self.__store_columns[x]:
+                self.__map[x] = None
+
+        for (x, y), indices in cells.items():
+            location = x * self.ARENA_SIZE + y
+            blocked = False
+            cell_key = 0
+            kinds = set()
+            attackers = []
+            for index in indices:
+                stats = store.stats(index)
+                player_index = store.player_index[index]
+                if stats.stationary:
+                    blocked = True
+                    cell_key ^= zobrist_key(location, player_index, stats.unit_type, stats.upgraded)
+                kinds.add((player_index, stats.unit_type, stats.stationary))
+                if stats.damage_i + stats.damage_f > 0:
+                    attackers.append((player_index, stats.attackRange, stats.damage_i))
+            self.__set_location_state(location, frozenset(kinds), cell_key, blocked, tuple(attackers))
+
+    def __edit(self, x, y):
+        """Gets the column holding a location for editing. While a journal is open, the units at the location
+        are logged first and replaced by a copy of their list.
+        """
+        column = self.__column(x)
+        if self.__journal is not None:
+            self.__journal.append((x, y, column[y]))
+            column[y] = list(column[y])
+        return column
+
+    def _journal_mark(self):
+        """Opens the journal of edits if needed and returns its current position, see GameState.begin
+        """
+        if self.__journal is None:
+            self.__journal = []
+        return len(self.__journal)
+
+    def _rollback_journal(self, mark):
+        """Undoes the journaled edits made after the given position
+        """
+        while len(self.__journal) > mark:
+            x, y, units = self.__journal.pop()
+            self.__column(x)[y] = units
+            self.__sync_location(x, y)
+
+    def _close_journal(self):
+        """Stops journaling edits
+        """
+        self.__journal = None
+
     def __getitem__(self, location):
         if len(location) == 2 and self.in_arena_bounds(location):
             x,y = location
-            return self.__map[x][y]
+            column = self.__map[x]
+            if column is None:
+                column = self.__build_column(x)
+            return column[y]
         self._invalid_coordinates(location)
 
     def __setitem__(self, location, val):
         if type(location) == tuple and len(location) == 2 and self.in_arena_bounds(location):
-            self.__map[location[0]][location[1]] = val
+            self.__edit(location[0], location[1])[location[1]] = val
+            self.__sync_location(location[0], location[1])
             return
         self._invalid_coordinates(location)
 
     def __iter__(self):
-        self.__start = [13,0]
+        self.__start = 0
         return self
     
     def __next__(self):
-        location = self.__start
-        if location == [15,27]:
+        if self.__start >= len(ARENA_LOCATIONS):
             raise StopIteration
-        new_location = [location[0]+1, location[1]]
-        while not self.in_arena_bounds(new_location) and not location == [14,27]:
-            if new_location[0] == self.ARENA_SIZE:
-                new_location = [0, new_location[1]+1]
-            else:
-                new_location = [new_location[0]+1, new_location[1]]
-        self.__start = new_location
-        return location 
+        x, y = ARENA_LOCATIONS[self.__start]
+        self.__start += 1
+        return [x, y]
 
     def __empty_grid(self):
         grid = []
         for x in range(0, self.ARENA_SIZE):
-            grid.append([])
-            for _ in range(0, self.ARENA_SIZE):
-                grid[x].append([])
+            grid.append(self.__empty_column())
         return grid
 
+    def __empty_column(self):
+        return [[] for _ in range(0, self.ARENA_SIZE)]
+
+    def __sync_location(self, x, y):
+        """Refreshes the blocked flag, bitboards, hash and threat of a location after its units changed
+        """
+        if not self.in_arena_bounds([x, y]):
+            return
+        #Same indexing as navigation.location_index
+        index = x * self.ARENA_SIZE + y
+        blocked = False
+        cell_key = 0
+        kinds = set()
+        attackers = []
+        for unit in self.__map[x][y]:
+            stats = unit.stats
+            if stats.stationary:
+                blocked = True
+                cell_key ^= zobrist_key(index, unit.player_index, stats.unit_type, stats.upgraded)
+            kinds.add((unit.player_index, stats.unit_type, stats.stationary))
+            if stats.damage_i + stats.damage_f > 0:
+                attackers.append((unit.player_index, stats.attackRange, stats.damage_i))
+        self.__set_location_state(index, frozenset(kinds), cell_key, blocked, tuple(attackers))
+
+    def __set_location_state(self, index, kinds, cell_key, blocked, attackers):
+        """Stores what a location holds in the blocked layout, bitboards, hash and threat map
+
+        Args:
+            index: The location, x * ARENA_SIZE + y
+            kinds: A frozenset of the (player_index, unit_type, stationary) of the units at the location
+            cell_key: The Zobrist keys of the structures at the location, xored together
+            blocked: If a structure is at the location
+            attackers: The (player_index, attackRange, damage_i) of every unit at the location that deals damage
+
+        """
+        #Bitboards only change when the owners or types at the location do
+        old_kinds = self.__cell_kinds[index]
+        if kinds != old_kinds:
+            bit = 1 << index
+            for player_index, unit_type, stationary in old_kinds:
+                if player_index in (0, 1):
+                    self.__unit_bits[player_index][unit_type] &= ~bit
+                    if stationary:
+                        self.__structure_bits[player_index] &= ~bit
+            for player_index, unit_type, stationary in kinds:
+                if player_index in (0, 1):
+                    player_bits = self.__unit_bits[player_index]
+                    player_bits[unit_type] = player_bits.get(unit_type, 0) | bit
+                    if stationary:
+                        self.__structure_bits[player_index] |= bit
+            self.__cell_kinds[index] = kinds
+        if self.__cell_keys[index] != cell_key:
+            self.__zobrist ^= self.__cell_keys[index] ^ cell_key
+            self.__cell_keys[index] = cell_key
+        if self.__blocked[index] != blocked:
+            self.__blocked[index] = blocked
+            self.__layout = None
+        if self.__cell_attackers[index] != attackers:
+            if self.__threat is not None:
+                self.__add_threat(index, self.__cell_attackers[index], -1)
+                self.__add_threat(index, attackers, 1)
+            self.__cell_attackers[index] = attackers
+
+    def __add_threat(self, index, attackers, sign):
+        """Adds the threat of the attackers at a location to the threat map, or takes it away if sign is -1
+        """
+        counts, damage = self.__threat
+        for player_index, attack_range, damage_i in attackers:
+            if player_index not in (0, 1):
+                continue
+            player_counts = counts[player_index]
+            player_damage = damage[player_index]
+            for cell in _threatened_cells(index, attack_range, self.__threat_limit):
+                player_counts[cell] += sign
+                player_damage[cell] = player_damage[cell] + sign * damage_i if player_counts[cell] else 0.0
+
+    def __build_threat(self):
+        """Builds the threat map from the attackers on the map, it is kept up to date from then on
+        """
+        #The radius GameState.get_attackers searches, attackers further than this are never found
+        max_range = 0
+        for unit in self.config["unitInformation"]:
+            if unit.get('attackRange', 0) >= max_range:
+                max_range = unit.get('attackRange', 0)
+        self.__threat_limit = max_range + self.config["unitInformation"][0]['getHitRadius']
+        size = self.ARENA_SIZE * self.ARENA_SIZE
+        self.__threat = ([array('i', bytes(4 * size)) for _ in range(2)], [array('d', bytes(8 * size)) for _ in range(2)])
+        for index, attackers in enumerate(self.__cell_attackers):
+            if attackers:
+                self.__add_threat(index, attackers, 1)
+
+    def attacker_counts(self, player_index):
+        """Gets how many units would attack a mobile unit of a player at every location, the same as len(GameState.get_attackers)
+
+        Args:
+            player_index: The player controlling the hypothetical defender, 0 for you 1 for the enemy
+
+        Returns:
+            An array indexed x * ARENA_SIZE + y. It is updated in place as the map changes, so do not modify it and copy it to keep a snapshot.
+
+        """
+        if self.__threat is None:
+            self.__build_threat()
+        return self.__threat[0][1 - player_index]
+
+    def threat_damage(self, player_index):
+        """Gets the damage per frame a mobile unit of a player would take at every location, the damage_i of its attackers added up
+
+        Args:
+            player_index: The player controlling the hypothetical defender, 0 for you 1 for the enemy
+
+        Returns:
+            An array indexed x * ARENA_SIZE + y. It is updated in place as the map changes, so do not modify it and copy it to keep a snapshot.
+
+        """
+        if self.__threat is None:
+            self.__build_threat()
+        return self.__threat[1][1 - player_index]
+
+    def blocked_layout(self):
+        """Gets the layout of the structures on the map
+
+        Returns:
+            A bytes object with one entry per location, indexed x * ARENA_SIZE + y, that is 1 where a structure blocks the location.
+            The same object is returned until a structure is added or removed, so it can be used as a cache key.
+
+        """
+        if self.__layout is None:
+            self.__layout = bytes(self.__blocked)
+        return self.__layout
+
+    def zobrist_hash(self):
+        """Gets a hash of the structures on the map, their owners, types and upgrades.
+        It is updated with every edit, so it is cheap to use as a key for caching results about a board,
+        across turns and across forks. Mobile units are not part of the hash.
+
+        Returns:
+            A 64 bit int, equal for maps holding the same structures
+
+        """
+        return self.__zobrist
+
+    def structure_bits(self, player_index=None):
+        """Gets a bitboard of the locations holding structures
+
+        Args:
+            player_index: Only count structures of this player, 0 for you 1 for the enemy. Both players if None.
+
+        Returns:
+            An int with bit x * ARENA_SIZE + y set for every location [x, y] holding a matching structure
+
+        """
+        if player_index is None:
+            return self.__structure_bits[0] | self.__structure_bits[1]
+        return self.__structure_bits[player_index]
+
+    def unit_bits(self, unit_type, player_index=None):
+        """Gets a bitboard of the locations holding at least one unit of a type
+
+        Args:
+            unit_type: The type of unit to look for
+            player_index: Only count units of this player, 0 for you 1 for the enemy. Both players if None.
+
+        Returns:
+            An int with bit x * ARENA_SIZE + y set for every location [x, y] holding a matching unit
+
+        """
+        if player_index is None:
+            return self.__unit_bits[0].get(unit_type, 0) | self.__unit_bits[1].get(unit_type, 0)
+        return self.__unit_bits[player_index].get(unit_type, 0)
+
+    def region_bits(self, valid_x=None, valid_y=None):
+        """Gets a bitboard of the arena locations inside a region
+
+        Args:
+            valid_x: The allowed x coordinates, any x if None
+            valid_y: The allowed y coordinates, any y if None
+
+        Returns:
+            An int with bit x * ARENA_SIZE + y set for every location [x, y] in the arena with x in valid_x and y in valid_y
+
+        """
+        key = (None if valid_x is None else tuple(valid_x), None if valid_y is None else tuple(valid_y))
+        mask = _REGION_MASKS.get(key)
+        if mask is None:
+            xs = range(self.ARENA_SIZE) if valid_x is None else set(valid_x)
+            ys = range(self.ARENA_SIZE) if valid_y is None else set(valid_y)
+            mask = 0
+            for x in xs:
+                for y in ys:
+                    if 0 <= x < self.ARENA_SIZE and 0 <= y < self.ARENA_SIZE:
+                        mask |= 1 << (x * self.ARENA_SIZE + y)
+            mask &= ARENA_MASK
+            _REGION_MASKS[key] = mask
+        return mask
+
     def _invalid_coordinates(self, location):
         self.warn("{} is out of bounds.".format(str(location)))
 
@@ -89,19 +508,9 @@ class GameMap:
         
         """
         x, y = location
-        half_board = self.HALF_ARENA
-
-        row_size = y + 1
-        startx = half_board - row_size
-        endx = startx + (2 * row_size) - 1
-        top_half_check = (y < self.HALF_ARENA and x >= startx and x <= endx)
-
-        row_size = (self.ARENA_SIZE - 1 - y) + 1
-        startx = half_board - row_size
-        endx = startx + (2 * row_size) - 1
-        bottom_half_check = (y >= self.HALF_ARENA and x >= startx and x <= endx)
-
-        return bottom_half_check or top_half_check
+        if type(x) is int and type(y) is int:
+            return 0 <= x < ARENA_SIZE and 0 <= y < ARENA_SIZE and IN_ARENA[x * ARENA_SIZE + y]
+        return _in_diamond(x, y)
 
     def get_edge_locations(self, quadrant_description):
         """Takes in an edge description and returns a list of locations.
@@ -117,8 +526,7 @@ class GameMap:
             self.warn("Passed invalid quadrant_description '{}'. See the documentation for valid inputs for get_edge_locations.".format(quadrant_description))
             return
 
-        edges = self.get_edges()
-        return edges[quadrant_description]
+        return [[x, y] for x, y in EDGES[quadrant_description]]
 
     def get_edges(self):
         """Gets all of the edges and their edge locations
@@ -127,27 +535,7 @@ class GameMap:
             A list with four lists inside of it of locations corresponding to the four edges.
             [0] = top_right, [1] = top_left, [2] = bottom_left, [3] = bottom_right.
         """
-        top_right = []
-        for num in range(0, self.HALF_ARENA):
-            x = self.HALF_ARENA + num
-            y = self.ARENA_SIZE - 1 - num
-            top_right.append([int(x), int(y)])
-        top_left = []
-        for num in range(0, self.HALF_ARENA):
-            x = self.HALF_ARENA - 1 - num
-            y = self.ARENA_SIZE - 1 - num
-            top_left.append([int(x), int(y)])
-        bottom_left = []
-        for num in range(0, self.HALF_ARENA):
-            x = self.HALF_ARENA - 1 - num
-            y = num
-            bottom_left.append([int(x), int(y)])
-        bottom_right = []
-        for num in range(0, self.HALF_ARENA):
-            x = self.HALF_ARENA + num
-            y = num
-            bottom_right.append([int(x), int(y)])
-        return [top_right, top_left, bottom_left, bottom_right]
+        return [[[x, y] for x, y in edge] for edge in EDGES]
     
     def add_unit(self, unit_type, location, player_index=0):
         """Add a single GameUnit to the map at the given location.
@@ -168,10 +556,31 @@ class GameMap:
 
         x, y = location
         new_unit = GameUnit(unit_type, self.config, player_index, None, location[0], location[1])
+        column = self.__edit(x, y)
         if not new_unit.stationary:
-            self.__map[x][y].append(new_unit)
+            column[y].append(new_unit)
         else:
-            self.__map[x][y] = [new_unit]
+            column[y] = [new_unit]
+        self.__sync_location(x, y)
+
+    def place_unit(self, unit):
+        """Add an existing GameUnit to the map at the unit's own location, stacking it with the units already there.
+        It goes after the units of its own player and before those of a higher player index, the order the turn lists them in.
+
+        Args:
+            unit: The GameUnit to place. Its x and y attributes must be set.
+
+        Used by GameState when parsing the turn. Like add_unit, this only changes the data stored in GameMap.
+        """
+        if not self.in_arena_bounds([unit.x, unit.y]):
+            self._invalid_coordinates([unit.x, unit.y])
+            return
+        units = self.__edit(unit.x, unit.y)[unit.y]
+        position = len(units)
+        while position > 0 and unit.player_index is not None and units[position - 1].player_index is not None and units[position - 1].player_index > unit.player_index:
+            position -= 1
+        units.insert(position, unit)
+        self.__sync_location(unit.x, unit.y)
 
     def remove_unit(self, location):
         """Remove all units on the map in the given location.
@@ -186,7 +595,36 @@ class GameMap:
             self._invalid_coordinates(location)
         
         x, y = location
-        self.__map[x][y] = []
+        self.__edit(x, y)[y] = []
+        self.__sync_location(x, y)
+
+    def upgrade_unit(self, location):
+        """Upgrade the structure in the given location.
+
+        Args:
+            location: The location of the structure to upgrade
+
+        Returns:
+            The upgraded GameUnit, or None if there is no structure at the location
+
+        Like add_unit, this only changes the data stored in GameMap. Use GameState.attempt_upgrade to upgrade during your turn.
+        """
+        if not self.in_arena_bounds(location):
+            self._invalid_coordinates(location)
+            return
+        x, y = location
+        units = self.__edit(x, y)[y]
+        structure = None
+        for i, unit in enumerate(units):
+            if unit.stationary:
+                structure = i
+        if structure is None:
+            return
+        if self.__shared_units[x] or self.__journal is not None:
+            units[structure] = copy.copy(units[structure])
+        units[structure].upgrade()
+        self.__sync_location(x, y)
+        return units[structure]
 
     def get_locations_in_range(self, location, radius):
         """Gets locations in a circular area around a location
@@ -204,17 +642,22 @@ class GameMap:
         if not self.in_arena_bounds(location):
             self._invalid_coordinates(location)
 
-        x, y = location
-        locations = []
-        search_radius = math.ceil(radius)
         getHitRadius = self.config["unitInformation"][0]['getHitRadius']
-        for i in range(int(x - search_radius), int(x + search_radius + 1)):
-            for j in range(int(y - search_radius), int(y + search_radius + 1)):
-                new_location = [i, j]
+        x, y = location
+        key = (x, y, radius, getHitRadius)
+        locations = _LOCATIONS_IN_RANGE.get(key)
+        if locations is None:
+            offsets = _DISK_OFFSETS.get((radius, getHitRadius))
+            if offsets is None:
                 # A unit with a given range affects all locations who's centers are within that range + get hit radius
-                if self.in_arena_bounds(new_location) and self.distance_between_locations(location, new_location) < radius + getHitRadius:
-                    locations.append(new_location)
-        return locations
+                search_radius = int(math.ceil(radius))
+                offsets = tuple((dx, dy) for dx in range(-search_radius, search_radius + 1) for dy in range(-search_radius, search_radius + 1)
+                                if math.sqrt(dx**2 + dy**2) < radius + getHitRadius)
+                _DISK_OFFSETS[(radius, getHitRadius)] = offsets
+            locations = tuple((x + dx, y + dy) for dx, dy in offsets if self.in_arena_bounds([x + dx, y + dy]))
+            if self.in_arena_bounds(location):
+                _LOCATIONS_IN_RANGE[key] = locations
+        return [[i, j] for i, j in locations]
 
     def distance_between_locations(self, location_1, location_2):
         """Euclidean distance
@@ -1,11 +1,17 @@
+import copy
 import math
 import json
 import sys
+import time
 
-from .navigation import ShortestPathFinder
-from .util import send_command, debug_write
+from .navigation import ShortestPathFinder, NumpyPathFinder, numpy_available
+from .util import send_command, debug_write, get_json_field, GameMessage
 from .unit import GameUnit
-from .game_map import GameMap
+from .game_map import GameMap, EDGE_SETS, ARENA_SIZE, ARENA_LOCATIONS
+from .unit_store import UnitStore
+from .budget import TurnBudget, DEFAULT_TURN_LIMIT
+from .targeting import TargetingEngine, find_target
+from .simulator import CombatSimulator
 
 def is_stationary(unit_type):
     """
@@ -44,39 +50,33 @@ class GameState:
         * my_time (int): The time you took to submit your previous turn
         * enemy_health (int): Your opponents current remaining health
         * enemy_time (int): Your opponents current remaining time
+        * unit_store (:obj: UnitStore): The parsed units in columnar form, if the state was created with unit_store=True. None otherwise
+        * budget (:obj: TurnBudget): The time budget of this turn, see TurnBudget
 
     """
 
-    def __init__(self, config, serialized_string):
+    def __init__(self, config, serialized_string, unit_store=False, lazy=False):
         """ Setup a turns variables using arguments passed
 
         Args:
             * config (JSON): A json object containing information about the game
-            * serialized_string (string): A string containing information about the game state at the start of this turn
+            * serialized_string (string): A string containing information about the game state at the start of this turn.
+              Can also be the GameMessage passed to on_turn, or the decoded state as a dict, so it is not decoded again
+            * unit_store (bool): If true, units are parsed into a UnitStore and only turned into GameUnits when the map is read
+            * lazy (bool): If true, only the turn number, health and resources are parsed right away. Units are added
+              to game_map the first time it is used, see also player_map
 
         """
         self.serialized_string = serialized_string
         self.config = config
         self.enable_warnings = True
+        self.unit_store = UnitStore(config) if unit_store else None
 
+        #Other threads can read these module constants while a state is built, so each is replaced whole, never cleared and refilled
         global WALL, SUPPORT, TURRET, SCOUT, DEMOLISHER, INTERCEPTOR, REMOVE, UPGRADE, STRUCTURE_TYPES, ALL_UNITS, UNIT_TYPE_TO_INDEX
-        UNIT_TYPE_TO_INDEX = {}
-        WALL = config["unitInformation"][0]["shorthand"]
-        UNIT_TYPE_TO_INDEX[WALL] = 0
-        SUPPORT = config["unitInformation"][1]["shorthand"]
-        UNIT_TYPE_TO_INDEX[SUPPORT] = 1
-        TURRET = config["unitInformation"][2]["shorthand"]
-        UNIT_TYPE_TO_INDEX[TURRET] = 2
-        SCOUT = config["unitInformation"][3]["shorthand"]
-        UNIT_TYPE_TO_INDEX[SCOUT] = 3
-        DEMOLISHER = config["unitInformation"][4]["shorthand"]
-        UNIT_TYPE_TO_INDEX[DEMOLISHER] = 4
-        INTERCEPTOR = config["unitInformation"][5]["shorthand"]
-        UNIT_TYPE_TO_INDEX[INTERCEPTOR] = 5
-        REMOVE = config["unitInformation"][6]["shorthand"]
-        UNIT_TYPE_TO_INDEX[REMOVE] = 6
-        UPGRADE = config["unitInformation"][7]["shorthand"]
-        UNIT_TYPE_TO_INDEX[UPGRADE] = 7
+        shorthands = [type_config["shorthand"] for type_config in config["unitInformation"][:8]]
+        WALL, SUPPORT, TURRET, SCOUT, DEMOLISHER, INTERCEPTOR, REMOVE, UPGRADE = shorthands
+        UNIT_TYPE_TO_INDEX = {shorthand: index for index, shorthand in enumerate(shorthands)}
 
         ALL_UNITS = [SCOUT, DEMOLISHER, INTERCEPTOR, WALL, SUPPORT, TURRET]
         STRUCTURE_TYPES = [WALL, SUPPORT, TURRET]
@@ -90,26 +90,74 @@ class GameState:
         SP = self.SP
 
         self.game_map = GameMap(self.config)
+        self.__unparsed_players = []
         self._shortest_path_finder = ShortestPathFinder()
         self._build_stack = []
         self._deploy_stack = []
+        self._transactions = []
         self._player_resources = [
                 {'SP': 0, 'MP': 0},  # player 0, which is you
                 {'SP': 0, 'MP': 0}]  # player 1, which is the opponent
-        self.__parse_state(serialized_string)
+        self._budget = None
+        self._turn_started = getattr(serialized_string, "received", None)
+        if self._turn_started is None:
+            self._turn_started = time.perf_counter()
+        self.__parse_state(serialized_string, lazy)
+
+    @property
+    def budget(self):
+        """The TurnBudget of this turn, created on first use. Its limit is the engine's soft time limit from the config.
+        It is timed from when the turn's message was received if the state was created from a GameMessage, otherwise from when the state was created.
+        """
+        if self._budget is None:
+            limit = self.config.get("timingAndReplay", {}).get("waitTimeBotSoft")
+            self._budget = TurnBudget(limit / 1000 if limit else DEFAULT_TURN_LIMIT, started=self._turn_started,
+                                      previous_turn_time=self.my_time / 1000)
+        return self._budget
+
+    @property
+    def game_map(self):
+        while self.__unparsed_players:
+            self.__load_units(self.__unparsed_players[0])
+        return self.__game_map
+
+    @game_map.setter
+    def game_map(self, game_map):
+        self.__game_map = game_map
+
+    def player_map(self, player_index):
+        """Gets the game map with the units of one player, for lazily parsed states that only need one side.
+        Units of the other player are only there if something already loaded them, use game_map to get both.
+
+        Args:
+            player_index: The player whose units are needed, 0 for you 1 for the enemy
+
+        Returns:
+            The GameMap of this state
 
-    def __parse_state(self, state_line):
+        """
+        if player_index in self.__unparsed_players:
+            self.__load_units(player_index)
+        return self.__game_map
+
+    def __parse_state(self, state_line, lazy=False):
         """
         Fills in map based on the serialized game state so that self.game_map[x,y] is a list of GameUnits at that location.
-        state_line is the game state as a json string.
+        state_line is the game state as a json string, a GameMessage or a dict.
+        If lazy, only the fields needed right away are decoded and the units are left for __load_units.
         """
-        state = json.loads(state_line)
+        if lazy:
+            state = None
+            field = self.__state_field
+        else:
+            state = self.__decoded_state(state_line)
+            field = state.__getitem__
 
-        turn_info = state["turnInfo"]
+        turn_info = field("turnInfo")
         self.turn_number = int(turn_info[1])
 
-        p1_health, p1_SP, p1_MP, p1_time = map(float, state["p1Stats"][:4])
-        p2_health, p2_SP, p2_MP, p2_time = map(float, state["p2Stats"][:4])
+        p1_health, p1_SP, p1_MP, p1_time = map(float, field("p1Stats")[:4])
+        p2_health, p2_SP, p2_MP, p2_time = map(float, field("p2Stats")[:4])
 
         self.my_health = p1_health
         self.my_time = p1_time
@@ -120,12 +168,53 @@ class GameState:
             {'SP': p1_SP, 'MP': p1_MP},
             {'SP': p2_SP, 'MP': p2_MP}]
 
+        if lazy:
+            self.__unparsed_players = [0, 1]
+            return
+
         p1units = state["p1Units"]
         p2units = state["p2Units"]
 
+        if self.unit_store is not None:
+            self.__store_parsed_units(p1units, 0)
+            self.__store_parsed_units(p2units, 1)
+            self.__game_map.load_store(self.unit_store)
+            return
         self.__create_parsed_units(p1units, 0)
         self.__create_parsed_units(p2units, 1)
 
+    def __decoded_state(self, state_line):
+        if isinstance(state_line, dict):
+            return state_line
+        if isinstance(state_line, GameMessage):
+            return state_line.data
+        return json.loads(state_line)
+
+    def __state_field(self, key):
+        """
+        Gets one field of the serialized state, decoding only that field unless the whole state is already decoded.
+        """
+        state = self.serialized_string
+        if isinstance(state, dict):
+            return state[key]
+        if isinstance(state, GameMessage):
+            return state.field(key)
+        return get_json_field(state, key)
+
+    def __load_units(self, player_index):
+        """
+        Adds the units of a player to the map of a lazily parsed state. With a unit store, both players are loaded.
+        """
+        if self.unit_store is not None:
+            self.__unparsed_players = []
+            self.__store_parsed_units(self.__state_field("p1Units"), 0)
+            self.__store_parsed_units(self.__state_field("p2Units"), 1)
+            self.__game_map.load_store(self.unit_store)
+            return
+        self.__unparsed_players.remove(player_index)
+        units = self.__state_field("p1Units" if player_index == 0 else "p2Units")
+        self.__create_parsed_units(units, player_index)
+
     def __create_parsed_units(self, units, player_number):
         """
         Helper function for __parse_state to add units to the map.
@@ -140,14 +229,126 @@ class GameState:
                 # This depends on RM and UP always being the last types to be processed
                 if unit_type == REMOVE:
                     # Quick fix will deploy engine fix soon
-                    if self.contains_stationary_unit([x,y]):
-                        self.game_map[x,y][0].pending_removal = True
+                    if self.__has_structure(x, y):
+                        self.__game_map[x,y][0].pending_removal = True
                 elif unit_type == UPGRADE:
-                    if self.contains_stationary_unit([x,y]):
-                        self.game_map[x,y][0].upgrade()
+                    if self.__has_structure(x, y):
+                        self.__game_map.upgrade_unit([x,y])
                 else:
                     unit = GameUnit(unit_type, self.config, player_number, hp, x, y)
-                    self.game_map[x,y].append(unit)
+                    self.__game_map.place_unit(unit)
+
+    def __has_structure(self, x, y):
+        """
+        contains_stationary_unit for the parsers, without loading the rest of a lazily parsed map.
+        """
+        if not self.__game_map.in_arena_bounds([x, y]):
+            self.warn('Checked for stationary unit outside of arena bounds')
+            return False
+        for unit in self.__game_map[x,y]:
+            if unit.stationary:
+                return True
+        return False
+
+    def __store_parsed_units(self, units, player_number):
+        """
+        Helper function for __parse_state to add units to the unit store.
+        """
+        typedef = self.config.get("unitInformation")
+        for i, unit_types in enumerate(units):
+            unit_type = typedef[i].get("shorthand")
+            for uinfo in unit_types:
+                sx, sy, shp = uinfo[:3]
+                x, y = map(int, [sx, sy])
+                if unit_type == REMOVE:
+                    self.unit_store.mark_removal(x, y)
+                elif unit_type == UPGRADE:
+                    self.unit_store.mark_upgrade(x, y)
+                else:
+                    self.unit_store.add(i, player_number, x, y, float(shp))
+
+    def serialize_board(self):
+        """Serializes the map, health and resources as they are now, in the format of the game engine's turn message.
+        GameState(config, board) rebuilds the board, so it can be sent to another process without pickling units or the config.
+        The build and deploy stacks are not included, the units they placed are.
+
+        Returns:
+            The board as a compact JSON string
+
+        """
+        type_count = len(self.config["unitInformation"])
+        units = ([[] for _ in range(type_count)], [[] for _ in range(type_count)])
+        for x, y in ARENA_LOCATIONS:
+            for unit in self.game_map[x, y]:
+                if unit.player_index not in (0, 1):
+                    continue
+                player_units = units[unit.player_index]
+                player_units[UNIT_TYPE_TO_INDEX[unit.unit_type]].append([x, y, unit.health, ""])
+                if unit.pending_removal:
+                    player_units[UNIT_TYPE_TO_INDEX[REMOVE]].append([x, y, 0, ""])
+                if unit.upgraded:
+                    player_units[UNIT_TYPE_TO_INDEX[UPGRADE]].append([x, y, 0, ""])
+        board = {
+            "turnInfo": [0, self.turn_number, -1],
+            "p1Stats": [self.my_health, self.get_resource(SP, 0), self.get_resource(MP, 0), self.my_time],
+            "p2Stats": [self.enemy_health, self.get_resource(SP, 1), self.get_resource(MP, 1), self.enemy_time],
+            "p1Units": units[0],
+            "p2Units": units[1]
+        }
+        return json.dumps(board, separators=(",", ":"))
+
+    def fork(self):
+        """Makes a copy of the game state for trying out hypothetical turns.
+        The map is forked with GameMap.fork, resources and the build and deploy stacks are copied,
+        and the pathfinder is shared so its caches serve both states.
+
+        Returns:
+            A new GameState that can be changed without affecting this one
+
+        """
+        fork = copy.copy(self)
+        fork.game_map = self.game_map.fork()
+        fork._build_stack = list(self._build_stack)
+        fork._deploy_stack = list(self._deploy_stack)
+        fork._player_resources = [dict(resources) for resources in self._player_resources]
+        fork._transactions = []
+        fork.__unparsed_players = []
+        return fork
+
+    def begin(self):
+        """Starts a transaction. Changes made to the game state after this, like attempt_spawn, attempt_remove,
+        attempt_upgrade or edits of game_map, can be undone with rollback or kept with commit.
+        Transactions can be nested, rollback and commit apply to the most recent open transaction.
+
+        Undoing only touches what changed since begin, so trying many placements in a search does not need any copies.
+        """
+        self._transactions.append((self.game_map._journal_mark(), [dict(resources) for resources in self._player_resources],
+                                   len(self._build_stack), len(self._deploy_stack)))
+
+    def rollback(self):
+        """Undoes every change made since the most recent begin and closes that transaction.
+        """
+        if not self._transactions:
+            self.warn("Attempted to rollback without a transaction. Call begin first.")
+            return
+        mark, resources, build_size, deploy_size = self._transactions.pop()
+        self.game_map._rollback_journal(mark)
+        self._player_resources = resources
+        del self._build_stack[build_size:]
+        del self._deploy_stack[deploy_size:]
+        if not self._transactions:
+            self.game_map._close_journal()
+
+    def commit(self):
+        """Keeps the changes made since the most recent begin and closes that transaction.
+        If it was nested, the changes can still be undone by rolling back the enclosing transaction.
+        """
+        if not self._transactions:
+            self.warn("Attempted to commit without a transaction. Call begin first.")
+            return
+        self._transactions.pop()
+        if not self._transactions:
+            self.game_map._close_journal()
 
     def __resource_required(self, unit_type):
         return self.SP if is_stationary(unit_type) else self.MP
@@ -333,7 +534,8 @@ class GameState:
         stationary = is_stationary(unit_type)
         blocked = self.contains_stationary_unit(location) or (stationary and len(self.game_map[location[0],location[1]]) > 0)
         correct_territory = location[1] < self.HALF_ARENA
-        on_edge = location in (self.game_map.get_edge_locations(self.game_map.BOTTOM_LEFT) + self.game_map.get_edge_locations(self.game_map.BOTTOM_RIGHT))
+        friendly_edge = (location[0], location[1])
+        on_edge = friendly_edge in EDGE_SETS[self.game_map.BOTTOM_LEFT] or friendly_edge in EDGE_SETS[self.game_map.BOTTOM_RIGHT]
 
         if self.enable_warnings:
             fail_reason = ""
@@ -441,7 +643,7 @@ class GameState:
                     if resources[SP] >= costs[SP] and resources[MP] >= costs[MP]:
                         self.__set_resource(SP, 0 - costs[SP])
                         self.__set_resource(MP, 0 - costs[MP])
-                        existing_unit.upgrade()
+                        self.game_map.upgrade_unit([x, y])
                         self._build_stack.append((UPGRADE, x, y))
                         spawned_units += 1
             else:
@@ -494,6 +696,128 @@ class GameState:
         end_points = self.game_map.get_edge_locations(target_edge)
         return self._shortest_path_finder.navigate_multiple_endpoints(start_location, end_points, self)
 
+    def predict_trajectory(self, start_location, destroyed_structures=None, unit_type=None, target_edge=None, max_frames=1000):
+        """Gets the frame by frame movement of a mobile unit while structures are destroyed during the action phase.
+        Unlike find_path_to_edge, the unit re-paths from where it is whenever a structure is destroyed.
+
+        Args:
+            start_location: The location of a hypothetical unit
+            destroyed_structures: A dict mapping a frame number to a list of locations of structures destroyed on that frame,
+                for example from a simulation or from parsed action frames. They are removed before units move on that frame.
+            unit_type: The type of the unit, which sets how often it moves. Defaults to SCOUT.
+            target_edge: The edge the unit wants to reach. game_map.TOP_LEFT, game_map.BOTTOM_RIGHT, etc. Induced from start_location if None.
+            max_frames: The last frame to predict
+
+        Returns:
+            A list of [frame, location] pairs, starting with [0, start_location] and with an entry for each step the unit takes.
+            If the final location is not on the target edge, the unit self destructs there.
+
+        """
+        if self.contains_stationary_unit(start_location):
+            self.warn("Attempted to perform pathing from blocked starting location {}".format(start_location))
+            return
+        if unit_type is None:
+            unit_type = SCOUT
+        if unit_type not in ALL_UNITS or is_stationary(unit_type):
+            self._invalid_unit(unit_type)
+            return
+
+        speed = self.config["unitInformation"][UNIT_TYPE_TO_INDEX[unit_type]].get("speed", 0)
+        frames_per_move = max(1, int(round(1 / speed))) if speed > 0 else 1
+        if target_edge is None:
+            target_edge = self.get_target_edge(start_location)
+
+        end_points = self.game_map.get_edge_locations(target_edge)
+        return self._shortest_path_finder.navigate_over_time(start_location, end_points, self, destroyed_structures or {}, frames_per_move, max_frames)
+
+    def find_paths_batch(self, start_locations, boards=None, target_edge=None):
+        """Gets the paths units at several locations would take, on several hypothetical versions of the board.
+        Much cheaper than calling find_path_to_edge on a modified map for every board and location.
+
+        Args:
+            start_locations: A list of locations of hypothetical units
+            boards: A list of hypothetical boards. Each is a pair (added_locations, removed_locations) of structures
+                placed on or removed from the current map, e.g. ([], [[5, 12]]) for "what if the wall at [5, 12] was gone".
+                Defaults to just the current map.
+            target_edge: The edge the units want to reach. Induced from each start location if None.
+
+        Returns:
+            A list with one entry per board, each a list with the path from each start location like find_path_to_edge.
+            A path is None if its start location is blocked on that board.
+
+        """
+        if boards is None:
+            boards = [([], [])]
+        edges = {}
+        end_points_list = []
+        for location in start_locations:
+            edge = self.get_target_edge(location) if target_edge is None else target_edge
+            if edge not in edges:
+                edges[edge] = self.game_map.get_edge_locations(edge)
+            end_points_list.append(edges[edge])
+        return self._shortest_path_finder.navigate_batch(start_locations, end_points_list, boards, self)
+
+    def distance_field(self, start_location, target_edge=None):
+        """Gets the distance field find_path_to_edge descends from a location.
+        It can be kept and handed to reuse_distance_field of a later GameState, e.g. one built for the next turn.
+
+        Args:
+            start_location: The location of a hypothetical unit
+            target_edge: The edge the unit wants to reach. game_map.TOP_LEFT, game_map.BOTTOM_RIGHT, etc. Induced from start_location if None.
+
+        Returns:
+            The DistanceField shared by every location in start_location's pocket, or None if start_location is blocked
+
+        """
+        if self.contains_stationary_unit(start_location):
+            return None
+        if target_edge is None:
+            target_edge = self.get_target_edge(start_location)
+        end_points = self.game_map.get_edge_locations(target_edge)
+        return self._shortest_path_finder.get_distance_field(start_location, end_points, self)
+
+    def reuse_distance_field(self, field):
+        """Patches a distance field computed on another board for this board, so find_path_to_edge can use it without searching.
+        The field is only patched if few structures differ between the boards, see the pathfinder's repair_limit.
+
+        Args:
+            field: A DistanceField from distance_field of another GameState
+
+        Returns:
+            True if the field was patched and is now cached for this board, False if the boards differ too much
+
+        """
+        layout = self.game_map.blocked_layout()
+        changed = [index for index in range(len(layout)) if layout[index] != field.blocked[index]]
+        if len(changed) > self._shortest_path_finder.repair_limit:
+            return False
+        self._shortest_path_finder.repair_distance_field(field, [divmod(index, ARENA_SIZE) for index in changed], self)
+        return True
+
+    def set_pathfinding_engine(self, engine):
+        """Selects the pathfinder used by find_path_to_edge. Both give identical paths.
+
+        Args:
+            engine: "python" for the default pathfinder, or "numpy" for one that searches with whole array
+                NumPy operations, which pays off when evaluating many hypothetical boards.
+                Falls back to "python" if NumPy is not installed.
+
+        Returns:
+            The name of the engine now in use
+
+        """
+        if engine not in ["python", "numpy"]:
+            self.warn("Invalid pathfinding engine '{}'. Please use 'python' or 'numpy'".format(engine))
+        elif engine == "numpy" and not numpy_available():
+            self.warn("NumPy is not installed, using the python pathfinding engine")
+        elif engine == "numpy":
+            if not isinstance(self._shortest_path_finder, NumpyPathFinder):
+                self._shortest_path_finder = NumpyPathFinder()
+            return "numpy"
+        if type(self._shortest_path_finder) is not ShortestPathFinder:
+            self._shortest_path_finder = ShortestPathFinder()
+        return "python"
+
     def contains_stationary_unit(self, location):
         """Check if a location is blocked, return structures unit if it is
 
@@ -529,7 +853,7 @@ class GameState:
         """
 
         self.enable_warnings = not suppress
-        self.game_map.enable_warnings = not suppress
+        self.__game_map.enable_warnings = not suppress
 
     def get_target(self, attacking_unit):
         """Returns target of given unit based on current map of the game board. 
@@ -550,65 +874,34 @@ class GameState:
             self.warn("Passed a {} to get_target as attacking_unit. Expected a GameUnit.".format(type(attacking_unit)))
             return
 
-        attacker_location = [attacking_unit.x, attacking_unit.y]
-        possible_locations = self.game_map.get_locations_in_range(attacker_location, attacking_unit.attackRange)
-        target = None
-        target_stationary = True
-        target_distance = sys.maxsize
-        target_health = sys.maxsize
-        target_y = self.ARENA_SIZE
-        target_x_distance = 0
-
-        for location in possible_locations:
-            for unit in self.game_map[location]:
-                if unit.player_index == attacking_unit.player_index or (attacking_unit.damage_f == 0 and is_stationary(unit.unit_type)) or (attacking_unit.damage_i == 0 and not(is_stationary(unit.unit_type))):
-                    continue
+        game_map = self.game_map
+        if not game_map.in_arena_bounds([attacking_unit.x, attacking_unit.y]):
+            game_map._invalid_coordinates([attacking_unit.x, attacking_unit.y])
+        return find_target(attacking_unit, lambda index: game_map[divmod(index, ARENA_SIZE)], self.config["unitInformation"][0]['getHitRadius'])
 
-                new_target = False
-                unit_stationary = unit.stationary
-                unit_distance = self.game_map.distance_between_locations(location, [attacking_unit.x, attacking_unit.y])
-                unit_health = unit.health
-                unit_y = unit.y
-                unit_x_distance = abs(self.HALF_ARENA - 0.5 - unit.x)
+    def get_targeting_engine(self):
+        """Creates a TargetingEngine over the current map, to find the targets of many attackers at once.
+        It keeps its own index of the units, later changes to game_map are not reflected in it.
 
-                if target_stationary and not unit_stationary:
-                    new_target = True
-                elif not target_stationary and unit_stationary:
-                    continue
-                
-                if target_distance > unit_distance:
-                    new_target = True
-                elif target_distance < unit_distance and not new_target:
-                    continue
+        Returns:
+            A new TargetingEngine
 
-                if target_health > unit_health:
-                    new_target = True
-                elif target_health < unit_health and not new_target:
-                    continue
+        """
+        return TargetingEngine(self.game_map)
 
-                # Compare height heuristic relative to attacking unit's player index
-                if attacking_unit.player_index == 0:
-                    if target_y > unit_y:
-                        new_target = True
-                    elif target_y < unit_y and not new_target:
-                        continue
-                else:
-                    if target_y < unit_y:
-                        new_target = True
-                    elif target_y > unit_y and not new_target:
-                        continue
-
-                if target_x_distance < unit_x_distance:
-                    new_target = True
-                
-                if new_target:
-                    target = unit
-                    target_stationary = unit_stationary
-                    target_distance = unit_distance
-                    target_health = unit_health
-                    target_y = unit_y
-                    target_x_distance = unit_x_distance
-        return target
+    def get_combat_simulator(self, record_frames=False, max_frames=1000):
+        """Creates a CombatSimulator for the action phase that follows this state, to compare candidate attacks.
+        It reads the structures on the map now, later changes to game_map are not reflected in it.
+
+        Args:
+            record_frames: If the simulation results should keep the state of every frame
+            max_frames: The last frame to simulate
+
+        Returns:
+            A new CombatSimulator
+
+        """
+        return CombatSimulator(self, record_frames, max_frames)
 
     def get_attackers(self, location, player_index):
         """Gets the stationary units threatening a given location
@@ -641,3 +934,70 @@ class GameState:
                 if unit.damage_i + unit.damage_f > 0 and unit.player_index != player_index and self.game_map.distance_between_locations(location, location_unit) <= unit.attackRange:
                     attackers.append(unit)
         return attackers
+
+    def attacker_count(self, location, player_index):
+        """Counts the units threatening a given location, the same as len(get_attackers(location, player_index))
+        but looked up in the map's threat map, which is only patched where units change
+
+        Args:
+            location: The location of a hypothetical defender
+            player_index: The index corresponding to the defending player, 0 for you 1 for the enemy
+
+        Returns:
+            The number of units that would attack a unit controlled by the given player at the given location
+
+        """
+        x, y = location
+        if player_index not in (0, 1) or not self.game_map.in_arena_bounds(location):
+            return len(self.get_attackers(location, player_index))
+        return self.game_map.attacker_counts(player_index)[x * ARENA_SIZE + y]
+
+    def path_attackers(self, path, player_index=0):
+        """Adds up the units threatening each location of a path, like calling get_attackers for every step
+
+        Args:
+            path: A list of locations, e.g. from find_path_to_edge
+            player_index: The index corresponding to the player whose unit follows the path, 0 for you 1 for the enemy
+
+        Returns:
+            The total number of attackers over the path's locations, 0 for an empty or None path
+
+        """
+        if not path:
+            return 0
+        if player_index not in (0, 1):
+            return sum(len(self.get_attackers(location, player_index)) for location in path)
+        counts = self.game_map.attacker_counts(player_index)
+        total = 0
+        for location in path:
+            x, y = location
+            if self.game_map.in_arena_bounds(location):
+                total += counts[x * ARENA_SIZE + y]
+            else:
+                total += len(self.get_attackers(location, player_index))
+        return total
+
+    def path_damage(self, path, player_index=0):
+        """Adds up the damage per frame a mobile unit would take at each location of a path,
+        from the damage_i of every unit that would attack it there
+
+        Args:
+            path: A list of locations, e.g. from find_path_to_edge
+            player_index: The index corresponding to the player whose unit follows the path, 0 for you 1 for the enemy
+
+        Returns:
+            The total damage over the path's locations, 0 for an empty or None path
+
+        """
+        if not path:
+            return 0
+        if player_index not in (0, 1):
+            self._invalid_player_index(player_index)
+            return 0
+        damage = self.game_map.threat_damage(player_index)
+        total = 0
+        for location in path:
+            x, y = location
+            if self.game_map.in_arena_bounds(location):
+                total += damage[x * ARENA_SIZE + y]
+        return total
@@ -0,0 +1,167 @@
+import threading
+from collections import deque
+from .util import get_command, debug_write, GameMessage
+
+
+class MessageReader:
+    """Reads the messages of the game engine on a background thread, so the engine's output never piles up
+    in the pipe while a handler runs. Messages wait in a queue until AlgoCore asks for them.
+
+    Only action frames count against the queue's bound, turn messages are always kept. When the strategy
+    falls behind, frames are coalesced if frame_events is set: the oldest queued frame is folded into the
+    next one, keeping its subscribed events. Otherwise the oldest frame is dropped. When a turn message
+    arrives, the frames still waiting before it are collapsed into one, so they never delay the turn.
+
+    Attributes :
+        * max_frames (int): The most action frames kept in the queue
+        * frame_events (list): The event types the strategy reads from frames, see AlgoCore.frame_events.
+          Frames without any of them are skipped as they are read
+        * received (int): The number of messages read from the engine
+        * frames_skipped (int): The number of frames skipped for holding no subscribed event
+        * frames_coalesced (int): The number of frames folded into a later frame
+        * frames_dropped (int): The number of frames dropped from the queue
+        * max_depth (int): The most messages that were waiting in the queue at once
+        * thread (Thread): The reader thread, once started
+        * on_frame (function): Called on the reader thread with every action frame as it is read, even the skipped ones
+
+    """
+    def __init__(self, max_frames=100, frame_events=None, read=get_command, on_frame=None):
+        """Creates a reader, call start to begin reading
+
+        Args:
+            max_frames: The most action frames kept in the queue
+            frame_events: The event types the strategy reads from frames, None for all of every frame
+            read: The function that reads one message, get_command by default
+            on_frame: Called with every action frame as it is read, None for nothing
+
+        """
+        self.max_frames = max_frames
+        self.frame_events = frame_events
+        self.received = 0
+        self.frames_skipped = 0
+        self.frames_coalesced = 0
+        self.frames_dropped = 0
+        self.max_depth = 0
+        self.thread = None
+        self.on_frame = on_frame
+        self.__read = read
+        self.__queue = deque()
+        self.__frames = 0
+        self.__error = None
+        self.__ready = threading.Condition()
+
+    @property
+    def depth(self):
+        """The number of messages waiting in the queue
+        """
+        return len(self.__queue)
+
+    def start(self):
+        """Starts the reader thread
+        """
+        self.thread = threading.Thread(target=self.__run, name="MessageReader", daemon=True)
+        self.thread.start()
+
+    def get(self):
+        """Waits for the next message
+
+        Returns:
+            The next GameMessage, in the order the engine sent them. Exits like get_command once the engine's output has ended,
+            and raises the error that stopped the reader thread if it failed, after the messages it read before that
+
+        """
+        with self.__ready:
+            while not self.__queue:
+                self.__ready.wait()
+            message = self.__queue.popleft()
+            if message is None:
+                if self.__error is not None:
+                    raise self.__error
+                exit()
+            if _state_type(message) == 1:
+                self.__frames -= 1
+            return message
+
+    def __run(self):
+        try:
+            self.__read_messages()
+        except Exception as error:
+            #Hand the error to get, so it is raised on the main thread instead of leaving it waiting forever
+            self.__error = error
+            self.__put(None)
+
+    def __read_messages(self):
+        while True:
+            try:
+                message = GameMessage(self.__read())
+            except SystemExit:
+                #get_command exits when the engine's output ends, let get exit on the main thread instead
+                self.__put(None)
+                return
+            self.received += 1
+            state_type = _state_type(message)
+            if state_type == 1:
+                if self.on_frame is not None:
+                    self.on_frame(message)
+                frame_events = self.frame_events
+                if frame_events is not None and not message.has_events(frame_events):
+                    self.frames_skipped += 1
+                    continue
+            self.__put(message)
+            if state_type == 2:
+                return
+
+    def __put(self, message):
+        with self.__ready:
+            state_type = _state_type(message)
+            if state_type == 1:
+                if self.__frames >= self.max_frames:
+                    self.__make_room()
+                self.__frames += 1
+            elif state_type is not None:
+                self.__collapse_frames()
+            self.__queue.append(message)
+            self.max_depth = max(self.max_depth, len(self.__queue))
+            self.__ready.notify()
+
+    def __make_room(self):
+        """
+        Folds the oldest queued frame into the frame after it, or drops it when they can not be merged.
+        """
+        positions = [position for position, message in enumerate(self.__queue) if _state_type(message) == 1]
+        oldest = positions[0]
+        if self.frame_events and len(positions) > 1 and positions[1] == oldest + 1:
+            self.__queue[oldest + 1] = self.__queue[oldest + 1].with_events_of(self.__queue[oldest], self.frame_events)
+            self.frames_coalesced += 1
+        else:
+            self.frames_dropped += 1
+        del self.__queue[oldest]
+        self.__frames -= 1
+
+    def __collapse_frames(self):
+        """
+        Collapses the frames at the end of the queue into their last frame, before a turn message is queued.
+        """
+        collapsed = 0
+        while len(self.__queue) > 1 and _state_type(self.__queue[-1]) == 1 and _state_type(self.__queue[-2]) == 1:
+            collapsed += 1
+            last = self.__queue.pop()
+            if self.frame_events:
+                self.__queue[-1] = last.with_events_of(self.__queue[-1], self.frame_events)
+                self.frames_coalesced += 1
+            else:
+                self.__queue[-1] = last
+                self.frames_dropped += 1
+            self.__frames -= 1
+        if collapsed:
+            debug_write("MessageReader fell behind, collapsed {} frames before the turn".format(collapsed))
+
+
+def _state_type(message):
+    """
+    Gets the turnInfo state type of a message, 0 for a turn, 1 for an action frame and 2 for the end of the game.
+    None for the config and anything else.
+    """
+    if message is None or "replaySave" in message or "turnInfo" not in message:
+        return None
+    return int(message.field("turnInfo")[0])
@@ -1,24 +1,70 @@
 import heapq
-import math
 import sys
-import queue
+from array import array
+from collections import deque, OrderedDict
 from .util import debug_write
+from .game_map import ARENA_SIZE, HALF_ARENA, IN_ARENA
 
-class Node:
-    """A pathfinding node
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+CELL_COUNT = ARENA_SIZE * ARENA_SIZE
+
+
+def location_index(x, y):
+    """Flat index of a location in the pathfinding arrays, column major like game_map[x][y]
+    """
+    return x * ARENA_SIZE + y
+
+
+def _build_tables():
+    """Builds the lookup tables shared by every pathfinder.
+
+    Returns:
+        A bytearray marking in bounds cells, the (x, y, index) tuples of every in bounds cell
+        and, for every index, the in bounds neighbors in the order the pathfinder tries them.
+    """
+    in_bounds = bytearray(IN_ARENA)
+    cells = []
+    for x in range(ARENA_SIZE):
+        for y in range(ARENA_SIZE):
+            if in_bounds[location_index(x, y)]:
+                cells.append((x, y, location_index(x, y)))
+
+    neighbors = []
+    for x in range(ARENA_SIZE):
+        for y in range(ARENA_SIZE):
+            adjacent = []
+            for nx, ny in ((x, y + 1), (x, y - 1), (x + 1, y), (x - 1, y)):
+                if 0 <= nx < ARENA_SIZE and 0 <= ny < ARENA_SIZE and in_bounds[location_index(nx, ny)]:
+                    adjacent.append((nx, ny, location_index(nx, ny)))
+            neighbors.append(tuple(adjacent))
+    return in_bounds, tuple(cells), tuple(neighbors)
+
+
+IN_BOUNDS, ARENA_CELLS, NEIGHBORS = _build_tables()
+_CLEAR = bytes(CELL_COUNT)
+_UNSET_FIELD = array('i', [-1]) * CELL_COUNT
+
+
+class DistanceField:
+    """The pathlengths from every location towards the seeds a unit paths to
 
     Attributes :
-        * visited_idealness (bool): Have we visited this node during the idealness search step?
-        * visited_validate (bool): Have we visited this node during the validation step?
-        * blocked (bool): Is there a structures at this node's location
-        * pathlength: The distance between this node and the target location
+        * pathlength (array): Distance to the nearest seed, indexed by location_index(x, y). -1 if unreachable
+        * blocked (bytes): The blocked layout the field was computed on
+        * seeds (tuple): Indices of the seed locations. Every end point if the edge is reachable, or a single self destruct location
+        * reaches_edge (bool): True if the seeds are the end points
 
     """
-    def __init__(self):
-        self.visited_idealness = False
-        self.visited_validate = False
-        self.blocked = False
-        self.pathlength = -1
+    def __init__(self, pathlength, blocked, seeds, reaches_edge):
+        self.pathlength = pathlength
+        self.blocked = blocked
+        self.seeds = seeds
+        self.reaches_edge = reaches_edge
+
 
 """
 This class helps with pathfinding. We guarantee the results will
@@ -28,18 +74,39 @@ code to maximise time efficiency
 class ShortestPathFinder:
     """Handles pathfinding
 
+    The grid is stored as flat arrays indexed by location_index(x, y). The blocked and visited flags
+    are allocated once and reset in bulk, so a single finder can be reused for every path of a turn.
+
+    Every location that can reach the target edge shares one distance field, and every location
+    trapped in a pocket shares the field of that pocket's self destruct location. Fields are
+    cached for the current blocked layout, so pathing from many start locations costs one search.
+    Finished paths are kept in a bounded least recently used cache keyed by the blocked layout, the
+    start location and the end points, so repeated queries on an unchanged board skip the search entirely.
+
     Attributes :
         * HORIZONTAL (int): A constant representing a horizontal movement
         * VERTICAL (int): A constant representing a vertical movement
 
         * game_state (:obj: GameState): The current gamestate
-        * game_map (:obj: GameMap): The current gamemap
+        * blocked (bytearray): 1 where a structure is blocking the location
+        * visited (bytearray): Search bookkeeping, reused by the idealness and validation steps
+        * pathlength (array): The distance field of the last path, -1 where unreached
+        * path_cache_size (int): The number of paths kept in the path cache
+        * repair_limit (int): The most changed locations navigate_batch repairs a field for instead of searching again
 
     """
     def __init__(self):
         self.HORIZONTAL = 1
         self.VERTICAL = 2
         self.initialized = False
+        self.blocked = bytearray(CELL_COUNT)
+        self.visited = bytearray(CELL_COUNT)
+        self.pathlength = array('i', _UNSET_FIELD)
+        self._layout = None
+        self._fields = {}
+        self.path_cache_size = 512
+        self.repair_limit = 16
+        self._paths = OrderedDict()
 
     def initialize_map(self, game_state):
         """Initializes the map
@@ -47,10 +114,17 @@ class ShortestPathFinder:
         Args:
             game_state: A GameState object representing the gamestate we want to traverse
         """
-        #Initialize map 
+        #Initialize map
         self.initialized = True
         self.game_state = game_state
-        self.game_map = [[Node() for x in range(self.game_state.ARENA_SIZE)] for y in range(self.game_state.ARENA_SIZE)]
+        self.blocked[:] = _CLEAR
+        self.visited[:] = _CLEAR
+        self.pathlength = array('i', _UNSET_FIELD)
+
+    def _fill_blocked(self):
+        """Marks every location holding a structure as blocked
+        """
+        self.blocked[:] = self.game_state.game_map.blocked_layout()
 
     def navigate_multiple_endpoints(self, start_point, end_points, game_state):
         """Finds the path a unit would take to reach a set of endpoints
@@ -68,44 +142,461 @@ class ShortestPathFinder:
         if game_state.contains_stationary_unit(start_point):
             return
 
-        #Initialize map 
+        key = (game_state.game_map.blocked_layout(), start_point[0], start_point[1], tuple(location_index(x, y) for x, y in end_points))
+        path = self._paths.get(key)
+        if path is None:
+            self.get_distance_field(start_point, end_points, game_state)
+            path = tuple(tuple(location) for location in self._get_path(start_point, end_points))
+            self._paths[key] = path
+            if len(self._paths) > self.path_cache_size:
+                self._paths.popitem(last=False)
+        else:
+            self._paths.move_to_end(key)
+        return [start_point] + [list(location) for location in path[1:]]
+
+    def get_distance_field(self, start_point, end_points, game_state):
+        """Gets the distance field a unit at start_point descends when pathing to end_points
+
+        Args:
+            * start_point: The starting location of the unit
+            * end_points: The end points of the unit, should be a list of edge locations
+            * game_state: The current game state
+
+        Returns:
+            The DistanceField for the start point's pocket. It is shared with every other start point in that pocket.
+
+        """
+        #Initialize map
         self.initialize_map(game_state)
         #Fill in walls
-        for location in self.game_state.game_map:
-            if self.game_state.contains_stationary_unit(location):
-                self.game_map[location[0]][location[1]].blocked = True
-        #Do pathfinding
-        ideal_endpoints = self._idealness_search(start_point, end_points)
-        self._validate(ideal_endpoints, end_points)
-        return self._get_path(start_point, end_points)
+        self._fill_blocked()
+        self._sync_layout()
+
+        end_key = tuple(location_index(x, y) for x, y in end_points)
+        field = self._get_field(end_key, True)
+        x, y = start_point
+        if not (0 <= x < ARENA_SIZE and 0 <= y < ARENA_SIZE and field.pathlength[location_index(x, y)] >= 0):
+            #The edge can't be reached from here, find the self destruct location of this pocket
+            ideal_tile = self._idealness_search(start_point, end_points)
+            if ideal_tile not in end_points:
+                field = self._get_field((location_index(ideal_tile[0], ideal_tile[1]),), False)
+        self.pathlength = field.pathlength
+        return field
+
+    def get_edge_field(self, end_points, game_state):
+        """Gets the distance field to a set of endpoints on the current board, from the cache if it is there
+
+        Args:
+            * end_points: The end points, should be a list of edge locations
+            * game_state: The current game state
+
+        Returns:
+            The DistanceField every location that can reach end_points descends
+
+        """
+        self.initialize_map(game_state)
+        self._fill_blocked()
+        self._sync_layout()
+        return self._get_field(tuple(location_index(x, y) for x, y in end_points), True)
+
+    def next_step(self, location, end_points, game_state, previous_move_direction=0):
+        """Finds the single step a unit takes from where it is, for following a unit one move at a time while the map changes
+
+        Args:
+            * location: The current location of the unit
+            * end_points: The end points of the unit, should be a list of edge locations
+            * game_state: The current game state
+            * previous_move_direction: The direction of the unit's last step, HORIZONTAL or VERTICAL, 0 if it has not moved yet
+
+        Returns:
+            A pair [next_location, move_direction], or None if the unit is at the end of its path.
+            The unit then breaches if location is one of end_points, otherwise it self destructs.
+
+        """
+        field = self.get_distance_field(location, end_points, game_state)
+        if field.pathlength[location_index(location[0], location[1])] == 0:
+            return None
+        next_move = self._choose_next_move(location, previous_move_direction, end_points)
+        return [next_move, self.VERTICAL if location[0] == next_move[0] else self.HORIZONTAL]
+
+    def _get_field(self, seeds, reaches_edge):
+        """Gets the cached field for the seeds on the current layout, computing it if needed
+        """
+        field = self._fields.get(seeds)
+        if field is None:
+            pathlength = array('i', _UNSET_FIELD)
+            self._fill_pathlength(pathlength, seeds)
+            field = DistanceField(pathlength, self._layout, seeds, reaches_edge)
+            self._fields[seeds] = field
+        return field
+
+    def _sync_layout(self):
+        """Drops the cached fields if the blocked layout changed since they were computed
+        """
+        layout = self.game_state.game_map.blocked_layout()
+        if layout is not self._layout and layout != self._layout:
+            self._layout = layout
+            self._fields = {}
+
+    def navigate_incremental(self, start_point, end_points, game_state, previous_field, changed_locations):
+        """Finds the path a unit would take after a few structures were added or removed
+
+        Gives the same result as navigate_multiple_endpoints, but repairs previous_field around the changed
+        locations instead of searching the whole board again. Useful when testing many single structure edits.
+
+        Args:
+            * start_point: The starting location of the unit
+            * end_points: The end points of the unit, should be a list of edge locations
+            * game_state: The current game state, with the edits already applied to its game_map
+            * previous_field: A DistanceField from get_distance_field on the board before the edits
+            * changed_locations: Every location where a structure was added or removed since previous_field
+
+        Returns:
+            The path a unit at start_point would take when trying to reach end_points given the current game state.
+
+        """
+        if game_state.contains_stationary_unit(start_point):
+            return
+
+        self.repair_distance_field(previous_field, changed_locations, game_state)
+        return self.navigate_multiple_endpoints(start_point, end_points, game_state)
+
+    def repair_distance_field(self, field, changed_locations, game_state):
+        """Updates a distance field for structures added or removed at a few locations
+
+        Only the locations whose distance depended on the changed locations are searched again.
+        The result is cached for the current layout, so later paths on this board reuse it.
+
+        Args:
+            * field: A DistanceField computed before the changes
+            * changed_locations: Every location where a structure was added or removed since the field was computed
+            * game_state: The current game state, with the changes applied to its game_map
+
+        Returns:
+            A new DistanceField with the same seeds as field, for the current layout. field itself is left unchanged.
+
+        """
+        self.initialize_map(game_state)
+        self._fill_blocked()
+        self._sync_layout()
+        cached = self._fields.get(field.seeds)
+        if cached is not None:
+            return cached
+
+        blocked = self.blocked
+        changed = []
+        expected = bytearray(field.blocked)
+        for x, y in changed_locations:
+            index = location_index(x, y)
+            if 0 <= x < ARENA_SIZE and 0 <= y < ARENA_SIZE and IN_BOUNDS[index] and expected[index] != blocked[index]:
+                expected[index] = blocked[index]
+                changed.append(index)
+        if expected != self._layout:
+            #The board changed in more places than we were told, start over
+            return self._get_field(field.seeds, field.reaches_edge)
+
+        repaired = self._repair_field(field, changed, self._layout)
+        self._fields[field.seeds] = repaired
+        return repaired
+
+    def _repair_field(self, field, changed, layout):
+        """Repairs field for the layout currently in self.blocked, given the indices where it differs from field.blocked
+        """
+        blocked = self.blocked
+        pathlength = array('i', field.pathlength)
+        seeds = set(field.seeds)
+
+        #Locations that lost the neighbor they were reached through are cut loose, nearest first so
+        #a location is only kept when a neighbor one step closer survived
+        suspects = {}
+        for index in changed:
+            if blocked[index]:
+                if index not in seeds:
+                    pathlength[index] = -1
+                for _, _, neighbor in NEIGHBORS[index]:
+                    length = pathlength[neighbor]
+                    if length > 0 and not blocked[neighbor]:
+                        suspects.setdefault(length, []).append(neighbor)
+        cut = []
+        length = min(suspects, default=0)
+        while suspects:
+            for index in suspects.pop(length, ()):
+                if pathlength[index] != length:
+                    continue
+                supported = False
+                for _, _, neighbor in NEIGHBORS[index]:
+                    if pathlength[neighbor] == length - 1 and not blocked[neighbor]:
+                        supported = True
+                        break
+                if supported:
+                    continue
+                pathlength[index] = -1
+                cut.append(index)
+                for _, _, neighbor in NEIGHBORS[index]:
+                    if pathlength[neighbor] == length + 1 and not blocked[neighbor]:
+                        suspects.setdefault(length + 1, []).append(neighbor)
+            length += 1
+
+        #Search again from the edge of the cut region and from newly opened locations
+        frontier = []
+        for index in cut + [index for index in changed if not blocked[index]]:
+            if index in seeds:
+                heapq.heappush(frontier, (0, index))
+                continue
+            best = -1
+            for _, _, neighbor in NEIGHBORS[index]:
+                length = pathlength[neighbor]
+                if length >= 0 and not blocked[neighbor] and (best == -1 or length + 1 < best):
+                    best = length + 1
+            if best != -1:
+                pathlength[index] = best
+                heapq.heappush(frontier, (best, index))
+        while frontier:
+            length, index = heapq.heappop(frontier)
+            if pathlength[index] != length:
+                continue
+            for _, _, neighbor in NEIGHBORS[index]:
+                if not blocked[neighbor] and (pathlength[neighbor] == -1 or pathlength[neighbor] > length + 1):
+                    pathlength[neighbor] = length + 1
+                    heapq.heappush(frontier, (length + 1, neighbor))
+
+        return DistanceField(pathlength, layout, field.seeds, field.reaches_edge)
+
+    def navigate_batch(self, start_points, end_points_list, boards, game_state):
+        """Finds the paths of several units on several hypothetical versions of the board
+
+        Start points with the same end points share one distance field per board. Boards that differ
+        from the current map in at most repair_limit locations get the current field repaired,
+        the others are searched together with edge_fields.
+
+        Args:
+            * start_points: The starting locations of the units
+            * end_points_list: The end points of each unit, parallel to start_points
+            * boards: A list of (added_locations, removed_locations) pairs, the structures placed on or cleared from the current map
+            * game_state: The current game state
+
+        Returns:
+            A list with, for each board, the list of paths of the units. A path is None if its start is blocked on that board.
+
+        """
+        self.initialize_map(game_state)
+        self._fill_blocked()
+        self._sync_layout()
+        base = self._layout
+
+        layouts = []
+        changes = []
+        for added, removed in boards:
+            layout = bytearray(base)
+            touched = []
+            for locations, value in ((removed, 0), (added, 1)):
+                for x, y in locations:
+                    if 0 <= x < ARENA_SIZE and 0 <= y < ARENA_SIZE and IN_BOUNDS[location_index(x, y)]:
+                        layout[location_index(x, y)] = value
+                        touched.append(location_index(x, y))
+            layouts.append(bytes(layout))
+            changes.append([index for index in set(touched) if layout[index] != base[index]])
+
+        groups = {}
+        for i, end_points in enumerate(end_points_list):
+            end_key = tuple(location_index(x, y) for x, y in end_points)
+            groups.setdefault(end_key, (end_points, []))[1].append(i)
+
+        paths = [[None] * len(start_points) for _ in boards]
+        for end_key, (end_points, members) in groups.items():
+            self.blocked[:] = base
+            base_field = self._get_field(end_key, True)
+            missing = []
+            for board, layout in enumerate(layouts):
+                unknown = []
+                for i in members:
+                    x, y = start_points[i]
+                    path = self._paths.get((layout, x, y, end_key))
+                    if path is None:
+                        unknown.append(i)
+                    else:
+                        self._paths.move_to_end((layout, x, y, end_key))
+                        paths[board][i] = [start_points[i]] + [list(location) for location in path[1:]]
+                if unknown:
+                    missing.append((board, unknown))
+            if not missing:
+                continue
+
+            fields = self._board_edge_fields(base_field, [layouts[board] for board, _ in missing], [changes[board] for board, _ in missing], end_points)
+            for (board, unknown), field in zip(missing, fields):
+                layout = layouts[board]
+                self.blocked[:] = layout
+                for i in unknown:
+                    start_point = start_points[i]
+                    x, y = start_point
+                    in_arena = 0 <= x < ARENA_SIZE and 0 <= y < ARENA_SIZE and IN_BOUNDS[location_index(x, y)]
+                    if in_arena and layout[location_index(x, y)]:
+                        continue
+                    self.pathlength = field.pathlength
+                    if not (in_arena and field.pathlength[location_index(x, y)] >= 0):
+                        self.visited[:] = _CLEAR
+                        ideal_tile = self._idealness_search(start_point, end_points)
+                        if ideal_tile not in end_points:
+                            self.pathlength = array('i', _UNSET_FIELD)
+                            self._fill_pathlength(self.pathlength, (location_index(ideal_tile[0], ideal_tile[1]),))
+                    path = tuple(tuple(location) for location in self._get_path(start_point, end_points))
+                    self._paths[(layout, x, y, end_key)] = path
+                    if len(self._paths) > self.path_cache_size:
+                        self._paths.popitem(last=False)
+                    paths[board][i] = [start_point] + [list(location) for location in path[1:]]
+        return paths
+
+    def navigate_over_time(self, start_point, end_points, game_state, destroyed, frames_per_move=1, max_frames=1000):
+        """Follows a unit frame by frame while structures are destroyed around it
+
+        The unit takes one step every frames_per_move frames. Before each step, structures destroyed up to
+        that frame are removed and the unit picks its next step from its current location, keeping its
+        previous move direction for tie breaks, just like it does when the map changes during the action phase.
+        The distance field is repaired around each destroyed structure rather than searched again.
+
+        Args:
+            * start_point: The starting location of the unit
+            * end_points: The end points of the unit, should be a list of edge locations
+            * game_state: The current game state
+            * destroyed: A dict mapping frame numbers to the locations of structures destroyed on that frame
+            * frames_per_move: The number of frames between two steps of the unit
+            * max_frames: The last frame to follow the unit to
+
+        Returns:
+            A list of [frame, location] pairs, starting with [0, start_point] and with one entry per step taken.
+            The unit reached its edge if the last location is one of end_points, otherwise it self destructs there.
+
+        """
+        if game_state.contains_stationary_unit(start_point):
+            return
+
+        self.initialize_map(game_state)
+        self._fill_blocked()
+        self._sync_layout()
+        layout = bytearray(self._layout)
+        end_key = tuple(location_index(x, y) for x, y in end_points)
+        edge_field = self._get_field(end_key, True)
+        events = sorted(destroyed.items())
+        next_event = 0
+
+        trajectory = [[0, start_point]]
+        current = start_point
+        move_direction = 0
+        field = None
+        frame = frames_per_move
+        while frame <= max_frames:
+            changed = []
+            while next_event < len(events) and events[next_event][0] <= frame:
+                for x, y in events[next_event][1]:
+                    index = location_index(x, y)
+                    if 0 <= x < ARENA_SIZE and 0 <= y < ARENA_SIZE and IN_BOUNDS[index] and layout[index]:
+                        layout[index] = 0
+                        changed.append(index)
+                next_event += 1
+            if changed:
+                self.blocked[:] = layout
+                edge_field = self._repair_field(edge_field, changed, bytes(layout))
+                field = None
+
+            if field is None:
+                #Work out which field the unit follows from where it is now
+                x, y = current
+                field = edge_field
+                if not (0 <= x < ARENA_SIZE and 0 <= y < ARENA_SIZE and edge_field.pathlength[location_index(x, y)] >= 0):
+                    self.visited[:] = _CLEAR
+                    ideal_tile = self._idealness_search(current, end_points)
+                    if ideal_tile not in end_points:
+                        pathlength = array('i', _UNSET_FIELD)
+                        self._fill_pathlength(pathlength, (location_index(ideal_tile[0], ideal_tile[1]),))
+                        field = DistanceField(pathlength, bytes(layout), (location_index(ideal_tile[0], ideal_tile[1]),), False)
+            self.pathlength = field.pathlength
+
+            if self.pathlength[location_index(current[0], current[1])] == 0:
+                #Nowhere left to go, the unit self destructs
+                break
+            next_move = self._choose_next_move(current, move_direction, end_points)
+            if current[0] == next_move[0]:
+                move_direction = self.VERTICAL
+            else:
+                move_direction = self.HORIZONTAL
+            trajectory.append([frame, next_move])
+            current = next_move
+            if location_index(current[0], current[1]) in end_key and field.reaches_edge:
+                break
+            frame += frames_per_move
+        return trajectory
+
+    def _board_edge_fields(self, base_field, layouts, changes, end_points):
+        """Edge fields for boards given as layouts and the indices where they differ from base_field's layout
+        """
+        fields = [None] * len(layouts)
+        searched = []
+        for i, (layout, changed) in enumerate(zip(layouts, changes)):
+            if not changed:
+                fields[i] = base_field
+            elif len(changed) <= self.repair_limit:
+                self.blocked[:] = layout
+                fields[i] = self._repair_field(base_field, changed, layout)
+            else:
+                searched.append(i)
+        for i, field in zip(searched, self.edge_fields([layouts[i] for i in searched], end_points)):
+            fields[i] = field
+        return fields
+
+    def edge_fields(self, layouts, end_points):
+        """Computes the distance field towards an edge for several blocked layouts at once
+
+        Args:
+            * layouts: A list of blocked layouts, in the format of GameMap.blocked_layout()
+            * end_points: The end points of the unit, should be a list of edge locations
+
+        Returns:
+            A list with the edge DistanceField of each layout
+
+        """
+        self.initialized = False
+        end_key = tuple(location_index(x, y) for x, y in end_points)
+        fields = []
+        for layout in layouts:
+            self.blocked[:] = layout
+            pathlength = array('i', _UNSET_FIELD)
+            self._fill_pathlength(pathlength, end_key)
+            fields.append(DistanceField(pathlength, bytes(layout), end_key, True))
+        return fields
 
     def _idealness_search(self, start, end_points):
         """
-        Finds the most ideal tile in our 'pocket' of pathable space. 
+        Finds the most ideal tile in our 'pocket' of pathable space.
         The edge if it is available, or the best self destruct location otherwise
         """
-        current = queue.Queue()
-        current.put(start)
+        blocked = self.blocked
+        visited = self.visited
+        end_indices = {location_index(x, y) for x, y in end_points}
+        direction = self._get_direction_from_endpoints(end_points)
+
+        start_index = location_index(start[0], start[1])
+        current = deque([start_index])
         best_idealness = self._get_idealness(start, end_points)
-        self.game_map[start[0]][start[1]].visited_idealness = True
+        visited[start_index] = 1
         most_ideal = start
 
-        while not current.empty():
-            search_location = current.get()
-            for neighbor in self._get_neighbors(search_location):
-                if not self.game_state.game_map.in_arena_bounds(neighbor) or self.game_map[neighbor[0]][neighbor[1]].blocked:
+        while current:
+            for x, y, index in NEIGHBORS[current.popleft()]:
+                if blocked[index]:
                     continue
 
-                x, y = neighbor
-                current_idealness = self._get_idealness(neighbor, end_points)
+                if index in end_indices:
+                    current_idealness = sys.maxsize
+                else:
+                    current_idealness = 28 * (y if direction[1] == 1 else 27 - y) + (x if direction[0] == 1 else 27 - x)
 
                 if current_idealness > best_idealness:
                     best_idealness = current_idealness
-                    most_ideal = neighbor
+                    most_ideal = [x, y]
 
-                if not self.game_map[x][y].visited_idealness and not self.game_map[x][y].blocked:
-                    self.game_map[x][y].visited_idealness = True
-                    current.put(neighbor)
+                if not visited[index]:
+                    visited[index] = 1
+                    current.append(index)
 
         return most_ideal
 
@@ -119,7 +610,7 @@ class ShortestPathFinder:
         """Prints a message to the games debug output
 
         Args:
-            * end_points: A set of endpoints, should be an edge 
+            * end_points: A set of endpoints, should be an edge
 
         Returns:
             A direction [x,y] representing the edge. For example, [1,1] for the top right and [-1, 1] for the top left
@@ -128,15 +619,15 @@ class ShortestPathFinder:
         point = end_points[0]
         x, y = point
         direction = [1, 1]
-        if x < self.game_state.HALF_ARENA:
+        if x < HALF_ARENA:
            direction[0] = -1
-        if y < self.game_state.HALF_ARENA:
+        if y < HALF_ARENA:
             direction[1] = -1
         return direction
 
     def _get_idealness(self, location, end_points):
         """Get the idealness of a tile, the reachable tile the unit most wants to path to.
-        Better self destruct locations are more ideal. The endpoints are perfectly ideal. 
+        Better self destruct locations are more ideal. The endpoints are perfectly ideal.
 
         Returns:
             A location the unit will attempt to reach
@@ -149,11 +640,11 @@ class ShortestPathFinder:
         idealness = 0
         if direction[1] == 1:
             idealness += 28 * location[1]
-        else: 
+        else:
             idealness += 28 * (27 - location[1])
         if direction[0] == 1:
             idealness += location[0]
-        else: 
+        else:
             idealness += (27 - location[0])
 
         return idealness
@@ -162,49 +653,51 @@ class ShortestPathFinder:
         """Breadth first search of the grid, setting the pathlengths of each node
 
         """
-        #VALDIATION
         #Add our most ideal tiles to current
-        current = queue.Queue()
         if ideal_tile in end_points:
-            for location in end_points:
-               current.put(location)
-               #Set current pathlength to 0
-               self.game_map[location[0]][location[1]].pathlength = 0
-               self.game_map[location[0]][location[1]].visited_validate = True
+            seeds = [location_index(x, y) for x, y in end_points]
         else:
-            current.put(ideal_tile)
-            self.game_map[ideal_tile[0]][ideal_tile[1]].pathlength = 0
-            self.game_map[ideal_tile[0]][ideal_tile[1]].visited_validate = True
-
-        #While current is not empty
-        while not current.empty():
-            current_location = current.get()
-            current_node = self.game_map[current_location[0]][current_location[1]]
-            for neighbor in self._get_neighbors(current_location):
-                if not self.game_state.game_map.in_arena_bounds(neighbor) or self.game_map[neighbor[0]][neighbor[1]].blocked:
-                    continue
-
-                neighbor_node = self.game_map[neighbor[0]][neighbor[1]]
-                if not neighbor_node.visited_validate and not current_node.blocked:
-                    neighbor_node.pathlength = current_node.pathlength + 1
-                    neighbor_node.visited_validate = True
-                    current.put(neighbor)
+            seeds = [location_index(ideal_tile[0], ideal_tile[1])]
+        self._fill_pathlength(self.pathlength, seeds)
 
         #debug_write("Print after validate")
         #self.print_map()
         return
 
+    def _fill_pathlength(self, pathlength, seeds):
+        """Breadth first search out from the seeds through unblocked locations, writing distances into pathlength
+        """
+        blocked = self.blocked
+        current = deque()
+        for index in seeds:
+            if pathlength[index] == -1:
+                current.append(index)
+                #Set current pathlength to 0
+                pathlength[index] = 0
+
+        #While current is not empty
+        while current:
+            current_index = current.popleft()
+            if blocked[current_index]:
+                continue
+            next_length = pathlength[current_index] + 1
+            for _, _, index in NEIGHBORS[current_index]:
+                if pathlength[index] == -1 and not blocked[index]:
+                    pathlength[index] = next_length
+                    current.append(index)
+
     def _get_path(self, start_point, end_points):
         """Once all nodes are validated, and a target is found, the unit can path to its target
 
         """
         #GET THE PATH
+        pathlength = self.pathlength
         path = [start_point]
         current = start_point
         move_direction = 0
 
-        while not self.game_map[current[0]][current[1]].pathlength == 0:
-            #debug_write("current tile {} has cost {}".format(current, self.game_map[current[0]][current[1]].pathlength))
+        while not pathlength[location_index(current[0], current[1])] == 0:
+            #debug_write("current tile {} has cost {}".format(current, pathlength[location_index(current[0], current[1])]))
             next_move = self._choose_next_move(current, move_direction, end_points)
             #debug_write(next_move)
 
@@ -214,26 +707,26 @@ class ShortestPathFinder:
                 move_direction = self.HORIZONTAL
             path.append(next_move)
             current = next_move
-        
+
         #debug_write(path)
         return path
-  
+
     def _choose_next_move(self, current_point, previous_move_direction, end_points):
         """Given the current location and adjacent locations, return the best 'next step' for a given unit to take
         """
-        neighbors = self._get_neighbors(current_point)
-        #debug_write("Unit at {} previously moved {} and has these neighbors {}".format(current_point, previous_move_direction, neighbors))
+        blocked = self.blocked
+        pathlength = self.pathlength
+        #debug_write("Unit at {} previously moved {}".format(current_point, previous_move_direction))
 
         ideal_neighbor = current_point
-        best_pathlength = self.game_map[current_point[0]][current_point[1]].pathlength
-        for neighbor in neighbors:
-            #debug_write("Comparing champ {} and contender {}".format(ideal_neighbor, neighbor))
-            if not self.game_state.game_map.in_arena_bounds(neighbor) or self.game_map[neighbor[0]][neighbor[1]].blocked:
+        best_pathlength = pathlength[location_index(current_point[0], current_point[1])]
+        for x, y, index in NEIGHBORS[location_index(current_point[0], current_point[1])]:
+            #debug_write("Comparing champ {} and contender {}".format(ideal_neighbor, [x, y]))
+            if blocked[index]:
                 continue
 
             new_best = False
-            x, y = neighbor
-            current_pathlength = self.game_map[x][y].pathlength
+            current_pathlength = pathlength[index]
 
             #Filter by pathlength
             if current_pathlength > best_pathlength:
@@ -243,6 +736,7 @@ class ShortestPathFinder:
                 new_best = True
 
             #Filter by direction based on prev move
+            neighbor = [x, y]
             if not new_best and not self._better_direction(current_point, neighbor, ideal_neighbor, previous_move_direction, end_points):
                 continue
 
@@ -261,26 +755,26 @@ class ShortestPathFinder:
         if previous_move_direction == self.HORIZONTAL and not new_tile[0] == prev_best[0]:
             #We want to go up now. If we have not changed our y, we are not going up
             if prev_tile[1] == new_tile[1]:
-                return False 
+                return False
             return True
         if previous_move_direction == self.VERTICAL and not new_tile[1] == prev_best[1]:
             if prev_tile[0] == new_tile[0]:
                 #debug_write("contender {} has the same x coord as prev tile {} so we will keep best move {}".format(new_tile, prev_tile, prev_best))
                 return False
             return True
-        if previous_move_direction == 0: 
-            if prev_tile[1] == new_tile[1]: 
+        if previous_move_direction == 0:
+            if prev_tile[1] == new_tile[1]:
                 return False
             return True
-        
-        #To make it here, both moves are on the same axis 
+
+        #To make it here, both moves are on the same axis
         direction = self._get_direction_from_endpoints(end_points)
         if new_tile[1] == prev_best[1]: #If they both moved horizontal...
             if direction[0] == 1 and new_tile[0] > prev_best[0]: #If we moved right and right is our direction, we moved towards our direction
-                return True 
+                return True
             if direction[0] == -1 and new_tile[0] < prev_best[0]: #If we moved left and left is our direction, we moved towards our direction
-                return True 
-            return False 
+                return True
+            return False
         if new_tile[0] == prev_best[0]: #If they both moved vertical...
             if direction[1] == 1 and new_tile[1] > prev_best[1]: #If we moved up and up is our direction, we moved towards our direction
                 return True
@@ -299,9 +793,9 @@ class ShortestPathFinder:
 
         for y in range(28):
             for x in range(28):
-                node = self.game_map[x][28 - y - 1]
-                if not node.blocked and not node.pathlength == -1:
-                    self._print_justified(node.pathlength)
+                index = location_index(x, 28 - y - 1)
+                if not self.blocked[index] and not self.pathlength[index] == -1:
+                    self._print_justified(self.pathlength[index])
                 else:
                     sys.stderr.write("   ")
             debug_write("")
@@ -314,3 +808,121 @@ class ShortestPathFinder:
             sys.stderr.write(" ")
         sys.stderr.write(str(number))
         sys.stderr.write(" ")
+
+
+class NumpyPathFinder(ShortestPathFinder):
+    """A ShortestPathFinder that computes distance fields with whole array NumPy operations
+
+    Each search step grows the frontier as a boolean mask over the board, masked by the precomputed
+    arena diamond. Boards are stored flattened with a border of padding, so the four neighbor shifts
+    are contiguous slices. Paths are identical to ShortestPathFinder. The search is vectorized over
+    a leading board dimension too, so edge_fields evaluates a stack of hypothetical boards in one pass.
+    Requires NumPy, see numpy_available().
+
+    """
+    PADDED = ARENA_SIZE + 2
+
+    def __init__(self):
+        super().__init__()
+        arena = np.frombuffer(IN_BOUNDS, dtype=np.uint8).reshape(ARENA_SIZE, ARENA_SIZE).astype(bool)
+        self._arena = self._pad(arena)
+        xs, ys = np.indices((ARENA_SIZE, ARENA_SIZE))
+        #Idealness of every location for each edge direction, see _get_idealness
+        self._idealness = {}
+        for dx in (1, -1):
+            for dy in (1, -1):
+                idealness = 28 * (ys if dy == 1 else 27 - ys) + (xs if dx == 1 else 27 - xs)
+                self._idealness[(dx, dy)] = idealness.reshape(-1)
+
+    def _pad(self, mask):
+        """Flattens masks of shape (..., 28, 28) into (..., 900) with a border of False around each board
+        """
+        padded = np.zeros(mask.shape[:-2] + (self.PADDED, self.PADDED), dtype=bool)
+        padded[..., 1:-1, 1:-1] = mask
+        return padded.reshape(mask.shape[:-2] + (self.PADDED * self.PADDED,))
+
+    def _unpad(self, padded):
+        board = padded.reshape(padded.shape[:-1] + (self.PADDED, self.PADDED))[..., 1:-1, 1:-1]
+        return np.ascontiguousarray(board)
+
+    def _blocked_mask(self, blocked):
+        return self._pad(np.frombuffer(blocked, dtype=np.uint8).reshape(-1, ARENA_SIZE, ARENA_SIZE).astype(bool))
+
+    def _location_mask(self, indices):
+        mask = np.zeros(CELL_COUNT, dtype=bool)
+        mask[list(indices)] = True
+        return self._pad(mask.reshape(ARENA_SIZE, ARENA_SIZE))
+
+    def _spread(self, mask):
+        """The locations orthogonally adjacent to a padded mask
+        """
+        grown = np.empty_like(mask)
+        grown[..., 1:] = mask[..., :-1]
+        grown[..., :1] = False
+        grown[..., :-1] |= mask[..., 1:]
+        grown[..., self.PADDED:] |= mask[..., :-self.PADDED]
+        grown[..., :-self.PADDED] |= mask[..., self.PADDED:]
+        return grown
+
+    def _distances(self, blocked, seeds):
+        """Breadth first search from the seed mask over padded boards of shape (..., 900), one frontier per step
+
+        Returns:
+            The pathlengths as an int array of shape (..., 28, 28), -1 where unreached
+        """
+        passable = self._arena & ~blocked
+        unreached = ~np.broadcast_to(seeds, blocked.shape)
+        #Blocked seeds keep a pathlength of 0 but do not expand
+        frontier = passable & ~unreached
+        distances = np.zeros(blocked.shape, dtype=np.intc)
+        while frontier.any():
+            #A location's pathlength is the number of steps taken before it was reached
+            distances += unreached
+            frontier = self._spread(frontier)
+            frontier &= passable
+            frontier &= unreached
+            unreached ^= frontier
+        distances[unreached] = -1
+        return self._unpad(distances)
+
+    def _fill_pathlength(self, pathlength, seeds):
+        distances = self._distances(self._blocked_mask(self.blocked)[0], self._location_mask(seeds))
+        pathlength[:] = array('i', distances.tobytes())
+
+    def _idealness_search(self, start, end_points):
+        x, y = start
+        if not (0 <= x < ARENA_SIZE and 0 <= y < ARENA_SIZE and IN_BOUNDS[location_index(x, y)]):
+            return super()._idealness_search(start, end_points)
+
+        passable = self._arena & ~self._blocked_mask(self.blocked)[0]
+        pocket = self._location_mask([location_index(x, y)])
+        frontier = pocket
+        while frontier.any():
+            frontier = self._spread(frontier) & passable & ~pocket
+            pocket |= frontier
+        pocket = self._unpad(pocket).reshape(-1)
+
+        end_indices = [location_index(ex, ey) for ex, ey in end_points]
+        reachable_ends = np.flatnonzero(pocket[end_indices])
+        if len(reachable_ends):
+            return list(end_points[reachable_ends[0]])
+        direction = self._get_direction_from_endpoints(end_points)
+        best = int(np.argmax(np.where(pocket, self._idealness[tuple(direction)], -1)))
+        return list(divmod(best, ARENA_SIZE))
+
+    def edge_fields(self, layouts, end_points):
+        self.initialized = False
+        if not layouts:
+            return []
+        end_key = tuple(location_index(x, y) for x, y in end_points)
+        layouts = [bytes(layout) for layout in layouts]
+        distances = self._distances(self._blocked_mask(b"".join(layouts)), self._location_mask(end_key))
+        return [DistanceField(array('i', board.tobytes()), layout, end_key, True) for board, layout in zip(distances, layouts)]
+
+
+def numpy_available():
+    """
+    Returns:
+        True if NumPy is installed and NumpyPathFinder can be used
+    """
+    return np is not None
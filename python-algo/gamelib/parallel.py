@@ -0,0 +1,249 @@
+import os
+import math
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from .game_state import GameState
+from .util import debug_write
+
+#Workers stop starting plans this many seconds before the deadline, so their scores arrive in time
+RESULT_MARGIN = 0.02
+#The most worker processes an evaluator starts, each one holds its own interpreter and copy of the board
+MAX_PROCESSES = 4
+
+#State of a worker process, the config it was started with and the last board it rebuilt
+_worker_config = None
+_worker_board = (None, None)
+
+
+def _start_worker(config):
+    global _worker_config
+    _worker_config = config
+
+
+def _warm_up():
+    return os.getpid()
+
+
+def _score_plan(game_state, score, index, plan):
+    """
+    Scores one plan, undoing whatever the score function changed on the game state. Gives [index, score, error].
+    """
+    game_state.begin()
+    try:
+        return [index, score(game_state, plan), None]
+    except Exception as error:
+        return [index, None, "{}: {}".format(type(error).__name__, error)]
+    finally:
+        game_state.rollback()
+
+
+def _score_chunk(board_key, board, score, indexed_plans, deadline):
+    """
+    Scores a chunk of plans in a worker process, stopping at the deadline. The board is only rebuilt when it changes.
+    """
+    global _worker_board
+    key, game_state = _worker_board
+    if key != board_key:
+        game_state = GameState(_worker_config, board)
+        game_state.suppress_warnings(True)
+        _worker_board = (board_key, game_state)
+    results = []
+    for index, plan in indexed_plans:
+        if time.time() >= deadline - RESULT_MARGIN:
+            break
+        results.append(_score_plan(game_state, score, index, plan))
+    return results
+
+
+def path_damage_score(game_state, location):
+    """A score function for spawn locations, higher for safer paths.
+
+    Args:
+        game_state: The board
+        location: The location your mobile unit spawns at
+
+    Returns:
+        Minus the damage your unit would take along its path, see GameState.path_damage, or minus infinity if the location is blocked
+
+    """
+    path = game_state.find_path_to_edge(location)
+    if path is None:
+        return -math.inf
+    return -game_state.path_damage(path, 0)
+
+
+def attack_score(game_state, deploys):
+    """A score function for attacks, simulated with a CombatSimulator.
+
+    Args:
+        game_state: The board
+        deploys: Your mobile units, like the deploys argument of CombatSimulator.simulate
+
+    Returns:
+        The damage dealt to the enemy's health and the damage dealt to their units, as a tuple compared in that order
+
+    """
+    result = game_state.get_combat_simulator().simulate(deploys)
+    return result.breach_damage[0], result.damage_dealt[0]
+
+
+class ParallelEvaluator:
+    """Scores candidate plans on a pool of worker processes, so a turn's search can use more than one core.
+
+    Start the pool once in on_game_start and keep it for the whole game, the workers are then warm when a turn needs them.
+    Call shutdown in on_game_end to stop them. Every evaluation costs a few milliseconds to send the board, so the pool only
+    pays off for plans that are slow to score, like attack_score. Cheap scores like path_damage_score are faster in this process.
+    Each evaluation sends the board as GameState.serialize_board, and every worker rebuilds it once, so neither units nor the
+    config are pickled. Plans are split into chunks and scored with a function score(game_state, plan), the game state is
+    rolled back after every plan. Chunks stop starting plans just before the deadline, and when it passes, chunks that have not
+    started are cancelled. A chunk still running finishes its plan in the background and its scores are discarded. \n
+    The score function and the plans are pickled, so score must be a function defined at the top level of a module,
+    like path_damage_score and attack_score. With no worker processes, or if the pool cannot start, plans are scored in this process.
+
+    Attributes :
+        * config (JSON): Contains information about the game
+        * processes (int): The number of worker processes, 0 to score plans in this process
+        * start_method (string): How workers are started, see multiprocessing.get_context
+        * chunk_size (int): The most plans sent to a worker at a time. Smaller chunks spread the plans more evenly over the workers
+        * late_chunks (int): The number of chunks still running when their deadline passed, over the whole game
+
+    """
+    def __init__(self, config, processes=None, start_method="spawn", chunk_size=4):
+        """Sets up an evaluator, call start to start its workers
+
+        Args:
+            config: The config of the game
+            processes: The number of worker processes, one less than the number of cores if None, at most MAX_PROCESSES
+            start_method: How workers are started, "spawn" by default since the algo's threads are not safe to fork
+            chunk_size: The most plans sent to a worker at a time
+
+        """
+        self.config = config
+        if processes is None:
+            processes = (os.cpu_count() or 1) - 1
+        self.processes = min(max(processes, 0), MAX_PROCESSES)
+        self.start_method = start_method
+        self.chunk_size = chunk_size
+        self.late_chunks = 0
+        self.__executor = None
+        self.__futures = []
+        self.__board_key = 0
+
+    @property
+    def running(self):
+        """True if worker processes score the plans, False if they are scored in this process
+        """
+        return self.__executor is not None
+
+    def start(self):
+        """Starts the worker processes and waits until all of them are ready, so the first turn does not pay for starting them.
+        Does nothing if they are already running or processes is 0.
+        """
+        if self.__executor is not None or self.processes <= 0:
+            return
+        try:
+            context = multiprocessing.get_context(self.start_method)
+            self.__executor = ProcessPoolExecutor(self.processes, mp_context=context, initializer=_start_worker, initargs=(self.config,))
+            for future in [self.__executor.submit(_warm_up) for _ in range(self.processes)]:
+                future.result()
+        except (OSError, ValueError, BrokenProcessPool) as error:
+            debug_write("Could not start the evaluator's workers, plans will be scored in this process: {}".format(error))
+            self.shutdown()
+
+    def shutdown(self):
+        """Stops the worker processes, plans are scored in this process afterwards. Chunks that have not started are cancelled.
+        """
+        executor = self.__executor
+        self.__executor = None
+        for future in self.__futures:
+            future.cancel()
+        self.__futures = []
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    def evaluate(self, game_state, plans, score, timeout):
+        """Scores plans until they run out or the deadline passes
+
+        Args:
+            game_state: The board to score the plans on, it is not changed
+            plans: A list of plans, best guesses first, since the first plans are the first scored
+            score: A function score(game_state, plan) giving the score of a plan, higher is better
+            timeout: The most seconds to wait for scores, never more than what is left of game_state.budget.
+                Pass a slice of the turn, not all of it, since chunks still running when it passes are wasted
+
+        Returns:
+            A list with the score of each plan, None for the plans that were not scored in time or whose score function failed
+
+        """
+        timeout = min(timeout, game_state.budget.remaining())
+        scores = [None] * len(plans)
+        if not plans:
+            return scores
+        if self.__executor is None:
+            deadline = time.perf_counter() + timeout
+            for index, plan in enumerate(plans):
+                if time.perf_counter() >= deadline:
+                    break
+                self.__record(scores, _score_plan(game_state, score, index, plan))
+            return scores
+
+        self.__board_key += 1
+        board = game_state.serialize_board()
+        deadline = time.time() + timeout
+        indexed_plans = list(enumerate(plans))
+        try:
+            futures = [self.__executor.submit(_score_chunk, self.__board_key, board, score, indexed_plans[start:start + self.chunk_size], deadline)
+                       for start in range(0, len(plans), self.chunk_size)]
+            self.__futures = futures
+        except BrokenProcessPool as error:
+            debug_write("The evaluator's workers stopped, plans will be scored in this process: {}".format(error))
+            self.shutdown()
+            return self.evaluate(game_state, plans, score, deadline - time.time())
+        done, not_done = wait(futures, timeout=max(timeout, 0))
+        for future in not_done:
+            if not future.cancel():
+                self.late_chunks += 1
+        for future in done:
+            try:
+                results = future.result()
+            except BrokenProcessPool as error:
+                debug_write("The evaluator's workers stopped, plans will be scored in this process: {}".format(error))
+                self.shutdown()
+                continue
+            except Exception as error:
+                debug_write("Could not score plans in a worker: {}".format(error))
+                continue
+            for result in results:
+                self.__record(scores, result)
+        return scores
+
+    def best(self, game_state, plans, score, timeout, fallback=None):
+        """Scores plans like evaluate and returns the best one, like TurnBudget.best_of
+
+        Args:
+            game_state: The board to score the plans on
+            plans: A list of plans, best guesses first
+            score: A function score(game_state, plan) giving the score of a plan, higher is better
+            timeout: The most seconds to wait for scores, see evaluate
+            fallback: The plan to return if not even one plan was scored
+
+        Returns:
+            The best plan, the first of them on a tie
+
+        """
+        best = fallback
+        best_score = None
+        for plan, plan_score in zip(plans, self.evaluate(game_state, plans, score, timeout)):
+            if plan_score is not None and (best_score is None or plan_score > best_score):
+                best = plan
+                best_score = plan_score
+        return best
+
+    def __record(self, scores, result):
+        index, score, error = result
+        if error is not None:
+            debug_write("Could not score plan {}: {}".format(index, error))
+        scores[index] = score
@@ -0,0 +1,712 @@
+from collections import namedtuple
+from .game_map import ARENA_SIZE, HALF_ARENA, ARENA_LOCATIONS, EDGE_SETS
+from .targeting import TargetingEngine, _rings
+from .unit import GameUnit, unit_stats
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+CELL_COUNT = ARENA_SIZE * ARENA_SIZE
+
+CombatStats = namedtuple("CombatStats", ["shieldBonusPerY", "playerBreachDamage", "selfDestructDamage_f",
+                                         "selfDestructDamage_i", "selfDestructRange", "selfDestructStepsRequired"])
+CombatStats.__doc__ = """The stats of a unit type that only matter during the action phase, and are not kept in UnitStats"""
+
+
+def combat_stats(config):
+    """Reads the action phase stats of every unit type from the config
+
+    Args:
+        config: The game config holding the unit information
+
+    Returns:
+        A dict mapping (unit_type, upgraded) to CombatStats
+
+    """
+    stats = {}
+    for type_config in config["unitInformation"]:
+        if "unitCategory" not in type_config:
+            continue
+        base = CombatStats(
+            type_config.get("shieldBonusPerY", 0),
+            type_config.get("playerBreachDamage", 1),
+            type_config.get("selfDestructDamageTower", type_config.get("startHealth", 0)),
+            type_config.get("selfDestructDamageWalker", type_config.get("startHealth", 0)),
+            type_config.get("selfDestructRange", 0),
+            type_config.get("selfDestructStepsRequired", 0))
+        upgrade = type_config.get("upgrade", {})
+        stats[type_config["shorthand"], False] = base
+        stats[type_config["shorthand"], True] = CombatStats(*(upgrade.get(key, value) for key, value in zip(
+            ("shieldBonusPerY", "playerBreachDamage", "selfDestructDamageTower", "selfDestructDamageWalker",
+             "selfDestructRange", "selfDestructStepsRequired"), base)))
+    return stats
+
+
+def _copy_unit(unit):
+    """
+    Copies a GameUnit, sharing its stats
+    """
+    copy = GameUnit.__new__(GameUnit)
+    copy.stats = unit.stats
+    copy.config = unit.config
+    copy.player_index = unit.player_index
+    copy.pending_removal = unit.pending_removal
+    copy.x = unit.x
+    copy.y = unit.y
+    copy.health = unit.health
+    return copy
+
+
+class _Mover:
+    """
+    A mobile unit in a simulation, with the state it needs to move
+    """
+    __slots__ = ("unit", "end_points", "edge_set", "frames_per_move", "direction", "steps", "shielded_by")
+
+    def __init__(self, unit, end_points, edge_set):
+        self.unit = unit
+        self.end_points = end_points
+        self.edge_set = edge_set
+        speed = unit.speed
+        self.frames_per_move = max(1, int(round(1 / speed))) if speed > 0 else 1
+        self.direction = 0
+        self.steps = 0
+        self.shielded_by = set()
+
+
+def _first_best(valid, keys):
+    """
+    For every row, finds the first valid column with the lexicographically smallest keys.
+    Returns the columns and whether each row had a valid one.
+    """
+    chosen = valid
+    for key in keys:
+        masked = np.where(chosen, key, np.inf)
+        chosen = chosen & (masked == masked.min(axis=1, keepdims=True))
+    return chosen.argmax(axis=1), valid.any(axis=1)
+
+
+def _deal_damage(health, targets, damage, target_player, damage_dealt):
+    """
+    Deals damage to the targets, flat indexes into the health array of shape (scenarios, units), crediting the other player
+    with the damage done up to each target's health. Only the units that were hit are touched.
+    """
+    if not len(targets):
+        return
+    hit, inverse = np.unique(targets, return_inverse=True)
+    hit = np.divmod(hit, health.shape[1])
+    total = np.bincount(inverse, weights=damage)
+    np.add.at(damage_dealt, (hit[0], 1 - target_player[hit]), np.minimum(total, np.maximum(health[hit], 0)))
+    health[hit] -= total
+
+
+class _BoardArrays:
+    """
+    The structures of a simulator and the mobile unit types as NumPy arrays, for CombatSimulator.simulate_batch
+    """
+    def __init__(self, structures, stats, config, hit_radius):
+        self.x = np.array([unit.x for unit in structures], dtype=np.intp)
+        self.y = np.array([unit.y for unit in structures], dtype=np.intp)
+        self.player = np.array([unit.player_index for unit in structures], dtype=np.intp)
+        self.health = np.array([unit.health for unit in structures], dtype=float)
+        self.damage_f = np.array([unit.damage_f for unit in structures], dtype=float)
+        self.damage_i = np.array([unit.damage_i for unit in structures], dtype=float)
+        self.reach = np.array([unit.attackRange + hit_radius for unit in structures], dtype=float)
+        self.at_cell = {unit.x * ARENA_SIZE + unit.y: position for position, unit in enumerate(structures)}
+
+        #Which locations each structure can attack and each support can shield
+        self.attackers = np.flatnonzero(self.damage_f + self.damage_i > 0)
+        self.attacker_player = self.player[self.attackers]
+        self.always_attack = self.damage_f[self.attackers] > 0
+        self.attack_cover = np.zeros((len(self.attackers), CELL_COUNT), dtype=bool)
+        for row, position in enumerate(self.attackers):
+            unit = structures[position]
+            for _, cells in _rings(unit.x * ARENA_SIZE + unit.y, unit.attackRange, hit_radius):
+                self.attack_cover[row, list(cells)] = True
+        supports = [position for position, unit in enumerate(structures) if unit.shieldPerUnit > 0 and unit.shieldRange > 0]
+        self.supports = np.array(supports, dtype=np.intp)
+        self.shield = []
+        self.shield_cover = np.zeros((len(supports), CELL_COUNT), dtype=bool)
+        for row, position in enumerate(supports):
+            unit = structures[position]
+            rows = unit.y if unit.player_index == 0 else ARENA_SIZE - 1 - unit.y
+            self.shield.append(unit.shieldPerUnit + stats[unit.unit_type, unit.upgraded].shieldBonusPerY * rows)
+            for _, cells in _rings(unit.x * ARENA_SIZE + unit.y, unit.shieldRange, hit_radius):
+                self.shield_cover[row, list(cells)] = True
+
+        #Mobile unit types, by their index in types
+        self.types = [type_config["shorthand"] for type_config in config["unitInformation"]
+                      if "unitCategory" in type_config and not unit_stats(config, type_config["shorthand"]).stationary]
+        self.type_index = {unit_type: index for index, unit_type in enumerate(self.types)}
+        type_stats = [unit_stats(config, unit_type) for unit_type in self.types]
+        combat = [stats[unit_type, False] for unit_type in self.types]
+        self.type_health = np.array([unit.max_health for unit in type_stats], dtype=float)
+        self.type_damage_f = np.array([unit.damage_f for unit in type_stats], dtype=float)
+        self.type_damage_i = np.array([unit.damage_i for unit in type_stats], dtype=float)
+        self.type_reach = np.array([unit.attackRange + hit_radius for unit in type_stats], dtype=float)
+        self.type_frames_per_move = np.array([max(1, int(round(1 / unit.speed))) if unit.speed > 0 else 1 for unit in type_stats], dtype=np.intp)
+        self.type_breach_damage = np.array([unit.playerBreachDamage for unit in combat], dtype=float)
+        self.combat = combat
+
+        self.edges = np.zeros((len(EDGE_SETS), CELL_COUNT), dtype=bool)
+        for edge, locations in enumerate(EDGE_SETS):
+            self.edges[edge, [x * ARENA_SIZE + y for x, y in locations]] = True
+
+
+class SimulationResult:
+    """The outcome of a simulated action phase. Lists indexed by player hold [you, your opponent].
+
+    Attributes :
+        * frame_count (int): The number of frames simulated, until no mobile unit was left or max_frames was reached
+        * damage_dealt (list): The damage each player's units dealt to enemy units and structures, by attacks and self destructs
+        * breaches (list): The number of each player's units that reached their target edge
+        * breach_damage (list): The health each player's breaches took from their opponent
+        * structures_destroyed (list): The locations of the enemy structures each player destroyed, in the order they fell.
+          Structures falling on the same frame are in the order the simulator indexed them, by x then y
+        * self_destructs (list): The number of each player's units that self destructed
+        * survivors (list): The number of each player's mobile units still on the board when the simulation stopped
+        * frames (list): One dict per frame if the simulator records frames, empty otherwise. See CombatSimulator
+
+    """
+    def __init__(self):
+        self.frame_count = 0
+        self.damage_dealt = [0, 0]
+        self.breaches = [0, 0]
+        self.breach_damage = [0, 0]
+        self.structures_destroyed = [[], []]
+        self.self_destructs = [0, 0]
+        self.survivors = [0, 0]
+        self.frames = []
+
+    def __repr__(self):
+        return "SimulationResult(frames: {}, damage dealt: {}, breaches: {}, structures destroyed: {})".format(
+            self.frame_count, self.damage_dealt, self.breaches, [len(locations) for locations in self.structures_destroyed])
+
+
+class CombatSimulator:
+    """Plays out the action phase of a turn locally, frame by frame, to compare attacks without the engine.
+    Create one per turn from GameState.get_combat_simulator and call simulate for every candidate attack.
+
+    Each frame follows the engine's order. Supports shield friendly mobile units that entered their range,
+    once per support and unit, by shieldPerUnit plus shieldBonusPerY for each row the support stands from its
+    own edge. Mobile units due to move take one step, picking it like ShortestPathFinder from where they stand,
+    so they re-path around destroyed structures. A unit with no step left breaches if it is on its target edge,
+    otherwise it self destructs, damaging the enemies in selfDestructRange if it took selfDestructStepsRequired steps.
+    Every unit then attacks the target get_target would choose, and units left without health are removed.
+
+    Attacks within a frame are simultaneous: targets are chosen before any damage of the frame is dealt.
+    Structures the algo placed this turn are included, removals are not, and shieldDecay is not modelled.
+
+    Attributes :
+        * config (JSON): Contains information about the game
+        * record_frames (bool): If True, results keep a dict per frame with the keys "frame", "units" listing
+          [unit_type, player_index, x, y, health] for every mobile unit, and "breaches", "self_destructs" and "destroyed"
+          listing [unit_type, player_index, x, y] for the units that breached, self destructed or were destroyed that frame
+        * max_frames (int): The last frame simulated
+
+    """
+    def __init__(self, game_state, record_frames=False, max_frames=1000):
+        """Indexes the structures of a game state, so every simulation starts without that work
+
+        Args:
+            game_state: The GameState to simulate the action phase of. It is forked, so later changes to it are not simulated
+            record_frames: If each result should keep the state of every frame
+            max_frames: The last frame to simulate
+
+        """
+        self.config = game_state.config
+        self.record_frames = record_frames
+        self.max_frames = max_frames
+        self.__game_state = game_state.fork()
+        self.__combat_stats = combat_stats(self.config)
+        self.__initial_steps = {}
+        self.__board = None
+        self.__layout_ids = {}
+        self.__layouts = []
+        self.__batch_steps = {}
+        self.__hit_radius = self.config["unitInformation"][0]["getHitRadius"]
+        self.__structures = []
+        for x, y in ARENA_LOCATIONS:
+            for unit in self.__game_state.game_map[x, y]:
+                if unit.stationary and unit.player_index in (0, 1):
+                    self.__structures.append(unit)
+
+        #Reverse indexes from each location to the structures that can attack or shield a unit there
+        self.__attackers_at = {}
+        self.__supports_at = {}
+        self.__always_attack = []
+        self.__shields = {}
+        hit_radius = self.__hit_radius
+        for position, unit in enumerate(self.__structures):
+            index = unit.x * ARENA_SIZE + unit.y
+            if unit.damage_f > 0:
+                self.__always_attack.append(position)
+            elif unit.damage_i > 0:
+                for _, cells in _rings(index, unit.attackRange, hit_radius):
+                    for cell in cells:
+                        self.__attackers_at.setdefault(cell, []).append(position)
+            if unit.shieldPerUnit > 0 and unit.shieldRange > 0:
+                rows = unit.y if unit.player_index == 0 else ARENA_SIZE - 1 - unit.y
+                self.__shields[position] = unit.shieldPerUnit + self.__combat_stats[unit.unit_type, unit.upgraded].shieldBonusPerY * rows
+                for _, cells in _rings(index, unit.shieldRange, hit_radius):
+                    for cell in cells:
+                        self.__supports_at.setdefault(cell, []).append(position)
+
+    def __spawns(self, deploys, enemy_deploys):
+        """
+        Checks the deploys of both players, giving [player_index, unit_type, location, target_edge, num] for each valid one.
+        """
+        game_state = self.__game_state
+        if deploys is None:
+            deploys = [[unit_type, [x, y]] for unit_type, x, y in game_state._deploy_stack]
+        spawns = []
+        for player_index, player_deploys in ((0, deploys), (1, enemy_deploys or [])):
+            for deploy in player_deploys:
+                unit_type, location = deploy[0], deploy[1]
+                num = deploy[2] if len(deploy) > 2 else 1
+                if (unit_type, False) not in self.__combat_stats or unit_stats(self.config, unit_type).stationary:
+                    game_state._invalid_unit(unit_type)
+                    continue
+                if not game_state.game_map.in_arena_bounds(location) or game_state.contains_stationary_unit(location):
+                    game_state.warn("Could not simulate a {} at {}, the location is blocked or outside the arena".format(unit_type, location))
+                    continue
+                spawns.append([player_index, unit_type, location, game_state.get_target_edge(location), num])
+        return spawns
+
+    def simulate(self, deploys=None, enemy_deploys=None):
+        """Simulates an action phase
+
+        Args:
+            deploys: Your mobile units, a list of [unit_type, location] or [unit_type, location, num].
+                Defaults to the units spawned on the game state with attempt_spawn this turn
+            enemy_deploys: Your opponent's mobile units, in the same form. None for no enemy units
+
+        Returns:
+            A SimulationResult
+
+        """
+        game_state = self.__game_state.fork()
+        game_map = game_state.game_map
+        pathfinder = game_state._shortest_path_finder
+        result = SimulationResult()
+        engine = TargetingEngine(config=self.config)
+        structures = [_copy_unit(unit) for unit in self.__structures]
+        positions = {}
+        for position, unit in enumerate(structures):
+            engine.add(unit)
+            positions[id(unit)] = position
+        destroyed = set()
+
+        movers = []
+        for player_index, unit_type, location, edge, num in self.__spawns(deploys, enemy_deploys):
+            end_points = game_map.get_edge_locations(edge)
+            for _ in range(num):
+                unit = GameUnit(unit_type, self.config, player_index, None, location[0], location[1])
+                engine.add(unit)
+                movers.append(_Mover(unit, end_points, EDGE_SETS[edge]))
+
+        #Steps on the untouched board are shared by every simulation, until a structure falls
+        steps = self.__initial_steps
+        frame = 0
+        while movers and frame < self.max_frames:
+            frame += 1
+            record = {"frame": frame, "breaches": [], "self_destructs": [], "destroyed": []} if self.record_frames else None
+            by_cell = {}
+            for mover in movers:
+                unit = mover.unit
+                by_cell.setdefault(unit.x * ARENA_SIZE + unit.y, []).append(mover)
+
+            #Shield the units that entered the range of a support
+            for cell, cell_movers in by_cell.items():
+                for position in self.__supports_at.get(cell, ()):
+                    if position in destroyed:
+                        continue
+                    support = structures[position]
+                    for mover in cell_movers:
+                        if mover.unit.player_index == support.player_index and position not in mover.shielded_by:
+                            mover.shielded_by.add(position)
+                            mover.unit.health += self.__shields[position]
+
+            #Move, breach and self destruct
+            damaged = []
+            remaining = []
+            for mover in movers:
+                unit = mover.unit
+                if frame % mover.frames_per_move:
+                    remaining.append(mover)
+                    continue
+                key = (unit.x, unit.y, mover.direction, mover.edge_set)
+                step = steps.get(key, False)
+                if step is False:
+                    step = pathfinder.next_step([unit.x, unit.y], mover.end_points, game_state, mover.direction)
+                    steps[key] = step
+                if step is not None:
+                    engine.move(unit, step[0])
+                    mover.direction = step[1]
+                    mover.steps += 1
+                    remaining.append(mover)
+                    continue
+                engine.remove(unit)
+                player_index = unit.player_index
+                if (unit.x, unit.y) in mover.edge_set:
+                    result.breaches[player_index] += 1
+                    result.breach_damage[player_index] += self.__combat_stats[unit.unit_type, unit.upgraded].playerBreachDamage
+                    if record is not None:
+                        record["breaches"].append([unit.unit_type, player_index, unit.x, unit.y])
+                    continue
+                result.self_destructs[player_index] += 1
+                if record is not None:
+                    record["self_destructs"].append([unit.unit_type, player_index, unit.x, unit.y])
+                stats = self.__combat_stats[unit.unit_type, unit.upgraded]
+                if mover.steps < stats.selfDestructStepsRequired:
+                    continue
+                for _, cells in _rings(unit.x * ARENA_SIZE + unit.y, stats.selfDestructRange, self.__hit_radius):
+                    for cell in cells:
+                        for target in engine.units_at(divmod(cell, ARENA_SIZE), 1 - player_index):
+                            damage = stats.selfDestructDamage_f if target.stationary else stats.selfDestructDamage_i
+                            result.damage_dealt[player_index] += min(damage, max(target.health, 0))
+                            target.health -= damage
+                            damaged.append(target)
+            movers = remaining
+
+            #Attack, only structures with an enemy in range need a target
+            attacking = set()
+            for mover in movers:
+                unit = mover.unit
+                for position in self.__attackers_at.get(unit.x * ARENA_SIZE + unit.y, ()):
+                    if structures[position].player_index != unit.player_index:
+                        attacking.add(position)
+            attackers = [structures[position] for position in self.__always_attack if position not in destroyed]
+            attackers += [structures[position] for position in sorted(attacking) if position not in destroyed]
+            attackers += [mover.unit for mover in movers if mover.unit.damage_f + mover.unit.damage_i > 0]
+            for attacker, target in zip(attackers, engine.targets(attackers)):
+                if target is None:
+                    continue
+                damage = attacker.damage_f if target.stationary else attacker.damage_i
+                result.damage_dealt[attacker.player_index] += min(damage, max(target.health, 0))
+                target.health -= damage
+                damaged.append(target)
+
+            #Remove the units left without health
+            fallen = []
+            for position in sorted(set(positions[id(unit)] for unit in damaged if unit.stationary and unit.health <= 0) - destroyed):
+                unit = structures[position]
+                destroyed.add(position)
+                engine.remove(unit)
+                fallen.append([unit.x, unit.y])
+                result.structures_destroyed[1 - unit.player_index].append([unit.x, unit.y])
+                if record is not None:
+                    record["destroyed"].append([unit.unit_type, unit.player_index, unit.x, unit.y])
+            if fallen:
+                #Repair the fields the units follow around the fallen structures instead of searching again
+                edges = {}
+                for mover in movers:
+                    if mover.edge_set not in edges:
+                        edges[mover.edge_set] = mover.end_points
+                fields = [(end_points, pathfinder.get_edge_field(end_points, game_state)) for end_points in edges.values()]
+                for location in fallen:
+                    game_map.remove_unit(location)
+                for end_points, field in fields:
+                    pathfinder.repair_distance_field(field, fallen, game_state)
+                steps = {}
+            if any(mover.unit.health <= 0 for mover in movers):
+                remaining = []
+                for mover in movers:
+                    unit = mover.unit
+                    if unit.health > 0:
+                        remaining.append(mover)
+                        continue
+                    engine.remove(unit)
+                    if record is not None:
+                        record["destroyed"].append([unit.unit_type, unit.player_index, unit.x, unit.y])
+                movers = remaining
+
+            if record is not None:
+                record["units"] = [[mover.unit.unit_type, mover.unit.player_index, mover.unit.x, mover.unit.y, mover.unit.health] for mover in movers]
+                result.frames.append(record)
+        result.frame_count = frame
+        for mover in movers:
+            result.survivors[mover.unit.player_index] += 1
+        return result
+
+    def simulate_batch(self, scenarios, enemy_deploys=None):
+        """Simulates many candidate attacks against this board at once, with the same results as simulate.
+        Use it to score every combination of spawn locations and units in one call.
+
+        The scenarios are stepped in lockstep. The health, location and state of every mobile unit and the health
+        of every structure are NumPy arrays indexed by scenario, so shielding, targeting and damage are worked out
+        for all scenarios together. Units step on boards shared by every scenario that destroyed the same structures.
+        Without NumPy, or if record_frames is set, each scenario is simulated on its own.
+        Ties between different units at the same location with the same health may be broken in another order than simulate.
+
+        Args:
+            scenarios: A list of deploys, each like the deploys argument of simulate
+            enemy_deploys: Your opponent's mobile units in every scenario, in the same form. None for no enemy units
+
+        Returns:
+            A list with a SimulationResult for each scenario. Frames are not recorded
+
+        """
+        if np is None or self.record_frames:
+            return [self.simulate(deploys, enemy_deploys) for deploys in scenarios]
+
+        if self.__board is None:
+            self.__board = _BoardArrays(self.__structures, self.__combat_stats, self.config, self.__hit_radius)
+            self.__layout_ids[frozenset()] = 0
+            self.__layouts.append(self.__layout_state(frozenset()))
+        board = self.__board
+        spawns = [self.__spawns(deploys, enemy_deploys) for deploys in scenarios]
+        count = len(scenarios)
+        slots = max([sum(spawn[4] for spawn in scenario_spawns) for scenario_spawns in spawns] + [1])
+
+        #Mobile units, one slot each in spawn order
+        alive = np.zeros((count, slots), dtype=bool)
+        player = np.zeros((count, slots), dtype=np.intp)
+        kind = np.zeros((count, slots), dtype=np.intp)
+        x = np.zeros((count, slots), dtype=np.intp)
+        y = np.zeros((count, slots), dtype=np.intp)
+        edge = np.zeros((count, slots), dtype=np.intp)
+        for scenario, scenario_spawns in enumerate(spawns):
+            start = 0
+            for player_index, unit_type, location, target_edge, num in scenario_spawns:
+                end = start + num
+                alive[scenario, start:end] = True
+                player[scenario, start:end] = player_index
+                kind[scenario, start:end] = board.type_index[unit_type]
+                x[scenario, start:end] = location[0]
+                y[scenario, start:end] = location[1]
+                edge[scenario, start:end] = target_edge
+                start = end
+        health = board.type_health[kind]
+        frames_per_move = board.type_frames_per_move[kind]
+        damage_f = board.type_damage_f[kind]
+        damage_i = board.type_damage_i[kind]
+        direction = np.zeros((count, slots), dtype=np.intp)
+        steps = np.zeros((count, slots), dtype=np.intp)
+        shielded = np.zeros((count, slots, len(board.supports)), dtype=bool)
+        slot_order = np.arange(slots)
+
+        #Structures, shared by every scenario but with their own health in each
+        structure_count = len(board.health)
+        structure_health = np.tile(board.health, (count, 1))
+        standing = np.ones((count, structure_count), dtype=bool)
+        destroyed = [frozenset()] * count
+        layout = np.zeros(count, dtype=np.intp)
+
+        damage_dealt = np.zeros((count, 2))
+        breaches = np.zeros((count, 2), dtype=np.intp)
+        breach_damage = np.zeros((count, 2))
+        self_destructs = np.zeros((count, 2), dtype=np.intp)
+        structures_destroyed = [[[], []] for _ in range(count)]
+        frame_count = np.zeros(count, dtype=np.intp)
+
+        frame = 0
+        while frame < self.max_frames:
+            active = alive.any(axis=1)
+            if not active.any():
+                break
+            frame += 1
+            frame_count[active] = frame
+
+            #Shield the units that entered the range of a support
+            cell = x * ARENA_SIZE + y
+            for row, position in enumerate(board.supports):
+                newly = board.shield_cover[row][cell] & alive & (player == board.player[position]) & standing[:, position, None] & ~shielded[:, :, row]
+                shielded[:, :, row] |= newly
+                health[newly] += board.shield[row]
+
+            #Move, breach and self destruct
+            ended = np.zeros((count, slots), dtype=bool)
+            due = alive & (frame % frames_per_move == 0)
+            if due.any():
+                scenarios_due, slots_due = np.nonzero(due)
+                keys = ((layout[scenarios_due] * CELL_COUNT + cell[due]) * 3 + direction[due]) * len(EDGE_SETS) + edge[due]
+                unique_keys, inverse = np.unique(keys, return_inverse=True)
+                next_cell = np.zeros(len(unique_keys), dtype=np.intp)
+                next_direction = np.zeros(len(unique_keys), dtype=np.intp)
+                has_step = np.zeros(len(unique_keys), dtype=bool)
+                for index, key in enumerate(unique_keys.tolist()):
+                    rest, target_edge = divmod(key, len(EDGE_SETS))
+                    rest, move_direction = divmod(rest, 3)
+                    layout_id, location = divmod(rest, CELL_COUNT)
+                    step = self.__batch_step(layout_id, location, move_direction, target_edge)
+                    if step is not None:
+                        has_step[index] = True
+                        next_cell[index] = step[0][0] * ARENA_SIZE + step[0][1]
+                        next_direction[index] = step[1]
+                moving = has_step[inverse]
+                moved_scenarios, moved_slots = scenarios_due[moving], slots_due[moving]
+                x[moved_scenarios, moved_slots], y[moved_scenarios, moved_slots] = np.divmod(next_cell[inverse][moving], ARENA_SIZE)
+                direction[moved_scenarios, moved_slots] = next_direction[inverse][moving]
+                steps[moved_scenarios, moved_slots] += 1
+                ended[scenarios_due[~moving], slots_due[~moving]] = True
+
+            if ended.any():
+                ended_scenarios, ended_slots = np.nonzero(ended)
+                on_edge = board.edges[edge[ended], cell[ended]]
+                breached = (ended_scenarios[on_edge], ended_slots[on_edge])
+                np.add.at(breaches, (breached[0], player[breached]), 1)
+                np.add.at(breach_damage, (breached[0], player[breached]), board.type_breach_damage[kind[breached]])
+                exploded = (ended_scenarios[~on_edge], ended_slots[~on_edge])
+                np.add.at(self_destructs, (exploded[0], player[exploded]), 1)
+                moved_cell = x * ARENA_SIZE + y
+                for scenario, slot in zip(*(indices.tolist() for indices in exploded)):
+                    stats = board.combat[kind[scenario, slot]]
+                    if steps[scenario, slot] < stats.selfDestructStepsRequired:
+                        continue
+                    player_index = player[scenario, slot]
+                    #Units earlier in the frame's order already moved or left the board, later ones have not
+                    earlier = slot_order < slot
+                    present = alive[scenario] & ~(ended[scenario] & earlier) & (player[scenario] != player_index)
+                    located = np.where(earlier, moved_cell[scenario], cell[scenario])
+                    cells = [in_range for _, ring in _rings(cell[scenario, slot], stats.selfDestructRange, self.__hit_radius) for in_range in ring]
+                    for in_range in cells:
+                        position = board.at_cell.get(in_range)
+                        if position is not None and standing[scenario, position] and board.player[position] != player_index:
+                            damage_dealt[scenario, player_index] += min(stats.selfDestructDamage_f, max(structure_health[scenario, position], 0))
+                            structure_health[scenario, position] -= stats.selfDestructDamage_f
+                    hit = present & np.isin(located, cells)
+                    damage_dealt[scenario, player_index] += np.minimum(stats.selfDestructDamage_i, np.maximum(health[scenario, hit], 0)).sum()
+                    health[scenario, hit] -= stats.selfDestructDamage_i
+                alive &= ~ended
+
+            #Attack, every target is chosen before any damage is dealt
+            cell = x * ARENA_SIZE + y
+            self.__batch_attack(board, active, alive, player, kind, cell, health, damage_f, damage_i,
+                                standing, structure_health, damage_dealt)
+
+            #Remove the units left without health
+            fallen = standing & (structure_health <= 0)
+            if fallen.any():
+                standing &= ~fallen
+                for scenario in np.flatnonzero(fallen.any(axis=1)).tolist():
+                    positions = np.flatnonzero(fallen[scenario]).tolist()
+                    for position in positions:
+                        structures_destroyed[scenario][1 - board.player[position]].append([int(board.x[position]), int(board.y[position])])
+                    edges = set(edge[scenario, alive[scenario]].tolist())
+                    destroyed[scenario] = destroyed[scenario].union(positions)
+                    layout[scenario] = self.__batch_layout(destroyed[scenario], layout[scenario], positions, edges)
+            alive &= health > 0
+
+        results = []
+        for scenario in range(count):
+            result = SimulationResult()
+            result.frame_count = int(frame_count[scenario])
+            result.damage_dealt = damage_dealt[scenario].tolist()
+            result.breaches = breaches[scenario].tolist()
+            result.breach_damage = breach_damage[scenario].tolist()
+            result.structures_destroyed = structures_destroyed[scenario]
+            result.self_destructs = self_destructs[scenario].tolist()
+            result.survivors = [int((alive[scenario] & (player[scenario] == player_index)).sum()) for player_index in (0, 1)]
+            results.append(result)
+        return results
+
+    def __batch_attack(self, board, active, alive, player, kind, cell, health, damage_f, damage_i, standing, structure_health, damage_dealt):
+        """
+        Resolves one frame of attacks for every scenario of simulate_batch, changing the health arrays in place.
+        """
+        count, slots = alive.shape
+        x, y = np.divmod(cell, ARENA_SIZE)
+
+        #Structures that damage structures always look for a target, the others only when an enemy unit is in their range.
+        #Only the cells the live units stand on are looked up, then the units are grouped by scenario
+        alive_scenarios = np.nonzero(alive)[0]
+        in_range = board.attack_cover[:, cell[alive]] & (player[alive] != board.attacker_player[:, None])
+        enemies_in_range = np.zeros((count, len(board.attackers)), dtype=bool)
+        if len(alive_scenarios):
+            starts = np.flatnonzero(np.diff(alive_scenarios, prepend=-1))
+            enemies_in_range[alive_scenarios[starts]] = np.logical_or.reduceat(in_range, starts, axis=1).T
+        firing = (enemies_in_range | board.always_attack) & standing[:, board.attackers] & active[:, None]
+        firing_scenarios, firing_rows = np.nonzero(firing)
+        firing_positions = board.attackers[firing_rows]
+
+        #Stacked mobile units of one type share their target
+        armed = alive & (damage_f + damage_i > 0)
+        armed_scenarios, armed_slots = np.nonzero(armed)
+        group_keys = ((armed_scenarios * CELL_COUNT + cell[armed]) * len(board.types) + kind[armed]) * 2 + player[armed]
+        _, first, group_sizes = np.unique(group_keys, return_index=True, return_counts=True)
+        group_scenarios, group_slots = armed_scenarios[first], armed_slots[first]
+
+        scenario = np.concatenate([firing_scenarios, group_scenarios])
+        if not len(scenario):
+            return
+        attacker_x = np.concatenate([board.x[firing_positions], x[group_scenarios, group_slots]])
+        attacker_y = np.concatenate([board.y[firing_positions], y[group_scenarios, group_slots]])
+        attacker_player = np.concatenate([board.player[firing_positions], player[group_scenarios, group_slots]])
+        reach = np.concatenate([board.reach[firing_positions], board.type_reach[kind[group_scenarios, group_slots]]])
+        group_damage_f = np.concatenate([board.damage_f[firing_positions], damage_f[group_scenarios, group_slots] * group_sizes])
+        group_damage_i = np.concatenate([board.damage_i[firing_positions], damage_i[group_scenarios, group_slots] * group_sizes])
+        lower_y_first = (attacker_player == 0)[:, None]
+
+        #Mobile units come first, nearest, then lowest health, lowest y and closest to an edge.
+        #Only the attackers whose scenario has a live enemy unit look for one
+        enemy_alive = np.stack([(alive & (player == 1)).any(axis=1), (alive & (player == 0)).any(axis=1)], axis=1)
+        looking = np.flatnonzero(enemy_alive[scenario, attacker_player] & (group_damage_i > 0))
+        has_mobile = np.zeros(len(scenario), dtype=bool)
+        if len(looking):
+            looking_scenario = scenario[looking]
+            target_x, target_y = x[looking_scenario], y[looking_scenario]
+            distance = np.sqrt((target_x - attacker_x[looking, None]) ** 2 + (target_y - attacker_y[looking, None]) ** 2)
+            valid = alive[looking_scenario] & (player[looking_scenario] != attacker_player[looking, None]) & (distance < reach[looking, None])
+            mobile_target, found = _first_best(valid, (distance, health[looking_scenario], np.where(lower_y_first[looking], target_y, -target_y),
+                                                       -np.abs(HALF_ARENA - 0.5 - target_x)))
+            has_mobile[looking] = found
+            _deal_damage(health, looking_scenario[found] * slots + mobile_target[found], group_damage_i[looking][found], player, damage_dealt)
+
+        #Then the nearest structure, for the attackers that damage structures and found no mobile unit
+        searching = np.flatnonzero(~has_mobile & (group_damage_f > 0))
+        if not len(searching) or not len(board.health):
+            return
+        scenario = scenario[searching]
+        distance = np.sqrt((board.x - attacker_x[searching, None]) ** 2 + (board.y - attacker_y[searching, None]) ** 2)
+        valid = standing[scenario] & (board.player != attacker_player[searching, None]) & (distance < reach[searching, None])
+        structure_target, has_structure = _first_best(valid, (distance, structure_health[scenario],
+                                                              np.where(lower_y_first[searching], board.y, -board.y),
+                                                              -np.abs(HALF_ARENA - 0.5 - board.x)))
+        structure_count = len(board.health)
+        _deal_damage(structure_health, scenario[has_structure] * structure_count + structure_target[has_structure],
+                     group_damage_f[searching][has_structure], np.broadcast_to(board.player, structure_health.shape), damage_dealt)
+
+    def __layout_state(self, destroyed):
+        """
+        Forks the board with some structures destroyed, with its own pathfinder so boards never evict each other's fields.
+        """
+        game_state = self.__game_state.fork()
+        game_state._shortest_path_finder = type(game_state._shortest_path_finder)()
+        for position in destroyed:
+            unit = self.__structures[position]
+            game_state.game_map.remove_unit([unit.x, unit.y])
+        return game_state
+
+    def __batch_layout(self, destroyed, parent, fallen, edges):
+        """
+        Gets the id of the board with the destroyed structures, repairing the distance fields of the parent board to make a new one.
+        """
+        layout_id = self.__layout_ids.get(destroyed)
+        if layout_id is None:
+            game_state = self.__layout_state(destroyed)
+            parent_state = self.__layouts[parent]
+            locations = [[self.__structures[position].x, self.__structures[position].y] for position in fallen]
+            for target_edge in edges:
+                end_points = parent_state.game_map.get_edge_locations(target_edge)
+                field = parent_state._shortest_path_finder.get_edge_field(end_points, parent_state)
+                game_state._shortest_path_finder.repair_distance_field(field, locations, game_state)
+            layout_id = len(self.__layouts)
+            self.__layout_ids[destroyed] = layout_id
+            self.__layouts.append(game_state)
+        return layout_id
+
+    def __batch_step(self, layout_id, location, direction, target_edge):
+        """
+        The next step of a unit on one of the boards of simulate_batch, see ShortestPathFinder.next_step.
+        """
+        key = (layout_id, location, direction, target_edge)
+        step = self.__batch_steps.get(key, False)
+        if step is False:
+            game_state = self.__layouts[layout_id]
+            end_points = game_state.game_map.get_edge_locations(target_edge)
+            step = game_state._shortest_path_finder.next_step(list(divmod(location, ARENA_SIZE)), end_points, game_state, direction)
+            self.__batch_steps[key] = step
+        return step
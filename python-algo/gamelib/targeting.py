@@ -0,0 +1,176 @@
+import math
+from .game_map import ARENA_SIZE, HALF_ARENA, IN_ARENA, ARENA_LOCATIONS
+
+_RINGS = {}
+
+
+def _rings(index, attack_range, hit_radius):
+    """The locations an attacker at index can target, as GameMap.get_locations_in_range finds them,
+    grouped by their distance from the attacker. Nearest group first, each group in get_locations_in_range order.
+    """
+    key = (index, attack_range, hit_radius)
+    rings = _RINGS.get(key)
+    if rings is None:
+        x, y = divmod(index, ARENA_SIZE)
+        search_radius = int(math.ceil(attack_range))
+        by_distance = {}
+        for dx in range(-search_radius, search_radius + 1):
+            for dy in range(-search_radius, search_radius + 1):
+                distance = math.sqrt(dx**2 + dy**2)
+                target_x, target_y = x + dx, y + dy
+                if distance < attack_range + hit_radius and 0 <= target_x < ARENA_SIZE and 0 <= target_y < ARENA_SIZE \
+                        and IN_ARENA[target_x * ARENA_SIZE + target_y]:
+                    by_distance.setdefault(distance, []).append(target_x * ARENA_SIZE + target_y)
+        rings = tuple((distance, tuple(cells)) for distance, cells in sorted(by_distance.items()))
+        _RINGS[key] = rings
+    return rings
+
+
+def find_target(attacking_unit, units_at, hit_radius):
+    """Finds the unit an attacker targets, with the priorities of GameState.get_target:
+    Infantry > Nearest Unit > Lowest Health > Lowest Y position > Closest to edge
+
+    Locations are searched nearest first, so the search stops at the first distance holding a mobile target.
+
+    Args:
+        attacking_unit: A GameUnit
+        units_at: A function giving the units at a location, by index x * ARENA_SIZE + y
+        hit_radius: The getHitRadius of the config
+
+    Returns:
+        The GameUnit the attacker would choose, the same as get_target. None if nothing is in range
+
+    """
+    player_index = attacking_unit.player_index
+    hits_structures = attacking_unit.damage_f != 0
+    hits_mobiles = attacking_unit.damage_i != 0
+    if not hits_structures and not hits_mobiles:
+        return None
+    lower_y_first = player_index == 0
+    structure = None
+    structure_key = None
+    for distance, cells in _rings(attacking_unit.x * ARENA_SIZE + attacking_unit.y, attacking_unit.attackRange, hit_radius):
+        mobile = None
+        mobile_key = None
+        #Nearer structures beat farther ones, so only the first distance holding one is searched for them
+        search_structures = hits_structures and structure is None
+        for cell in cells:
+            for unit in units_at(cell):
+                if unit.player_index == player_index:
+                    continue
+                if unit.stationary:
+                    if not search_structures:
+                        continue
+                    key = (unit.health, unit.y if lower_y_first else -unit.y, -abs(HALF_ARENA - 0.5 - unit.x))
+                    if structure_key is None or key < structure_key:
+                        structure = unit
+                        structure_key = key
+                elif hits_mobiles:
+                    key = (unit.health, unit.y if lower_y_first else -unit.y, -abs(HALF_ARENA - 0.5 - unit.x))
+                    if mobile_key is None or key < mobile_key:
+                        mobile = unit
+                        mobile_key = key
+        if mobile is not None:
+            return mobile
+        if structure is not None and not hits_mobiles:
+            return structure
+    return structure
+
+
+class TargetingEngine:
+    """Finds the targets of every attacker on a board in one pass, with the same results as GameState.get_target.
+
+    Units are bucketed by owner and location, and each attacker searches the locations in its range nearest first
+    from a table built once per location and range. Attackers sharing a location, owner and stats share one search.
+    The engine keeps its own index, so a simulation can move, add and remove units through it between frames.
+    Units controlled by neither player are not indexed.
+
+    Attributes :
+        * config (JSON): Contains information about the game
+
+    """
+    def __init__(self, game_map=None, config=None):
+        """Indexes the units of a map
+
+        Args:
+            game_map: The GameMap to index, or None for an empty engine
+            config: The config of the game, only needed without a game_map
+
+        """
+        self.config = game_map.config if game_map is not None else config
+        self.__hit_radius = self.config["unitInformation"][0]["getHitRadius"]
+        size = ARENA_SIZE * ARENA_SIZE
+        self.__cells = ([[] for _ in range(size)], [[] for _ in range(size)])
+        if game_map is not None:
+            for x, y in ARENA_LOCATIONS:
+                for unit in game_map[x, y]:
+                    self.add(unit)
+
+    def add(self, unit):
+        """Adds a unit at its own location, after the units already there
+        """
+        if unit.player_index in (0, 1):
+            self.__cells[unit.player_index][unit.x * ARENA_SIZE + unit.y].append(unit)
+
+    def remove(self, unit):
+        """Removes a unit from its location
+        """
+        if unit.player_index in (0, 1):
+            self.__cells[unit.player_index][unit.x * ARENA_SIZE + unit.y].remove(unit)
+
+    def move(self, unit, location):
+        """Moves a unit to a new location, setting its x and y
+
+        Args:
+            unit: A unit in the engine
+            location: The new location of the unit
+
+        """
+        self.remove(unit)
+        unit.x, unit.y = location
+        self.add(unit)
+
+    def units_at(self, location, player_index):
+        """Returns the indexed units of a player at a location, in the order they were added
+        """
+        return self.__cells[player_index][location[0] * ARENA_SIZE + location[1]]
+
+    def units(self):
+        """Returns every indexed unit, by location in x then y order
+        """
+        return [unit for index in range(ARENA_SIZE * ARENA_SIZE) for player_cells in self.__cells for unit in player_cells[index]]
+
+    def get_target(self, attacking_unit):
+        """Returns the unit an attacker would target, the same as GameState.get_target
+
+        Args:
+            attacking_unit: A GameUnit, it does not need to be in the engine
+
+        Returns:
+            The targeted GameUnit, or None
+
+        """
+        if attacking_unit.player_index not in (0, 1):
+            return None
+        return find_target(attacking_unit, self.__cells[1 - attacking_unit.player_index].__getitem__, self.__hit_radius)
+
+    def targets(self, attackers=None):
+        """Resolves the targets of many attackers at once
+
+        Args:
+            attackers: The attacking GameUnits, every indexed unit that deals damage if None
+
+        Returns:
+            A list with the target of each attacker, None for attackers with nothing in range
+
+        """
+        if attackers is None:
+            attackers = [unit for unit in self.units() if unit.damage_i + unit.damage_f > 0]
+        found = {}
+        results = []
+        for attacker in attackers:
+            key = (attacker.x, attacker.y, attacker.player_index, attacker.attackRange, attacker.damage_f != 0, attacker.damage_i != 0)
+            if key not in found:
+                found[key] = self.get_target(attacker)
+            results.append(found[key])
+        return results
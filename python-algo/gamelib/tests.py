@@ -1,7 +1,20 @@
 import unittest
 import json
+import math
+import io
+import sys
+import threading
+import time
+from contextlib import redirect_stderr
 from .game_state import GameState
 from .unit import GameUnit
+from .navigation import ShortestPathFinder, numpy_available
+from .game_map import ARENA_MASK, count_bits
+from .util import GameMessage, get_json_field
+from .message_reader import MessageReader
+from .algocore import AlgoCore
+from .budget import TurnBudget
+from .parallel import ParallelEvaluator, MAX_PROCESSES, path_damage_score, attack_score
 
 class BasicTests(unittest.TestCase):
 
@@ -256,6 +269,638 @@ class BasicTests(unittest.TestCase):
         game.game_map.add_unit("DF", [14,14], 1)
         self.assertEqual(3, len(game.get_attackers([13,13], 0)), "We should be in danger from 3 places")
 
+    def test_pathing_reuses_grid(self):
+        game = self.make_turn_0_map()
+        path = game.find_path_to_edge([13, 0])
+        self.assertEqual(29, len(path), "Unobstructed path from the bottom corner should cross the board")
+        self.assertIn(path[-1], game.game_map.get_edge_locations(game.game_map.TOP_RIGHT), "Path should end on the target edge")
+        game.game_map.add_unit("FF", [13, 1], 0)
+        self.assertEqual([14, 0], game.find_path_to_edge([13, 0])[1], "Reused pathfinder did not see the new wall")
+        game.game_map.remove_unit([13, 1])
+        self.assertEqual(path, game.find_path_to_edge([13, 0]), "Reused pathfinder did not see the wall removal")
+
+    def test_distance_field_shared_by_start_points(self):
+        game = self.make_turn_0_map()
+        finder = game._shortest_path_finder
+        end_points = game.game_map.get_edge_locations(game.game_map.TOP_RIGHT)
+        first = finder.get_distance_field([13, 0], end_points, game)
+        self.assertTrue(first.reaches_edge, "The edge should be reachable on an empty board")
+        self.assertIs(first, finder.get_distance_field([5, 8], end_points, game), "Start points that reach the edge should share a field")
+        for x in range(11, 17):
+            game.game_map.add_unit("FF", [x, 2], 0)
+        pocket = finder.get_distance_field([13, 0], end_points, game)
+        self.assertFalse(pocket.reaches_edge, "The walled off corner should not reach the edge")
+        self.assertIs(pocket, finder.get_distance_field([12, 1], end_points, game), "Start points in one pocket should share a field")
+        self.assertEqual([[13, 0], [13, 1], [14, 1], [15, 1]], game.find_path_to_edge([13, 0]), "Wrong self destruct path")
+
+    def test_path_cache_follows_layout(self):
+        game = self.make_turn_0_map()
+        layout = game.game_map.blocked_layout()
+        path = game.find_path_to_edge([13, 0])
+        self.assertEqual(path, game.find_path_to_edge([13, 0]), "Cached path should match the computed one")
+        game.attempt_spawn("FF", [13, 1])
+        self.assertIsNot(layout, game.game_map.blocked_layout(), "Spawning a structure should change the layout")
+        self.assertNotEqual(path, game.find_path_to_edge([13, 0]), "Path cache was not invalidated by a spawn")
+        game.game_map.remove_unit([13, 1])
+        self.assertEqual(layout, game.game_map.blocked_layout(), "Removing the structure should restore the layout")
+        self.assertEqual(path, game.find_path_to_edge([13, 0]), "Path should be restored with the layout")
+
+    def test_incremental_pathing(self):
+        game = self.make_turn_0_map()
+        finder = game._shortest_path_finder
+        end_points = game.game_map.get_edge_locations(game.game_map.TOP_RIGHT)
+        for x in range(10, 18):
+            game.game_map.add_unit("FF", [x, 5], 1)
+        field = finder.get_distance_field([13, 0], end_points, game)
+        for location in [[9, 5], [18, 5], [11, 4]]:
+            game.game_map.add_unit("FF", location, 0)
+        repaired = finder.navigate_incremental([13, 0], end_points, game, field, [[9, 5], [18, 5], [11, 4]])
+        self.assertEqual(field.pathlength[0], -1, "The previous field should not be modified")
+        full = ShortestPathFinder().navigate_multiple_endpoints([13, 0], end_points, game)
+        self.assertEqual(full, repaired, "Repaired path should match a full search")
+
+    def test_pathfinding_engines(self):
+        game = self.make_turn_0_map()
+        for x in range(8, 20):
+            game.game_map.add_unit("FF", [x, 7], 1)
+        python_paths = [game.find_path_to_edge([x, 13 - x]) for x in range(14)]
+        engine = game.set_pathfinding_engine("numpy")
+        self.assertEqual("numpy" if numpy_available() else "python", engine, "NumPy engine should only be used when NumPy is installed")
+        self.assertEqual(python_paths, [game.find_path_to_edge([x, 13 - x]) for x in range(14)], "Engines should find the same paths")
+        end_points = game.game_map.get_edge_locations(game.game_map.TOP_LEFT)
+        layouts = [game.game_map.blocked_layout(), bytes(len(game.game_map.blocked_layout()))]
+        fields = game._shortest_path_finder.edge_fields(layouts, end_points)
+        expected = ShortestPathFinder().get_distance_field([14, 0], end_points, game)
+        self.assertEqual(list(expected.pathlength), list(fields[0].pathlength), "Batched field does not match")
+        self.assertEqual(28, fields[1].pathlength[14 * 28], "Empty board field is wrong")
+        self.assertEqual("python", game.set_pathfinding_engine("python"), "Should be able to switch back to python")
+
+    def test_find_paths_batch(self):
+        game = self.make_turn_0_map()
+        for x in range(6, 22):
+            game.game_map.add_unit("FF", [x, 8], 0)
+        starts = [[13, 0], [14, 0], [3, 10], [24, 10]]
+        boards = [([], []), ([], [[10, 8], [11, 8]]), ([[4, 9], [23, 9]], [])]
+        paths = game.find_paths_batch(starts, boards)
+        self.assertEqual([game.find_path_to_edge(start) for start in starts], paths[0], "Unchanged board should give the usual paths")
+        game.game_map.remove_unit([10, 8])
+        game.game_map.remove_unit([11, 8])
+        self.assertEqual([game.find_path_to_edge(start) for start in starts], paths[1], "Paths are wrong on the board with walls removed")
+        game.game_map.add_unit("FF", [10, 8], 0)
+        game.game_map.add_unit("FF", [11, 8], 0)
+        game.game_map.add_unit("FF", [4, 9], 0)
+        game.game_map.add_unit("FF", [23, 9], 0)
+        self.assertEqual([game.find_path_to_edge(start) for start in starts], paths[2], "Paths are wrong on the board with walls added")
+
+    def test_predict_trajectory(self):
+        game = self.make_turn_0_map()
+        for x in range(11, 17):
+            game.game_map.add_unit("FF", [x, 2], 0)
+        trajectory = game.predict_trajectory([13, 0])
+        self.assertEqual(game.find_path_to_edge([13, 0]), [location for frame, location in trajectory], "Trajectory should follow the path when nothing is destroyed")
+        self.assertEqual([0, 1, 2, 3], [frame for frame, location in trajectory])
+        trajectory = game.predict_trajectory([13, 0], {2: [[13, 2]]}, "EI")
+        self.assertEqual([0, 2, 4], [frame for frame, location in trajectory[:3]], "Demolishers should move every other frame")
+        self.assertIn(trajectory[-1][1], game.game_map.get_edge_locations(game.game_map.TOP_RIGHT), "Unit should re-path through the destroyed wall")
+        self.assertTrue(game.contains_stationary_unit([13, 2]), "Prediction should not change the map")
+
+    def test_bitboards(self):
+        game = self.make_turn_0_map()
+        game_map = game.game_map
+        self.assertEqual(0, game_map.structure_bits())
+        game_map.add_unit("FF", [13, 10], 0)
+        game_map.add_unit("DF", [14, 20], 1)
+        game_map.add_unit("PI", [5, 9], 1)
+        self.assertEqual(1 << (13 * 28 + 10), game_map.structure_bits(0))
+        self.assertEqual(1 << (14 * 28 + 20), game_map.unit_bits("DF", 1))
+        self.assertEqual(1 << (5 * 28 + 9), game_map.unit_bits("PI"))
+        self.assertEqual(1, count_bits(game_map.structure_bits() & game_map.region_bits(valid_y=range(14, 28))))
+        game_map.add_unit("EF", [13, 10], 1)
+        self.assertEqual(0, game_map.structure_bits(0), "Replaced structure should leave the bitboard")
+        self.assertEqual(0, game_map.unit_bits("FF"))
+        game_map.remove_unit([14, 20])
+        self.assertEqual(1, count_bits(game_map.structure_bits()))
+        self.assertEqual(ARENA_MASK, game_map.region_bits())
+        self.assertEqual(420, count_bits(ARENA_MASK))
+
+    def test_geometry_tables(self):
+        game = self.make_turn_0_map()
+        game_map = game.game_map
+        locations = [location for location in game_map]
+        self.assertEqual(420, len(locations))
+        self.assertEqual([[13, 0], [14, 0], [12, 1]], locations[:3])
+        self.assertEqual([13, 27], locations[-2])
+        self.assertEqual(locations, [location for location in game_map], "Iterating twice should give the same locations")
+        edge = game_map.get_edge_locations(game_map.BOTTOM_LEFT)
+        edge.append([0, 0])
+        edge[0][0] = 5
+        self.assertEqual([13, 0], game_map.get_edge_locations(game_map.BOTTOM_LEFT)[0], "Edges should be copies")
+        self.assertEqual(14, len(game_map.get_edge_locations(game_map.BOTTOM_LEFT)))
+        self.assertFalse(game_map.in_arena_bounds([-1, 13]))
+        self.assertFalse(game_map.in_arena_bounds([0, 28]))
+        self.assertTrue(game_map.in_arena_bounds([0, 13]))
+        self.assertEqual(game_map.get_locations_in_range([13, 13], 3.5), game_map.get_locations_in_range([13, 13], 3.5))
+        self.assertTrue(game.can_spawn("PI", [0, 13]))
+        self.assertFalse(game.can_spawn("PI", [1, 13]))
+
+    def test_fork(self):
+        game = self.make_turn_0_map()
+        game.game_map.add_unit("DF", [13, 10], 0)
+        fork = game.fork()
+        fork.attempt_spawn("FF", [12, 10])
+        fork.attempt_upgrade([13, 10])
+        fork.game_map.add_unit("PI", [13, 0], 0)
+        game.game_map.remove_unit([14, 10])
+        game.game_map.add_unit("FF", [20, 10], 0)
+        self.assertFalse(game.contains_stationary_unit([12, 10]), "Fork should not build on the original map")
+        self.assertFalse(game.game_map[13, 10][0].upgraded, "Fork should not upgrade units of the original map")
+        self.assertTrue(fork.game_map[13, 10][0].upgraded)
+        self.assertEqual(0, len(game.game_map[13, 0]))
+        self.assertFalse(fork.contains_stationary_unit([20, 10]), "Original should not build on the forked map")
+        self.assertEqual(25, game.get_resource(game.SP))
+        self.assertEqual(20, fork.get_resource(fork.SP))
+        self.assertEqual([], game._build_stack)
+        self.assertEqual(2, len(fork._build_stack))
+        self.assertNotEqual(game.game_map.blocked_layout(), fork.game_map.blocked_layout())
+        self.assertEqual(0, game.game_map.structure_bits() & (1 << (12 * 28 + 10)))
+
+    def test_transactions(self):
+        game = self.make_turn_0_map()
+        game.game_map.add_unit("DF", [13, 10], 0)
+        layout = game.game_map.blocked_layout()
+        game.begin()
+        game.attempt_spawn("FF", [12, 10])
+        game.begin()
+        game.attempt_upgrade([13, 10])
+        game.attempt_spawn("PI", [13, 0])
+        game.rollback()
+        self.assertFalse(game.game_map[13, 10][0].upgraded, "Inner rollback should undo the upgrade")
+        self.assertEqual(0, len(game.game_map[13, 0]))
+        self.assertTrue(game.contains_stationary_unit([12, 10]), "Inner rollback should keep the outer changes")
+        self.assertEqual(24, game.get_resource(game.SP))
+        game.begin()
+        game.game_map.remove_unit([13, 10])
+        game.commit()
+        self.assertFalse(game.contains_stationary_unit([13, 10]))
+        game.rollback()
+        self.assertTrue(game.contains_stationary_unit([13, 10]), "Outer rollback should undo committed inner changes")
+        self.assertFalse(game.contains_stationary_unit([12, 10]))
+        self.assertEqual(25, game.get_resource(game.SP))
+        self.assertEqual(5, game.get_resource(game.MP))
+        self.assertEqual([], game._build_stack)
+        self.assertEqual([], game._deploy_stack)
+        self.assertEqual(layout, game.game_map.blocked_layout())
+
+    def test_zobrist_hash(self):
+        game = self.make_turn_0_map()
+        other = self.make_turn_0_map()
+        empty = game.game_map.zobrist_hash()
+        game.game_map.add_unit("FF", [13, 10], 0)
+        game.game_map.add_unit("DF", [14, 20], 1)
+        other.game_map.add_unit("DF", [14, 20], 1)
+        other.game_map.add_unit("FF", [13, 10], 0)
+        self.assertEqual(game.game_map.zobrist_hash(), other.game_map.zobrist_hash(), "Hash should not depend on the order of edits")
+        other.game_map.add_unit("PI", [13, 0], 0)
+        self.assertEqual(game.game_map.zobrist_hash(), other.game_map.zobrist_hash(), "Mobile units should not change the hash")
+        built = game.game_map.zobrist_hash()
+        game.begin()
+        game.game_map.upgrade_unit([13, 10])
+        self.assertNotEqual(built, game.game_map.zobrist_hash(), "Upgrades should change the hash")
+        game.rollback()
+        self.assertEqual(built, game.game_map.zobrist_hash())
+        game.game_map.remove_unit([13, 10])
+        game.game_map.remove_unit([14, 20])
+        self.assertEqual(empty, game.game_map.zobrist_hash())
+
+    def test_shared_unit_stats(self):
+        game = self.make_turn_0_map()
+        first = GameUnit("DF", game.config, 0, None, 13, 10)
+        second = GameUnit("DF", game.config, 1, 40.0, 14, 20)
+        self.assertIs(first.stats, second.stats, "Units of a type should share their stats")
+        self.assertEqual(90, first.health)
+        self.assertEqual(40, second.health)
+        self.assertFalse(hasattr(first, "__dict__"))
+        first.upgrade()
+        self.assertTrue(first.upgraded)
+        self.assertEqual(3.5, first.attackRange)
+        self.assertEqual(15, first.damage_i)
+        self.assertEqual([6, 0], first.cost)
+        self.assertEqual(2.5, second.attackRange, "Upgrading a unit should not change other units")
+        second.damage_i = 7
+        second.cost = [1, 0]
+        self.assertEqual(7, second.damage_i)
+        self.assertEqual([1, 0], second.cost)
+        self.assertEqual(5, GameUnit("DF", game.config).damage_i, "Changing a unit's stats should not change other units")
+        second.upgrade()
+        self.assertEqual((15, 3.5, [5, 0]), (second.damage_i, second.attackRange, second.cost), "Upgrading should apply to changed stats")
+        copy = json.loads(json.dumps(game.config))
+        self.assertIs(GameUnit("DF", game.config).stats, GameUnit("DF", copy).stats, "Equal configs should share their stats")
+
+    def test_unit_store(self):
+        config = self.make_turn_0_map().config
+        turn = """{"p2Units":[[],[],[[13,20,40.0,"3"]],[],[],[],[],[]],"turnInfo":[0,5,-1],"p1Stats":[30.0,25.0,5.0,0],"p1Units":[[[13,10,75.0,"1"]],[],[[14,10,10.0,"2"]],[[13,0,15.0,"4"]],[],[],[[13,10,0.0,""]],[[14,10,0.0,""]]],"p2Stats":[30.0,25.0,5.0,0],"events":{}}"""
+        eager = GameState(config, turn)
+        game = GameState(config, turn, unit_store=True)
+        store = game.unit_store
+        self.assertEqual(4, len(store))
+        self.assertEqual([[14, 10]], store.locations(store.select("DF", 0, health_below=20)))
+        self.assertEqual([[13, 20]], store.locations(store.select(player_index=1)))
+        self.assertEqual(15, store.damage_at([14, 13], 1), "Upgraded turret should reach 3.5 tiles")
+        self.assertEqual(eager.game_map.blocked_layout(), game.game_map.blocked_layout())
+        self.assertEqual(eager.game_map.zobrist_hash(), game.game_map.zobrist_hash())
+        self.assertTrue(game.game_map[13, 10][0].pending_removal)
+        self.assertTrue(game.game_map[14, 10][0].upgraded)
+        self.assertEqual(10, game.game_map[14, 10][0].health)
+        self.assertEqual(1, len(game.game_map[13, 0]))
+        for location in game.game_map:
+            self.assertEqual([str(unit) for unit in eager.game_map[location]], [str(unit) for unit in game.game_map[location]])
+
+    def test_lazy_parsing(self):
+        config = self.make_turn_0_map().config
+        turn = """{"p2Units":[[],[],[[13,20,40.0,"3"]],[],[],[],[],[]],"turnInfo":[0,5,-1],"p1Stats":[30.0,25.0,5.0,0],"p1Units":[[[13,10,75.0,"1"]],[],[[14,10,10.0,"2"]],[[13,0,15.0,"4"]],[],[],[[13,10,0.0,""]],[[14,10,0.0,""]]],"p2Stats":[28.0,21.0,7.0,0],"events":{}}"""
+        eager = GameState(config, turn)
+        game = GameState(config, turn, lazy=True)
+        self.assertEqual(5, game.turn_number)
+        self.assertEqual(28, game.enemy_health)
+        self.assertEqual(7, game.get_resource(game.MP, 1))
+        player_map = game.player_map(1)
+        self.assertTrue(player_map[13, 20], "Enemy units should be loaded")
+        self.assertFalse(player_map[13, 10], "Own units should wait until they are needed")
+        self.assertTrue(game.contains_stationary_unit([13, 10]))
+        self.assertTrue(game.game_map[14, 10][0].upgraded)
+        self.assertEqual(eager.game_map.zobrist_hash(), game.game_map.zobrist_hash())
+        for location in game.game_map:
+            self.assertEqual([str(unit) for unit in eager.game_map[location]], [str(unit) for unit in game.game_map[location]])
+
+    def test_game_message(self):
+        config = self.make_turn_0_map().config
+        turn = """{"p2Units":[[],[],[],[],[],[],[],[]],"turnInfo":[0,3,-1],"p1Stats":[30.0,25.0,5.0,0],"p1Units":[[[13,10,75.0,"1"]],[],[],[],[],[],[],[]],"p2Stats":[28.0,21.0,7.0,0],"events":{}}"""
+        message = GameMessage(turn)
+        self.assertEqual(turn, message)
+        self.assertFalse(message.decoded)
+        self.assertEqual(3, message.data["turnInfo"][1])
+        self.assertTrue(message.decoded)
+        self.assertIs(message.data, message.data, "The message should only be decoded once")
+        for state in (message, message.data, turn):
+            game = GameState(config, state)
+            self.assertEqual(3, game.turn_number)
+            self.assertTrue(game.contains_stationary_unit([13, 10]))
+        lazy = GameState(config, message, lazy=True)
+        self.assertEqual(28, lazy.enemy_health)
+        self.assertTrue(lazy.contains_stationary_unit([13, 10]))
+
+    def test_frame_events(self):
+        frame = GameMessage("""{"p2Units":[[],[],[],[[13,27,15.0,"9"]],[],[],[],[]],"turnInfo":[1,4,12],"p1Stats":[30.0,25.0,5.0,0],"p1Units":[[],[],[],[],[],[],[],[]],"p2Stats":[28.0,21.0,7.0,0],"events":{"selfDestruct":[],"breach":[],"damage":[],"shield":[],"move":[[[13,27],[13,26],[0,0],3,"9",2]],"spawn":[[[13,27],3,"9",2]],"death":[],"attack":[],"melee":[]}}""")
+        self.assertEqual([1, 4, 12], frame.field("turnInfo"))
+        self.assertTrue(frame.has_events(["breach", "spawn"]))
+        self.assertFalse(frame.has_events(["breach", "death"]))
+        self.assertEqual([], frame.event("breach"))
+        self.assertEqual(3, frame.event("spawn")[0][1])
+        self.assertFalse(frame.decoded, "Reading single events should not decode the whole frame")
+        self.assertEqual(frame.data["events"]["spawn"], frame.event("spawn"))
+        self.assertTrue(frame.has_events(["spawn"]))
+        with self.assertRaises(KeyError):
+            GameMessage('{"events":{}}').event("breach")
+        for decoy in ('"note":"turnInfo breach"', '"note":"[\\"turnInfo\\": 0"'):
+            text = '{"extra":{"turnInfo":[9],"breach":[[1]]},%s,"turnInfo":[1,2,3],"events":{"turnInfo":[[5]],"breach":[]},"breach":[[7]]}' % decoy
+            frame = GameMessage(text)
+            self.assertEqual([1, 2, 3], get_json_field(text, "turnInfo"), "Only top level fields should be found")
+            self.assertEqual([[7]], frame.field("breach"))
+            self.assertEqual([[5]], frame.event("turnInfo"), "Events should not be confused with top level fields")
+            self.assertEqual([1, 2, 3], frame.field("turnInfo"))
+            self.assertFalse(frame.has_events(["breach"]))
+
+    def test_message_reader(self):
+        def frame(turn, breaches):
+            return '{"turnInfo":[1,%d,0],"events":{"breach":%s,"spawn":[]}}' % (turn, json.dumps(breaches))
+        lines = ['{"turnInfo":[0,0,-1]}']
+        lines += [frame(0, [[[13, 27], 1, "3", "9", 1]] if i % 2 else []) for i in range(8)]
+        lines += ['{"turnInfo":[0,1,-1]}', frame(1, [[[14, 27], 1, "3", "10", 1]]), '{"turnInfo":[2,1,-1]}']
+        reader = MessageReader(max_frames=2, frame_events=["breach"], read=iter(lines).__next__)
+        reader.start()
+        reader.thread.join(5)
+        self.assertEqual(len(lines), reader.received)
+        self.assertEqual(4, reader.frames_skipped, "Frames without a breach should be skipped")
+        self.assertEqual(0, reader.frames_dropped)
+        messages = [reader.get() for _ in range(reader.depth)]
+        self.assertEqual([0, 1, 0, 1, 2], [message.field("turnInfo")[0] for message in messages])
+        self.assertEqual(4, len(messages[1].event("breach")), "Coalesced frames should keep every breach")
+        self.assertEqual(1, len(messages[3].event("breach")))
+        self.assertEqual(3, reader.frames_coalesced)
+
+        reader = MessageReader(read=iter(['{"turnInfo":[0,0,-1]}', '{"turnInfo":[1,0']).__next__)
+        reader.start()
+        self.assertEqual(0, reader.get().field("turnInfo")[0], "Messages read before an error should still be handed out")
+        with self.assertRaises(KeyError, msg="A truncated message should raise on the main thread"):
+            reader.get()
+        def fail(message):
+            raise ValueError("precompute failed")
+        reader = MessageReader(read=iter([frame(0, [])]).__next__, on_frame=fail)
+        reader.start()
+        with self.assertRaises(ValueError, msg="Errors on the reader thread should be raised by get"):
+            reader.get()
+
+    def test_precompute(self):
+        config = self.make_turn_0_map().config
+        frame = '{"p2Units":[[],[],[],[],[],[],[],[]],"turnInfo":[1,0,5],"p1Stats":[30.0,25.0,5.0,0],"p1Units":[[[13,10,75.0,"1"]],[],[],[],[],[],[],[]],"p2Stats":[28.0,21.0,7.0,0],"events":{"breach":[],"spawn":[]}}'
+        turn = frame.replace("[1,0,5]", "[0,1,-1]").replace('[[13,10,75.0,"1"]]', '[[13,10,75.0,"1"],[12,10,75.0,"2"]]')
+
+        class PrecomputeAlgo(AlgoCore):
+            def __init__(self):
+                super().__init__()
+                self.precompute_wait = 5
+                self.turns = []
+
+            def precompute(self, frame):
+                return GameState(config, frame).distance_field([13, 27])
+
+            def on_turn(self, turn):
+                game_state = GameState(config, turn)
+                self.turns.append(game_state.reuse_distance_field(self.precomputed))
+                self.turns.append(game_state.find_path_to_edge([13, 27]) == GameState(config, turn).find_path_to_edge([13, 27]))
+
+        algo = PrecomputeAlgo()
+        stdin = sys.stdin
+        sys.stdin = io.StringIO("\n".join([frame, turn, '{"turnInfo":[2,1,-1]}']) + "\n")
+        try:
+            with redirect_stderr(io.StringIO()):
+                algo.start()
+        finally:
+            sys.stdin = stdin
+        self.assertEqual([True, True], algo.turns)
+        self.assertIsNone(algo.precomputed)
+
+        class SlowAlgo(AlgoCore):
+            def __init__(self):
+                super().__init__()
+                self.started = threading.Event()
+                self.stopped = threading.Event()
+                self.turns = []
+
+            def precompute(self, frame):
+                self.started.set()
+                while not self.precompute_stopped():
+                    time.sleep(0.001)
+                self.stopped.set()
+                return "late"
+
+            def on_turn(self, turn):
+                self.turns.append(self.precomputed)
+
+        class WaitingInput:
+            def __init__(self, lines, algo):
+                self.lines = lines
+                self.algo = algo
+
+            def readline(self):
+                if len(self.lines) == 2:
+                    self.algo.started.wait(5)
+                return self.lines.pop(0) + "\n" if self.lines else ""
+
+        algo = SlowAlgo()
+        sys.stdin = WaitingInput([frame, turn, '{"turnInfo":[2,1,-1]}'], algo)
+        try:
+            with redirect_stderr(io.StringIO()):
+                algo.start()
+        finally:
+            sys.stdin = stdin
+        self.assertTrue(algo.stopped.wait(5), "A precompute still running at the turn should see precompute_stopped")
+        self.assertEqual([None], algo.turns, "A precompute that did not finish in time should be discarded")
+
+    def test_game_end(self):
+        class EndingAlgo(AlgoCore):
+            def __init__(self):
+                super().__init__()
+                self.ended = 0
+
+            def on_game_end(self):
+                self.ended += 1
+
+        stdin = sys.stdin
+        try:
+            with redirect_stderr(io.StringIO()):
+                algo = EndingAlgo()
+                sys.stdin = io.StringIO('{"turnInfo":[2,1,-1]}\n')
+                algo.start()
+                self.assertEqual(1, algo.ended, "on_game_end should be called at the end state")
+                algo = EndingAlgo()
+                sys.stdin = io.StringIO("")
+                with self.assertRaises(SystemExit):
+                    algo.start()
+                self.assertEqual(1, algo.ended, "on_game_end should be called when the engine's output ends")
+        finally:
+            sys.stdin = stdin
+
+    def test_turn_budget(self):
+        now = [10.0]
+        budget = TurnBudget(limit=5, margin=1, clock=lambda: now[0])
+        with budget.phase("defence"):
+            now[0] += 1.5
+        with budget.phase("defence"):
+            now[0] += 0.5
+        self.assertAlmostEqual(2, budget.phases["defence"])
+        self.assertAlmostEqual(2, budget.remaining())
+        self.assertFalse(budget.expired())
+
+        def evaluate(plan):
+            now[0] += 1
+            return plan
+        self.assertEqual(2, budget.best_of([1, 2, 0, 5], evaluate), "Only the candidates evaluated before the budget expired count")
+        self.assertTrue(budget.expired())
+        self.assertEqual("fallback", budget.best_of([1], evaluate, fallback="fallback"))
+        self.assertTrue(budget.offer([[13, 0]], 3))
+        self.assertFalse(budget.offer([[14, 0]], 2))
+        self.assertEqual([[13, 0]], budget.best)
+
+        game = GameState(self.make_turn_0_map().config, GameMessage(self.make_turn_0_map().serialized_string))
+        self.assertEqual(5, game.budget.limit)
+        self.assertIs(game.budget, game.budget)
+        self.assertLess(game.budget.elapsed(), game.budget.limit)
+
+    def test_targeting_engine(self):
+        game = self.make_turn_0_map()
+        game.game_map.add_unit("DF", [13, 13], 0)
+        game.game_map.add_unit("FF", [12, 14], 1)
+        game.game_map.add_unit("FF", [14, 14], 1)
+        game.game_map.add_unit("PI", [13, 15], 1)
+        game.game_map.add_unit("DF", [13, 16], 1)
+        game.game_map.add_unit("PI", [13, 12], 0)
+        engine = game.get_targeting_engine()
+        attackers = [unit for location in game.game_map for unit in game.game_map[location]]
+        targets = engine.targets(attackers)
+        for attacker, target in zip(attackers, targets):
+            self.assertIs(game.get_target(attacker), target)
+        turret = game.game_map[13, 13][0]
+        self.assertEqual("PI", engine.get_target(turret).unit_type, "Mobile units should be targeted first")
+        interceptor = game.game_map[13, 12][0]
+        engine.remove(game.game_map[13, 15][0])
+        self.assertIsNone(engine.get_target(turret), "Turrets in this config only hit mobile units")
+        target = engine.get_target(interceptor)
+        self.assertEqual([12, 14], [target.x, target.y], "Between equally near walls, the one closer to the edge should be targeted")
+        engine.move(game.game_map[12, 14][0], [14, 15])
+        target = engine.get_target(interceptor)
+        self.assertEqual([14, 14], [target.x, target.y])
+
+    def test_combat_simulator(self):
+        game = self.make_turn_0_map()
+        path = game.find_path_to_edge([13, 0])
+        result = game.get_combat_simulator(record_frames=True).simulate([["PI", [13, 0], 3]])
+        self.assertEqual([3, 0], result.breaches)
+        self.assertEqual([3.0, 0], result.breach_damage)
+        self.assertEqual(len(path), result.frame_count, "Units should breach on the move after reaching the edge")
+        self.assertEqual(path[1:], [frame["units"][0][2:4] for frame in result.frames[:-1]])
+
+        game.game_map.add_unit("DF", [25, 15], 1)
+        game.attempt_spawn("PI", [13, 0], 5)
+        simulator = game.get_combat_simulator()
+        result = simulator.simulate(None, [["PI", [14, 27], 2]])
+        self.assertEqual([4, 2], result.breaches, "The turret should kill one of the units spawned with attempt_spawn")
+        self.assertEqual(20.0, result.damage_dealt[1], "The turret should fire on every frame a unit is in range")
+        result = simulator.simulate([["EI", [13, 0], 2]])
+        self.assertEqual([[25, 15]], result.structures_destroyed[0])
+        self.assertEqual(90.0, game.game_map[25, 15][0].health, "Simulating should not change the game state")
+
+        for x in range(10, 18):
+            game.game_map.add_unit("FF", [x, 3], 0)
+        result = simulator.simulate([["PI", [13, 0], 2]])
+        self.assertEqual([0, 0], result.self_destructs, "The simulator should keep the structures it was created with")
+        result = game.get_combat_simulator().simulate([["PI", [13, 0], 2]])
+        self.assertEqual([0, 0], result.breaches)
+        self.assertEqual([2, 0], result.self_destructs)
+
+    def assert_batch_agrees(self, simulator, scenarios, enemy_deploys):
+        expected = [simulator.simulate(deploys, enemy_deploys) for deploys in scenarios]
+        for batch in (simulator.simulate_batch(scenarios, enemy_deploys), simulator.simulate_batch(scenarios, enemy_deploys)):
+            self.assertEqual(len(scenarios), len(batch))
+            for scenario, result, batch_result in zip(scenarios, expected, batch):
+                message = "Batch and single simulations should agree for {}".format(scenario)
+                for field in ("frame_count", "breaches", "breach_damage", "structures_destroyed", "self_destructs", "survivors"):
+                    self.assertEqual(getattr(result, field), getattr(batch_result, field), message)
+                for damage, batch_damage in zip(result.damage_dealt, batch_result.damage_dealt):
+                    self.assertAlmostEqual(damage, batch_damage, msg=message)
+        return expected
+
+    def test_combat_simulator_batch(self):
+        game = self.make_turn_0_map()
+        game.game_map.add_unit("DF", [25, 15], 1)
+        game.game_map.add_unit("DF", [3, 14], 1)
+        game.game_map.add_unit("FF", [12, 14], 1)
+        game.game_map.add_unit("EF", [14, 16], 1)
+        game.game_map.add_unit("DF", [20, 9], 0)
+        scenarios = [[[unit_type, location, num]] for unit_type in ("PI", "EI", "SI") for location in ([13, 0], [3, 10], [24, 10]) for num in (1, 4)]
+        scenarios += [[["EI", [13, 0], 2], ["PI", [24, 10], 5]], []]
+        enemy_deploys = [["PI", [14, 27], 3], ["SI", [5, 18], 1]]
+        self.assert_batch_agrees(game.get_combat_simulator(), scenarios, enemy_deploys)
+
+    def test_combat_simulator_batch_structures(self):
+        game = self.make_turn_0_map()
+        config = json.loads(json.dumps(game.config))
+        for type_config in config["unitInformation"]:
+            if type_config.get("shorthand") == "DF":
+                type_config["attackDamageTower"] = 4
+        game = GameState(config, game.serialize_board())
+        game.game_map.add_unit("DF", [13, 13], 0)
+        game.game_map.add_unit("DF", [4, 12], 0)
+        game.game_map.add_unit("FF", [13, 14], 1)
+        game.game_map.add_unit("FF", [12, 14], 1)
+        game.game_map.add_unit("DF", [5, 14], 1)
+        game.game_map.add_unit("DF", [22, 14], 1)
+        scenarios = [[[unit_type, location, num]] for unit_type in ("PI", "EI", "SI") for location in ([13, 0], [3, 10], [24, 10]) for num in (1, 4)]
+        scenarios += [[["EI", [13, 0], 2], ["PI", [24, 10], 5]]]
+        expected = self.assert_batch_agrees(game.get_combat_simulator(), scenarios, None)
+        self.assertTrue(all(result.damage_dealt[1] > 0 for result in expected), "Turrets should attack the structures in their range")
+
+    def test_parallel_evaluator(self):
+        game = self.make_turn_0_map()
+        game.game_map.add_unit("DF", [25, 15], 1)
+        game.game_map.add_unit("FF", [12, 14], 1)
+        game.game_map.upgrade_unit([12, 14])
+        game.attempt_spawn("FF", [13, 3])
+        game.game_map[13, 3][0].pending_removal = True
+        copy = GameState(game.config, game.serialize_board())
+        self.assertEqual(str(game.game_map[12, 14]), str(copy.game_map[12, 14]), "Upgraded structures should keep their health")
+        self.assertTrue(copy.game_map[13, 3][0].pending_removal)
+        self.assertEqual(game.get_resources(0), copy.get_resources(0))
+
+        plans = [[["PI", [13, 0], 3]], [["EI", [24, 10], 2]], []]
+        self.assertEqual(MAX_PROCESSES, ParallelEvaluator(game.config, processes=64).processes, "The number of workers should be capped")
+        evaluator = ParallelEvaluator(game.config, processes=0)
+        evaluator.start()
+        self.assertFalse(evaluator.running)
+        expected = evaluator.evaluate(game, plans, attack_score, timeout=5)
+        result = game.get_combat_simulator().simulate(plans[0])
+        self.assertEqual((result.breach_damage[0], result.damage_dealt[0]), expected[0])
+        self.assertEqual((0, 0), expected[2], "An empty attack should score nothing")
+        def build_and_score(game_state, location):
+            game_state.attempt_spawn("FF", location)
+            return len(game_state.game_map[location])
+        self.assertEqual([1, 1], evaluator.evaluate(game, [[5, 10], [22, 10]], build_and_score, timeout=5))
+        self.assertEqual([], game.game_map[5, 10], "Scoring should not change the game state")
+        self.assertEqual([None, None], evaluator.evaluate(game, plans[:2], attack_score, timeout=0), "Nothing should be scored after the deadline")
+        game.begin()
+        game.suppress_warnings(True)
+        game.game_map.add_unit("FF", [13, 0], 0)
+        self.assertEqual(-math.inf, path_damage_score(game, [13, 0]), "A blocked location should score worst")
+        self.assertEqual([14, 0], evaluator.best(game, [[13, 0], [14, 0]], path_damage_score, timeout=5))
+        game.rollback()
+
+        evaluator = ParallelEvaluator(game.config, processes=1, chunk_size=2)
+        evaluator.start()
+        try:
+            self.assertTrue(evaluator.running)
+            self.assertEqual(expected, evaluator.evaluate(game, plans, attack_score, timeout=30), "Workers should score like this process")
+            self.assertEqual([14, 0], evaluator.best(game, [[13, 0], [14, 0]], path_damage_score, timeout=30), "The path away from the turret is safer")
+        finally:
+            evaluator.shutdown()
+        self.assertFalse(evaluator.running)
+
+    def assert_threat_map(self, game):
+        for player_index in [0, 1]:
+            counts = game.game_map.attacker_counts(player_index)
+            damage = game.game_map.threat_damage(player_index)
+            for location in game.game_map:
+                attackers = game.get_attackers(location, player_index)
+                index = location[0] * game.ARENA_SIZE + location[1]
+                self.assertEqual(len(attackers), counts[index], "Wrong attacker count at {} for player {}".format(location, player_index))
+                self.assertAlmostEqual(sum(unit.damage_i for unit in attackers), damage[index])
+
+    def test_threat_map(self):
+        game = self.make_turn_0_map()
+        game.suppress_warnings(True)
+        game.game_map.add_unit("DF", [13, 10], 0)
+        game.game_map.add_unit("DF", [14, 17], 1)
+        game.game_map.add_unit("FF", [12, 11], 0)
+        game.game_map.upgrade_unit([13, 10])
+        self.assert_threat_map(game)
+
+        game.game_map.add_unit("DF", [10, 14], 1)
+        game.game_map.add_unit("EF", [15, 13], 1)
+        game.game_map.remove_unit([13, 10])
+        game.game_map.upgrade_unit([14, 17])
+        self.assert_threat_map(game)
+
+        fork = game.fork()
+        before = list(game.game_map.attacker_counts(0))
+        fork.game_map.add_unit("DF", [13, 15], 1)
+        fork.game_map.remove_unit([10, 14])
+        self.assert_threat_map(fork)
+        self.assertEqual(before, list(game.game_map.attacker_counts(0)), "Editing a fork should not change the original's threat map")
+        self.assert_threat_map(game)
+
+        game.begin()
+        game.game_map.add_unit("DF", [16, 16], 1)
+        game.game_map.add_unit("DF", [11, 11], 0)
+        game.game_map.upgrade_unit([10, 14])
+        self.assert_threat_map(game)
+        game.rollback()
+        self.assertEqual(before, list(game.game_map.attacker_counts(0)))
+        self.assert_threat_map(game)
+
+        path = [[13, 13], [13, 14], [14, 14], [14, 15]]
+        attackers = [game.get_attackers(location, 0) for location in path]
+        self.assertEqual(sum(len(units) for units in attackers), game.path_attackers(path, 0))
+        self.assertAlmostEqual(sum(unit.damage_i for units in attackers for unit in units), game.path_damage(path, 0))
+
     def test_print_unit(self):
         game = self.make_turn_0_map()
 
@@ -1,3 +1,6 @@
+import json
+from collections import namedtuple
+
 def is_stationary(unit_type, structure_types):
     """
         Args:
@@ -9,6 +12,89 @@ def is_stationary(unit_type, structure_types):
     return unit_type in structure_types
 
 
+UnitStats = namedtuple("UnitStats", ["unit_type", "upgraded", "stationary", "speed", "damage_f", "damage_i",
+                                     "attackRange", "shieldRange", "max_health", "shieldPerUnit", "cost"])
+UnitStats.__doc__ = """The fixed stats of a unit type, shared by every GameUnit of that type and upgrade state"""
+
+#Stats by the JSON of a config's unit information, so equal configs share them and no config is kept alive
+_STATS = {}
+#The last config looked up and its stats, so the JSON is only built when the config changes
+_LAST_STATS = (None, None)
+
+def unit_stats(config, unit_type, upgraded=False):
+    """Gets the shared stats of a unit type
+
+    Args:
+        config: The game config holding the unit information
+        unit_type: The type of the unit
+        upgraded: If the stats should be those of an upgraded unit
+
+    Returns:
+        The UnitStats of that type, built once per distinct unit information
+
+    """
+    global _LAST_STATS
+    last_config, config_stats = _LAST_STATS
+    if last_config is not config:
+        key = json.dumps(config["unitInformation"], sort_keys=True)
+        config_stats = _STATS.get(key)
+        if config_stats is None:
+            config_stats = _build_stats(config)
+            _STATS[key] = config_stats
+        _LAST_STATS = (config, config_stats)
+    return config_stats[unit_type, upgraded]
+
+def _type_config(config, unit_type):
+    for type_config in config["unitInformation"]:
+        if type_config.get("shorthand") == unit_type:
+            return type_config
+    return {}
+
+def _apply_upgrade(stats, upgrade):
+    """
+    The stats after an upgrade, the config's upgrade section replaces stats and adds to the cost.
+    """
+    return stats._replace(
+        upgraded=True,
+        speed=upgrade.get("speed", stats.speed),
+        damage_f=upgrade.get("attackDamageTower", stats.damage_f),
+        damage_i=upgrade.get("attackDamageWalker", stats.damage_i),
+        attackRange=upgrade.get("attackRange", stats.attackRange),
+        shieldRange=upgrade.get("shieldRange", stats.shieldRange),
+        max_health=upgrade.get("startHealth", stats.max_health),
+        shieldPerUnit=upgrade.get("shieldPerUnit", stats.shieldPerUnit),
+        cost=(upgrade.get("cost1", 0) + stats.cost[0], upgrade.get("cost2", 0) + stats.cost[1]))
+
+def _build_stats(config):
+    stats = {}
+    for type_config in config["unitInformation"]:
+        if "unitCategory" not in type_config:
+            continue
+        unit_type = type_config["shorthand"]
+        base = UnitStats(
+            unit_type, False,
+            type_config["unitCategory"] == 0,
+            type_config.get("speed", 0),
+            type_config.get("attackDamageTower", 0),
+            type_config.get("attackDamageWalker", 0),
+            type_config.get("attackRange", 0),
+            type_config.get("shieldRange", 0),
+            type_config.get("startHealth", 0),
+            type_config.get("shieldPerUnit", 0),
+            (type_config.get("cost1", 0), type_config.get("cost2", 0)))
+        stats[unit_type, False] = base
+        stats[unit_type, True] = _apply_upgrade(base, type_config.get("upgrade", {}))
+    return stats
+
+def _stat(name, to_stat=None):
+    """
+    A GameUnit attribute read from its UnitStats. Assigning to it gives the unit its own copy of the stats.
+    """
+    def set_stat(self, value):
+        self.stats = self.stats._replace(**{name: to_stat(value) if to_stat else value})
+    return property(lambda self: getattr(self.stats, name), set_stat)
+
+
 class GameUnit:
     """Holds information about a Unit. 
 
@@ -31,48 +117,42 @@ class GameUnit:
         * pending_removal (boolean): If this unit is marked for removal by its owner
         * upgraded (boolean): If this unit is upgraded
 
+    The stats that come from the config are shared between units through a UnitStats record, see unit_stats().
+    Only health, location, owner and pending_removal are stored per unit. Assigning to a stat gives the unit its own record.
+
     """
+    __slots__ = ("stats", "config", "player_index", "pending_removal", "x", "y", "health")
+
     def __init__(self, unit_type, config, player_index=None, health=None, x=-1, y=-1):
         """ Initialize unit variables using args passed
 
         """
-        self.unit_type = unit_type
+        self.stats = unit_stats(config, unit_type)
         self.config = config
         self.player_index = player_index
         self.pending_removal = False
-        self.upgraded = False
         self.x = x
         self.y = y
-        self.__serialize_type()
-        self.health = self.max_health if not health else health
-
-    def __serialize_type(self):
-        from .game_state import STRUCTURE_TYPES, UNIT_TYPE_TO_INDEX, SUPPORT
-        type_config = self.config["unitInformation"][UNIT_TYPE_TO_INDEX[self.unit_type]]
-        self.stationary = type_config["unitCategory"] == 0
-        self.speed = type_config.get("speed", 0)
-        self.damage_f = type_config.get("attackDamageTower", 0)
-        self.damage_i = type_config.get("attackDamageWalker", 0)
-        self.attackRange = type_config.get("attackRange", 0)
-        self.shieldRange = type_config.get("shieldRange", 0)
-        self.max_health = type_config.get("startHealth", 0)
-        self.shieldPerUnit = type_config.get("shieldPerUnit", 0)
-        self.cost = [type_config.get("cost1", 0), type_config.get("cost2", 0)]
+        self.health = self.stats.max_health if not health else health
 
+    unit_type = _stat("unit_type")
+    upgraded = _stat("upgraded")
+    stationary = _stat("stationary")
+    speed = _stat("speed")
+    damage_f = _stat("damage_f")
+    damage_i = _stat("damage_i")
+    attackRange = _stat("attackRange")
+    shieldRange = _stat("shieldRange")
+    max_health = _stat("max_health")
+    shieldPerUnit = _stat("shieldPerUnit")
+    cost = property(lambda self: list(self.stats.cost), _stat("cost", tuple).fset)
 
     def upgrade(self):
-        from .game_state import UNIT_TYPE_TO_INDEX
-        type_config = self.config["unitInformation"][UNIT_TYPE_TO_INDEX[self.unit_type]].get("upgrade", {})
-        self.speed = type_config.get("speed", self.speed)
-        self.damage_f = type_config.get("attackDamageTower", self.damage_f)
-        self.damage_i = type_config.get("attackDamageWalker", self.damage_i)
-        self.attackRange = type_config.get("attackRange", self.attackRange)
-        self.shieldRange = type_config.get("shieldRange", self.shieldRange)
-        self.max_health = type_config.get("startHealth", self.max_health)
-        self.shieldPerUnit = type_config.get("shieldPerUnit", self.shieldPerUnit)
-        self.cost = [type_config.get("cost1", 0) + self.cost[0], type_config.get("cost2", 0) + self.cost[1]]
-        self.upgraded = True
-
+        if self.stats is unit_stats(self.config, self.unit_type):
+            self.stats = unit_stats(self.config, self.unit_type, True)
+        elif not self.upgraded:
+            #Stats assigned on this unit are kept unless the upgrade replaces them
+            self.stats = _apply_upgrade(self.stats, _type_config(self.config, self.unit_type).get("upgrade", {}))
 
     def __toString(self):
         owner = "Friendly" if self.player_index == 0 else "Enemy"
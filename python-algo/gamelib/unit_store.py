@@ -0,0 +1,171 @@
+import math
+from array import array
+from .unit import GameUnit, unit_stats
+
+
+class UnitStore:
+    """Holds the units parsed at the start of a turn in parallel arrays, one entry per unit.
+    Board wide questions like "enemy turrets below 20 health" become scans over flat arrays
+    instead of walks over the GameMap and its GameUnit objects.
+
+    The store is a snapshot of the turn as it was parsed. Later edits of the GameMap are not reflected in it.
+
+    Attributes :
+        * config (JSON): Contains information about the game
+        * unit_types (list): The unit type of every type index, in config order
+        * x (array): The x coordinate of every unit
+        * y (array): The y coordinate of every unit
+        * type_index (array): The type index of every unit, see unit_types
+        * player_index (array): The player controlling every unit, 0 for you 1 for your opponent
+        * health (array): The parsed health of every unit
+        * max_health (array): The starting health of every unit, taking upgrades into account
+        * upgraded (bytearray): 1 for every upgraded unit
+        * pending_removal (bytearray): 1 for every unit marked for removal by its owner
+
+    """
+    def __init__(self, config):
+        """Creates an empty store
+
+        Args:
+            config (JSON): Contains information about the game
+
+        """
+        self.config = config
+        self.unit_types = [type_config.get("shorthand") for type_config in config["unitInformation"]]
+        self.__type_stats = [(unit_stats(config, type_config["shorthand"]), unit_stats(config, type_config["shorthand"], True))
+                             if "unitCategory" in type_config else None for type_config in config["unitInformation"]]
+        self.x = array('b')
+        self.y = array('b')
+        self.type_index = array('b')
+        self.player_index = array('b')
+        self.health = array('d')
+        self.max_health = array('d')
+        self.upgraded = bytearray()
+        self.pending_removal = bytearray()
+        self.__first_unit = {}
+        self.__structure = {}
+
+    def __len__(self):
+        return len(self.x)
+
+    def add(self, type_index, player_index, x, y, health):
+        """Adds a unit, as parsed from the turn
+
+        Args:
+            type_index: The index of the unit's type in the config
+            player_index: The player controlling the unit
+            x: The x coordinate of the unit
+            y: The y coordinate of the unit
+            health: The parsed health of the unit, its starting health if 0
+
+        Returns:
+            The index of the new unit in the store
+
+        """
+        stats = self.__type_stats[type_index][0]
+        index = len(self.x)
+        self.x.append(x)
+        self.y.append(y)
+        self.type_index.append(type_index)
+        self.player_index.append(player_index)
+        self.health.append(health if health else stats.max_health)
+        self.max_health.append(stats.max_health)
+        self.upgraded.append(0)
+        self.pending_removal.append(0)
+        self.__first_unit.setdefault((x, y), index)
+        if stats.stationary:
+            self.__structure[x, y] = index
+        return index
+
+    def mark_removal(self, x, y):
+        """Flags the first unit at a location as pending removal, if the location holds a structure
+        """
+        if (x, y) in self.__structure:
+            self.pending_removal[self.__first_unit[x, y]] = 1
+
+    def mark_upgrade(self, x, y):
+        """Upgrades the structure at a location, if there is one
+        """
+        index = self.__structure.get((x, y))
+        if index is not None:
+            self.upgraded[index] = 1
+            self.max_health[index] = self.__type_stats[self.type_index[index]][1].max_health
+
+    def stats(self, index):
+        """Gets the UnitStats of a unit in the store
+        """
+        return self.__type_stats[self.type_index[index]][self.upgraded[index]]
+
+    def make_unit(self, index):
+        """Creates the GameUnit for a unit in the store
+
+        Args:
+            index: The index of the unit in the store
+
+        Returns:
+            A new GameUnit with the unit's type, owner, location, health and flags
+
+        """
+        unit = GameUnit(self.unit_types[self.type_index[index]], self.config, self.player_index[index], self.health[index], self.x[index], self.y[index])
+        if self.upgraded[index]:
+            unit.upgrade()
+        unit.pending_removal = bool(self.pending_removal[index])
+        return unit
+
+    def select(self, unit_type=None, player_index=None, health_below=None):
+        """Finds the units matching every given filter
+
+        Args:
+            unit_type: Only units of this type
+            player_index: Only units of this player, 0 for you 1 for your opponent
+            health_below: Only units with less health than this
+
+        Returns:
+            The indices of the matching units, in parse order
+
+        """
+        type_index = None if unit_type is None else self.unit_types.index(unit_type)
+        indices = []
+        for index in range(len(self.x)):
+            if type_index is not None and self.type_index[index] != type_index:
+                continue
+            if player_index is not None and self.player_index[index] != player_index:
+                continue
+            if health_below is not None and not self.health[index] < health_below:
+                continue
+            indices.append(index)
+        return indices
+
+    def locations(self, indices):
+        """Gets the locations of units in the store
+
+        Args:
+            indices: The indices of the units
+
+        Returns:
+            A list of [x, y] locations, one per index
+
+        """
+        return [[self.x[index], self.y[index]] for index in indices]
+
+    def damage_at(self, location, player_index):
+        """Sums the damage a mobile unit would take each frame at a location, from the units that would attack it.
+        The attackers are the same as GameState.get_attackers.
+
+        Args:
+            location: The location of a hypothetical defender
+            player_index: The player controlling the defender, 0 for you 1 for your opponent
+
+        Returns:
+            The total damage per frame the attackers deal to mobile units
+
+        """
+        x, y = location
+        damage = 0
+        for index in range(len(self.x)):
+            if self.player_index[index] == player_index:
+                continue
+            stats = self.stats(index)
+            if stats.damage_i + stats.damage_f > 0 and math.sqrt((self.x[index] - x)**2 + (self.y[index] - y)**2) <= stats.attackRange:
+                damage += stats.damage_i
+        return damage
@@ -1,4 +1,7 @@
+import json
+import re
 import sys
+import time
 
 
 BANNER_TEXT = "---------------- Starting Your Algo --------------------"
@@ -21,6 +24,277 @@ def get_command():
         exit()
     return ret
 
+def get_json_field(serialized_string, key, start=0):
+    """Decodes one field of a JSON object without decoding the rest of the string
+
+    Args:
+        serialized_string: A JSON object as a string
+        key: The name of the field
+        start: Where the object holding the field starts, the top level object by default
+
+    Returns:
+        The decoded value of the field. Raises a KeyError if the object has no such field
+
+    """
+    value, _ = _DECODER.raw_decode(serialized_string, _json_value_index(serialized_string, key, start))
+    return value
+
+#A string or a bracket, the tokens that decide how deep a position of a JSON string is
+_JSON_TOKEN = re.compile(r'"(?:[^"\\]|\\.)*"|[{}\[\]]')
+
+def _json_value_index(serialized_string, key, start=0, plain=None):
+    """
+    Finds where the value of a field of the object starting at start begins. Fields of nested objects and strings
+    that only look like the field are skipped. Raises a KeyError if the object has no such field.
+    plain is the result of _plain_strings for the string, worked out here if None.
+    """
+    start = serialized_string.index("{", start)
+    if plain is None:
+        plain = _plain_strings(serialized_string)
+    if plain:
+        index = _plain_value_index(serialized_string, key, start)
+    else:
+        index = _scanned_value_index(serialized_string, key, start)
+    if index is None:
+        raise KeyError(key)
+    return index
+
+#Every byte but quotes and brackets, deleted to leave the skeleton of a JSON string
+_NOT_STRUCTURE = bytes(byte for byte in range(256) if byte not in b'"{}[]')
+
+def _plain_strings(serialized_string):
+    """
+    Checks that no string of a JSON string holds an escape or a bracket, so quotes and brackets can simply be counted.
+    In the skeleton of quotes and brackets, every string is then an empty pair of quotes.
+    """
+    if "\\" in serialized_string:
+        return False
+    skeleton = serialized_string.encode().translate(None, _NOT_STRUCTURE)
+    return b'"' not in skeleton.replace(b'""', b"")
+
+def _plain_value_index(serialized_string, key, start):
+    """
+    _json_value_index for strings without escapes or brackets in their strings. Each match of the field's name is checked
+    by counting the quotes and brackets between it and the nearer end of the object, so the lists in between are never stepped through.
+    """
+    find = serialized_string.find
+    count = serialized_string.count
+    #Lists cannot hold unbalanced braces, so only braces are followed to find where the object ends
+    depth = 1
+    index = start + 1
+    next_open = find("{", index)
+    while True:
+        close = find("}", index)
+        if close == -1:
+            return None
+        if next_open != -1 and next_open < close:
+            depth += 1
+            index = next_open + 1
+            next_open = find("{", index)
+        else:
+            depth -= 1
+            index = close + 1
+            if depth == 0:
+                end = close
+                break
+    quoted = json.dumps(key)
+    index = find(quoted, start, end)
+    while index != -1:
+        if index - start < end - index:
+            outside_string = count('"', start, index) % 2 == 0
+            nested = count("{", start, index) + count("[", start, index) - count("}", start, index) - count("]", start, index)
+        else:
+            outside_string = count('"', index, end) % 2 == 0
+            nested = 1 + count("}", index, end) + count("]", index, end) - count("{", index, end) - count("[", index, end)
+        if outside_string and nested == 1:
+            value = _after_colon(serialized_string, index + len(quoted))
+            if value is not None:
+                return value
+        index = find(quoted, index + 1, end)
+    return None
+
+def _scanned_value_index(serialized_string, key, start):
+    """
+    _json_value_index for any JSON string, stepping through its strings and brackets.
+    """
+    quoted = json.dumps(key)
+    depth = 0
+    for token in _JSON_TOKEN.finditer(serialized_string, start):
+        text = token.group()
+        if text == "{" or text == "[":
+            depth += 1
+        elif text == "}" or text == "]":
+            depth -= 1
+            if depth == 0:
+                break
+        elif depth == 1 and text == quoted:
+            value = _after_colon(serialized_string, token.end())
+            if value is not None:
+                return value
+    return None
+
+def _after_colon(serialized_string, index):
+    """
+    Where the value starts after a field name ending at index, None if no colon follows so the name was a value.
+    """
+    while serialized_string[index:index + 1].isspace():
+        index += 1
+    if serialized_string[index:index + 1] != ":":
+        return None
+    index += 1
+    while serialized_string[index:index + 1].isspace():
+        index += 1
+    return index
+
+def _json_list_is_empty(serialized_string, key, start=0, plain=None):
+    """
+    Checks if a field of the object starting at start is an empty list, without decoding it.
+    """
+    index = _json_value_index(serialized_string, key, start, plain)
+    if serialized_string[index:index + 1] != "[":
+        return False
+    index += 1
+    while serialized_string[index:index + 1].isspace():
+        index += 1
+    return serialized_string[index:index + 1] == "]"
+
+_DECODER = json.JSONDecoder()
+
+class GameMessage(str):
+    """A message from the game engine. It is the raw string, so it can be used anywhere a string was,
+    and it keeps its decoded JSON so the message is only decoded once however many handlers read it.
+
+    Single fields and event lists can also be read on their own with field and event,
+    which decode only that part of the message until something asks for all of it.
+
+    Attributes :
+        * data (dict): The decoded message. Decoded on first use
+        * decoded (bool): True once the message has been decoded
+        * received (float): The time.perf_counter time the message was read, turn budgets are timed from it
+
+    """
+    def __new__(cls, value):
+        message = super().__new__(cls, value)
+        message.received = time.perf_counter()
+        return message
+
+    @property
+    def data(self):
+        if "_data" not in self.__dict__:
+            self._data = json.loads(self)
+        return self._data
+
+    @property
+    def decoded(self):
+        return "_data" in self.__dict__
+
+    def field(self, key):
+        """Gets one top level field of the message, like "turnInfo" or "p1Stats"
+
+        Args:
+            key: The name of the field
+
+        Returns:
+            The decoded field. Only the field is decoded unless the whole message already was
+
+        """
+        if self.decoded:
+            return self._data[key]
+        fields = self.__dict__.setdefault("_fields", {})
+        if key not in fields:
+            fields[key] = _DECODER.raw_decode(self, _json_value_index(self, key, 0, self.__plain()))[0]
+        return fields[key]
+
+    def event(self, event_type):
+        """Gets the events of one type in an action frame, like "breach" or "spawn"
+
+        Args:
+            event_type: The name of the event list in the frame's events
+
+        Returns:
+            The decoded list of events. Only that list is decoded unless the whole message already was
+
+        """
+        carried = self.__dict__.get("_carried_events")
+        if carried is not None and event_type in carried:
+            return carried[event_type]
+        if self.decoded:
+            return self._data["events"][event_type]
+        events = self.__dict__.setdefault("_events", {})
+        if event_type not in events:
+            events[event_type] = _DECODER.raw_decode(self, _json_value_index(self, event_type, self.__events_start(), self.__plain()))[0]
+        return events[event_type]
+
+    def __plain(self):
+        """
+        _plain_strings for the message, worked out once.
+        """
+        if "_plain" not in self.__dict__:
+            self._plain = _plain_strings(self)
+        return self._plain
+
+    def __events_start(self):
+        """
+        Where the frame's events object starts, found once per message.
+        """
+        if "_events_start" not in self.__dict__:
+            self._events_start = _json_value_index(self, "events", 0, self.__plain())
+        return self._events_start
+
+    def has_events(self, event_types):
+        """Checks if an action frame holds any event of the given types, without decoding it
+
+        Args:
+            event_types: The names of the event lists to check
+
+        Returns:
+            True if any of the lists is not empty
+
+        """
+        carried = self.__dict__.get("_carried_events", {})
+        if any(carried.get(event_type) for event_type in event_types):
+            return True
+        if self.decoded:
+            events = self._data["events"]
+            return any(events[event_type] for event_type in event_types)
+        start = self.__events_start()
+        plain = self.__plain()
+        return not all(_json_list_is_empty(self, event_type, start, plain) for event_type in event_types)
+
+    def with_events_of(self, earlier, event_types):
+        """Merges the events of an earlier action frame into a copy of this one, so a skipped frame's events are not lost
+
+        Args:
+            earlier: The earlier frame, a GameMessage
+            event_types: The event types to carry over
+
+        Returns:
+            A copy of this frame whose event method returns the earlier events of these types followed by its own.
+            The rest of the frame, including its string and data, is this frame's
+
+        """
+        merged = GameMessage(self)
+        merged.received = self.received
+        merged._carried_events = {event_type: earlier.event(event_type) + self.event(event_type) for event_type in event_types}
+        return merged
+
+def message_data(message):
+    """Gets the decoded JSON of a message from the game engine
+
+    Args:
+        message: A GameMessage, a JSON string or an already decoded dict
+
+    Returns:
+        The decoded message. A GameMessage is only decoded the first time
+
+    """
+    if isinstance(message, GameMessage):
+        return message.data
+    if isinstance(message, dict):
+        return message
+    return json.loads(message)
+
+
 def send_command(cmd):
     """Sends your turn to standard output.
     Should usually only be called by 'GameState.submit_turn()'